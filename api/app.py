@@ -0,0 +1,284 @@
+# Copyright 2024 DataRobot, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+HTTP API for the log analyzer, served next to the Streamlit UI.
+
+    POST /v1/uploads?filename=app.log   raw (optionally chunked) file body
+    POST /v1/chat                       {"question", "upload_ids", "messages",
+                                         "stream", "use_cache", "diff"}
+    GET  /metrics, /healthz
+
+Chat answers stream back as server-sent events ("data: {"delta": ...}",
+then "event: done"). The service is stateless apart from an in-memory
+upload store; clients send the conversation so far with each question.
+With "diff", the two uploads are sent as the differences between their
+message templates, the first being a good run and the second a bad one.
+Deployment calls go through docsassist.predict and share its connection
+pool and caches with every other request served by this process.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import sys
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional
+
+from pydantic import AliasChoices, Field
+from pydantic_settings import BaseSettings
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+from starlette.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.routing import Route
+
+sys.path.append("../")
+from docsassist import (  # noqa: E402
+    anomalies,
+    correlation,
+    ingest,
+    logdiff,
+    logstore,
+    metrics,
+    parallel,
+    predict,
+    redaction,
+    warmup,
+)
+
+logging.basicConfig(format="%(levelname)s:%(message)s", level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+api_env_prefix: str = "API_"
+
+
+def _env_alias(name: str) -> AliasChoices:
+    return AliasChoices(
+        "MLOPS_RUNTIME_PARAM_" + api_env_prefix + name,
+        api_env_prefix + name,
+    )
+
+
+class ApiSettings(BaseSettings):
+    """API service settings from env or DR runtime parameters"""
+
+    max_upload_bytes: int = Field(
+        default=50 * 1024 * 1024, validation_alias=_env_alias("MAX_UPLOAD_BYTES")
+    )
+    upload_store_bytes: int = Field(
+        default=512 * 1024 * 1024, validation_alias=_env_alias("UPLOAD_STORE_BYTES")
+    )
+
+
+class Upload(NamedTuple):
+    filename: str
+    attachment: str
+    size: int
+    # For the timelines of request IDs that questions mention
+    index: Optional[correlation.FileIndex] = None
+    # For diffs; None when the upload is not a log
+    table: Optional[logstore.LogTable] = None
+    # Redacted facts and anomalies, also in attachment; sent alone with timelines
+    facts: Optional[str] = None
+
+
+class UploadStore:
+    """Decoded uploads by id, evicting the least recently used beyond a byte budget."""
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._uploads: OrderedDict[str, Upload] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, upload: Upload) -> str:
+        upload_id = uuid.uuid4().hex
+        with self._lock:
+            self._uploads[upload_id] = upload
+            self.total_bytes += upload.size
+            while self.total_bytes > self.max_bytes and len(self._uploads) > 1:
+                _, evicted = self._uploads.popitem(last=False)
+                self.total_bytes -= evicted.size
+        return upload_id
+
+    def get(self, upload_id: str) -> Optional[Upload]:
+        with self._lock:
+            upload = self._uploads.get(upload_id)
+            if upload is None:
+                return None
+            self._uploads.move_to_end(upload_id)
+            return upload
+
+
+settings = ApiSettings()
+uploads = UploadStore(settings.upload_store_bytes)
+correlation_settings = correlation.CorrelationSettings()
+warmup.start_keep_warm()
+
+
+def _read_upload(filename: str, mime_type: str, data: bytes) -> Upload:
+    """The upload's redacted attachment with facts and anomalies, its table and IDs."""
+    attachment = ingest.read_uploaded_file(filename, mime_type, data)
+    # Parsing runs in a worker process when the upload is large enough, so
+    # it does not hold the GIL while other requests are served
+    (table,) = parallel.parse_uploads([(filename, data)])
+    attachment = redaction.redact(attachment)
+    facts = None
+    if table is not None:
+        facts = logstore.facts_attachment(filename, table)
+        found = anomalies.anomalies_attachment(filename, table)
+        if found is not None:
+            facts += f"\n\n{found}"
+        facts = redaction.redact(facts)
+        attachment += f"\n\n{facts}"
+    index = None
+    if correlation_settings.enabled:
+        index = correlation.FileIndex.from_bytes(filename, data, correlation_settings)
+    return Upload(filename, attachment, len(data), index, table, facts)
+
+
+def _error(status: int, message: str) -> JSONResponse:
+    return JSONResponse({"error": message}, status_code=status)
+
+
+async def create_upload(request: Request) -> JSONResponse:
+    filename = request.query_params.get("filename", "upload.log")
+    mime_type = request.headers.get("content-type", "text/plain")
+    chunks: List[bytes] = []
+    size = 0
+    async for chunk in request.stream():
+        size += len(chunk)
+        if size > settings.max_upload_bytes:
+            return _error(
+                413, f"Uploads are limited to {settings.max_upload_bytes} bytes"
+            )
+        chunks.append(chunk)
+    upload = await run_in_threadpool(
+        _read_upload, filename, mime_type, b"".join(chunks)
+    )
+    metrics.UPLOADED_FILES.inc()
+    metrics.UPLOADED_BYTES.inc(amount=size)
+    upload_id = uploads.put(upload)
+    return JSONResponse(
+        {"upload_id": upload_id, "filename": filename, "bytes": size}, status_code=201
+    )
+
+
+def _sse(event: Optional[str], data: Dict[str, Any]) -> str:
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def _stream_answer(
+    question: str, messages: List[Dict[str, Any]], use_cache: bool
+) -> Iterator[str]:
+    # Starlette iterates sync generators in its thread pool
+    try:
+        for delta in predict.stream_llm_completion(question, messages, use_cache):
+            yield _sse(None, {"delta": delta})
+    except Exception as e:
+        logger.warning("Streaming chat completion failed: %s", e)
+        yield _sse("error", {"error": str(e)})
+        return
+    yield _sse("done", {})
+
+
+async def chat(request: Request) -> Any:
+    try:
+        payload = await request.json()
+        question = str(payload["question"])
+        messages = [
+            {"role": str(msg["role"]), "content": str(msg["content"])}
+            for msg in payload.get("messages", [])
+        ]
+    except (ValueError, KeyError, TypeError, AttributeError):
+        return _error(
+            400, 'Expected a JSON body with a "question" and optional "messages"'
+        )
+    selected = []
+    for upload_id in payload.get("upload_ids", []):
+        upload = uploads.get(upload_id)
+        if upload is None:
+            return _error(404, f"Unknown or expired upload {upload_id}")
+        selected.append(upload)
+    if payload.get("diff"):
+        tables = [upload.table for upload in selected if upload.table is not None]
+        if len(selected) != 2 or len(tables) != 2:
+            return _error(400, "A diff needs two uploaded logs, the good run first")
+        good, bad = selected
+        # Only what changed between the two logs, not the logs themselves
+        diff = await run_in_threadpool(
+            logdiff.diff_attachment, good.filename, tables[0], bad.filename, tables[1]
+        )
+        attachments = [redaction.redact(diff)]
+    else:
+        indexes = [upload.index for upload in selected if upload.index is not None]
+        timelines = [
+            redaction.redact(timeline)
+            for timeline in correlation.timeline_attachments(
+                question, indexes, correlation_settings
+            )
+        ]
+        if timelines and correlation_settings.timeline_only:
+            # The request's lines from every file instead of the files
+            attachments = [upload.facts for upload in selected if upload.facts]
+        else:
+            attachments = [upload.attachment for upload in selected]
+        attachments.extend(timelines)
+    if attachments:
+        # Same message layout as the Streamlit app
+        question = f"{question}\n\n" + "\n\n".join(attachments)
+    use_cache = bool(payload.get("use_cache", True))
+
+    if payload.get("stream", True):
+        return StreamingResponse(
+            _stream_answer(question, messages, use_cache),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+    try:
+        answer = "".join(
+            await run_in_threadpool(
+                lambda: list(
+                    predict.stream_llm_completion(question, messages, use_cache)
+                )
+            )
+        )
+    except Exception as e:
+        return _error(502, str(e))
+    return JSONResponse({"answer": answer})
+
+
+async def health(request: Request) -> PlainTextResponse:
+    return PlainTextResponse("ok")
+
+
+async def metrics_endpoint(request: Request) -> PlainTextResponse:
+    return PlainTextResponse(
+        metrics.REGISTRY.render(), media_type="text/plain; version=0.0.4"
+    )
+
+
+app = Starlette(
+    routes=[
+        Route("/v1/uploads", create_upload, methods=["POST"]),
+        Route("/v1/chat", chat, methods=["POST"]),
+        Route("/healthz", health),
+        Route("/metrics", metrics_endpoint),
+    ]
+)
@@ -0,0 +1,5 @@
+#!/usr/bin/env bash
+
+echo "Starting API"
+
+uvicorn app:app --host 0.0.0.0 --port "${PORT:-8080}" --workers 1 --timeout-keep-alive 30
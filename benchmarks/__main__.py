@@ -0,0 +1,114 @@
+# Copyright 2024 DataRobot, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Run the benchmark suite or compare two result files.
+
+    python -m benchmarks run [--quick | --large] [--select ingest] [--output out.json]
+    python -m benchmarks compare baseline.json candidate.json [--threshold 0.1]
+"""
+
+from __future__ import annotations
+
+import argparse
+import importlib
+import json
+import sys
+from pathlib import Path
+from typing import Any, Dict, Tuple
+
+from benchmarks.harness import run_all
+
+SUITES = [
+    "benchmarks.bench_keyword_guard",
+    "benchmarks.bench_ingest",
+    "benchmarks.bench_parallel",
+    "benchmarks.bench_runtime",
+    "benchmarks.bench_predict",
+    "benchmarks.bench_import",
+    "benchmarks.bench_startup",
+]
+
+RESULTS_DIR = Path(__file__).parent / "results"
+
+
+def _key(result: Dict[str, Any]) -> Tuple[str, str]:
+    return result["name"], json.dumps(result["param"])
+
+
+def compare(baseline_path: str, candidate_path: str, threshold: float) -> int:
+    """Print median time ratios and return 1 if any case regressed past threshold."""
+    with open(baseline_path) as f:
+        baseline = {_key(r): r for r in json.load(f)["results"] if not r["error"]}
+    with open(candidate_path) as f:
+        candidate = json.load(f)["results"]
+
+    regressions = 0
+    print(f"{'case':<48} {'baseline ms':>12} {'candidate ms':>12} {'ratio':>7}")
+    for result in candidate:
+        before = baseline.get(_key(result))
+        if before is None or result["error"]:
+            continue
+        ratio = result["median_s"] / before["median_s"]
+        flag = ""
+        if ratio > 1 + threshold:
+            flag, regressions = "  REGRESSION", regressions + 1
+        elif ratio < 1 - threshold:
+            flag = "  improved"
+        label = result["name"]
+        if result["param"] is not None:
+            label += f"[{result['param']}]"
+        print(
+            f"{label:<48} {before['median_s'] * 1e3:>12.4f} "
+            f"{result['median_s'] * 1e3:>12.4f} {ratio:>7.2f}{flag}"
+        )
+    return 1 if regressions else 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run_parser = commands.add_parser("run", help="Run the benchmark suite")
+    run_parser.add_argument("--quick", action="store_true", help="Small inputs only")
+    run_parser.add_argument(
+        "--large", action="store_true", help="Add 1 GB inputs (needs ~6 GB RAM)"
+    )
+    run_parser.add_argument("--select", help="Only cases whose name contains this")
+    run_parser.add_argument("--repeat", type=int, default=5)
+    run_parser.add_argument(
+        "--output", help="Defaults to benchmarks/results/<commit>.json"
+    )
+    compare_parser = commands.add_parser("compare", help="Compare two result files")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("candidate")
+    compare_parser.add_argument("--threshold", type=float, default=0.1)
+    args = parser.parse_args()
+
+    if args.command == "compare":
+        return compare(args.baseline, args.candidate, args.threshold)
+
+    for suite in SUITES:
+        importlib.import_module(suite)
+    report = run_all(
+        select=args.select, quick=args.quick, large=args.large, repeat=args.repeat
+    )
+    output = Path(args.output or RESULTS_DIR / f"{report['meta']['commit']}.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    print(f"Results written to {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
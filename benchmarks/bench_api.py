@@ -0,0 +1,227 @@
+# Copyright 2024 DataRobot, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Throughput of the HTTP API service (api/app.py) against the mock deployment.
+
+Starts the mock deployment and the API under uvicorn in this process, then
+N concurrent clients each upload a synthetic log in chunks and ask questions
+about it over SSE, measuring time to first event and to the end of the
+stream:
+
+    python -m benchmarks.bench_api --clients 16 --requests 8 \\
+        --latency lognormal:0.5:0.3 --token-delay 0.005
+"""
+
+from __future__ import annotations
+
+import argparse
+import importlib.util
+import json
+import os
+import socket
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import requests
+
+from benchmarks.corpus import log_bytes
+from benchmarks.load_generator import percentile
+from benchmarks.mock_deployment import (
+    MockDeploymentServer,
+    add_mock_arguments,
+    settings_from_args,
+)
+
+API_APP_PATH = Path(__file__).resolve().parent.parent / "api" / "app.py"
+
+_QUESTIONS = [
+    "Summarize the errors in this log",
+    "Which service fails most often?",
+    "What happened right before the first 503?",
+    "What should I look at first?",
+]
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return int(sock.getsockname()[1])
+
+
+def start_api() -> Tuple[Any, str]:
+    """Run the API app under uvicorn in a background thread."""
+    import uvicorn
+
+    spec = importlib.util.spec_from_file_location("log_analyzer_api", API_APP_PATH)
+    assert spec is not None and spec.loader is not None
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    port = _free_port()
+    server = uvicorn.Server(
+        uvicorn.Config(module.app, host="127.0.0.1", port=port, log_level="warning")
+    )
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, f"http://127.0.0.1:{port}"
+
+
+def _chunks(data: bytes, size: int = 64 * 1024) -> Iterator[bytes]:
+    for start in range(0, len(data), size):
+        yield data[start : start + size]
+
+
+def _client(
+    base_url: str, client_id: int, count: int, log_kb: int
+) -> List[Dict[str, Any]]:
+    results = []
+    with requests.Session() as session:
+        # A generator body is sent with chunked transfer encoding
+        upload = session.post(
+            f"{base_url}/v1/uploads",
+            params={"filename": f"service-{client_id}.log"},
+            data=_chunks(log_bytes(log_kb * 1024, seed=client_id)),
+        )
+        upload.raise_for_status()
+        upload_id = upload.json()["upload_id"]
+        messages: List[Dict[str, str]] = []
+        for i in range(count):
+            question = _QUESTIONS[(client_id + i) % len(_QUESTIONS)]
+            started = time.perf_counter()
+            first_event: Optional[float] = None
+            answer, error = [], None
+            with session.post(
+                f"{base_url}/v1/chat",
+                json={
+                    "question": question,
+                    "upload_ids": [upload_id] if not messages else [],
+                    "messages": messages,
+                },
+                stream=True,
+            ) as response:
+                event = None
+                for line in response.iter_lines(decode_unicode=True):
+                    if first_event is None:
+                        first_event = time.perf_counter() - started
+                    if line.startswith("event:"):
+                        event = line.split(":", 1)[1].strip()
+                    elif line.startswith("data:"):
+                        data = json.loads(line[5:])
+                        if event == "error":
+                            error = data["error"].split(" - ")[0][:60]
+                        elif "delta" in data:
+                            answer.append(data["delta"])
+            results.append(
+                {
+                    "ttfe_s": first_event,
+                    "total_s": time.perf_counter() - started,
+                    "error": error,
+                }
+            )
+            if error is None:
+                messages += [
+                    {"role": "user", "content": question},
+                    {"role": "assistant", "content": "".join(answer)},
+                ]
+    return results
+
+
+def run(
+    clients: int, requests_per_client: int, log_kb: int, endpoint: str
+) -> Dict[str, Any]:
+    os.environ.update(
+        DATAROBOT_ENDPOINT=endpoint,
+        DATAROBOT_API_TOKEN=os.environ.get("DATAROBOT_API_TOKEN", "mock"),
+        LLM_DEPLOYMENT_ID=os.environ.get("LLM_DEPLOYMENT_ID", "mock"),
+        REDACT_KEY=os.environ.get("REDACT_KEY", "mock"),
+        RESPONSE_CACHE_ENABLED="false",
+        SEMANTIC_CACHE_ENABLED="false",
+    )
+    server, base_url = start_api()
+    started = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=clients) as pool:
+            futures = [
+                pool.submit(_client, base_url, i, requests_per_client, log_kb)
+                for i in range(clients)
+            ]
+            results = [result for future in futures for result in future.result()]
+    finally:
+        server.should_exit = True
+    elapsed = time.perf_counter() - started
+
+    ok = [result for result in results if result["error"] is None]
+    ttfe = [result["ttfe_s"] for result in ok if result["ttfe_s"] is not None]
+    total = [result["total_s"] for result in ok]
+    errors: Dict[str, int] = {}
+    for result in results:
+        if result["error"] is not None:
+            errors[result["error"]] = errors.get(result["error"], 0) + 1
+    return {
+        "clients": clients,
+        "requests_per_client": requests_per_client,
+        "log_kb": log_kb,
+        "elapsed_s": elapsed,
+        "completed": len(ok),
+        "errors": errors,
+        "throughput_rps": len(ok) / elapsed if elapsed else 0.0,
+        "ttfe_ms": {
+            "p50": percentile(ttfe, 50) * 1000,
+            "p90": percentile(ttfe, 90) * 1000,
+            "p99": percentile(ttfe, 99) * 1000,
+        },
+        "total_ms": {
+            "mean": statistics.fmean(total) * 1000 if total else None,
+            "p50": percentile(total, 50) * 1000,
+            "p90": percentile(total, 90) * 1000,
+            "p99": percentile(total, 99) * 1000,
+        },
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="HTTP API throughput benchmark")
+    parser.add_argument("--endpoint", help="Use a running (mock) deployment")
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=4)
+    parser.add_argument("--log-kb", type=int, default=256)
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    add_mock_arguments(parser)
+    args = parser.parse_args()
+
+    mock = None
+    endpoint = args.endpoint
+    if endpoint is None:
+        mock = MockDeploymentServer(settings_from_args(args)).start()
+        endpoint = mock.endpoint
+    try:
+        report = run(args.clients, args.requests, args.log_kb, endpoint)
+        if mock is not None:
+            report["server_status_counts"] = dict(mock.status_counts)
+    finally:
+        if mock is not None:
+            mock.stop()
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+# Copyright 2024 DataRobot, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Import time of the docsassist core in a fresh interpreter.
+
+As a suite case, times `python -c "import <module>"` end to end. Run as a
+script for the `python -X importtime` breakdown, which fails if a UI or
+heavy SDK module is pulled in at import time:
+
+    python -m benchmarks.bench_import --module docsassist.predict --top 15
+"""
+
+from __future__ import annotations
+
+import argparse
+import subprocess
+import sys
+from pathlib import Path
+from typing import Any, Callable, List, Tuple
+
+from benchmarks.harness import benchmark
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+CORE_MODULES = ["docsassist.ingest", "docsassist.predict", "docsassist.batch"]
+# Must not be imported by the core until they are actually needed
+LAZY_MODULES = ["streamlit", "datarobot", "pandas", "openai", "numpy"]
+
+
+def _import_command(module: str, *flags: str) -> List[str]:
+    return [sys.executable, *flags, "-c", f"import {module}"]
+
+
+@benchmark("import.core", params=CORE_MODULES, quick_params=["docsassist.predict"])
+def import_core(module: str) -> Callable[[], Any]:
+    command = _import_command(module)
+    return lambda: subprocess.run(command, cwd=PROJECT_ROOT, check=True)
+
+
+def import_profile(module: str) -> List[Tuple[str, int, int]]:
+    """Return (module, self µs, cumulative µs) for every module imported."""
+    result = subprocess.run(
+        _import_command(module, "-X", "importtime"),
+        cwd=PROJECT_ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    profile = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        profile.append((name.strip(), int(self_us), int(cumulative_us)))
+    return profile
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="docsassist import-time breakdown")
+    parser.add_argument("--module", default="docsassist.predict")
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    profile = import_profile(args.module)
+    total = next(cumulative for name, _, cumulative in profile if name == args.module)
+    print(f"{args.module}: {total / 1000:.1f} ms cumulative")
+    print(f"{'module':<56} {'self ms':>9} {'cumul ms':>9}")
+    for name, self_us, cumulative_us in sorted(profile, key=lambda row: -row[2])[
+        : args.top
+    ]:
+        print(f"{name:<56} {self_us / 1000:>9.1f} {cumulative_us / 1000:>9.1f}")
+
+    imported = {name for name, _, _ in profile}
+    eager = [name for name in LAZY_MODULES if name in imported]
+    if eager:
+        print(f"Imported eagerly: {', '.join(eager)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+# Copyright 2024 DataRobot, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Throughput of the upload path, case by case on synthetic corpora.
+
+Covers decoding, attachment parsing, redaction, follow mode, JSON lines,
+CSV, parsed-log facts, anomalies, request ID indexing and diffs.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Callable
+
+from benchmarks.corpus import csv_bytes, jsonl_bytes, log_bytes
+from benchmarks.harness import MB, benchmark
+from docsassist import (
+    anomalies,
+    correlation,
+    csvlogs,
+    decoding,
+    ingest,
+    jsonlines,
+    logdiff,
+    logstore,
+    redaction,
+)
+from docsassist.follow import LogFollower
+
+
+@benchmark(
+    "ingest.read_uploaded_file",
+    params=[1, 10, 100],
+    quick_params=[1, 10],
+    large_params=[1024],
+    work=lambda size_mb: size_mb,
+)
+def read_uploaded_file(size_mb: int) -> Callable[[], Any]:
+    data = log_bytes(size_mb * MB)
+    return lambda: ingest.read_uploaded_file("app.log", "text/plain", data)
+
+
+@benchmark(
+    "decoding.decode",
+    params=["utf-8", "utf-16-le", "cp932"],
+    quick_params=["utf-8", "cp932"],
+    work=lambda encoding: 10,
+)
+def decoding_decode(encoding: str) -> Callable[[], Any]:
+    """Detection from the first 64 KB, then one chunked pass over 10 MB."""
+    text = log_bytes(10 * MB).decode("utf-8")
+    if encoding == "cp932":
+        # Japanese messages, so the sample does not read as UTF-8
+        text = text.replace("timed out", "タイムアウト")
+    data = text.encode(encoding)
+    return lambda: decoding.decode(data)
+
+
+@benchmark(
+    "ingest.parse_message",
+    params=[1, 10, 100],
+    quick_params=[1, 10],
+    work=lambda size_mb: size_mb,
+)
+def parse_message(size_mb: int) -> Callable[[], Any]:
+    """render_message parsing of a prompt with three attachments."""
+    attachments = [
+        ingest.read_uploaded_file(
+            f"service-{i}.log", "text/plain", log_bytes(size_mb * MB // 3, seed=i)
+        )
+        for i in range(3)
+    ]
+    message = "Summarize the errors\n\n" + "\n\n".join(attachments)
+    return lambda: ingest.parse_message(message)
+
+
+@benchmark(
+    "redaction.redact",
+    params=["log", "jsonl"],
+    quick_params=["log"],
+    work=lambda corpus: 10,
+)
+def redaction_redact(corpus: str) -> Callable[[], Any]:
+    """All default rules over 10 MB, with every value seen for the first time."""
+    data = log_bytes(10 * MB) if corpus == "log" else jsonl_bytes(10 * MB)
+    text = data.decode("utf-8")
+    rules = list(redaction.RULES.values())
+    return lambda: redaction.Redactor(rules, b"benchmark").redact(text)
+
+
+@benchmark(
+    "follow.feed_upload",
+    params=[1, 10],
+    quick_params=[1],
+    work=lambda size_mb: size_mb,
+)
+def follow_feed_upload(size_mb: int) -> Callable[[], Any]:
+    """Parsing and digesting new lines; a re-sent upload only pays for its append."""
+    data = log_bytes(size_mb * MB)
+    return lambda: LogFollower().feed_upload("app.log", data)
+
+
+@benchmark(
+    "jsonlines.render",
+    params=[1, 10, 100],
+    quick_params=[1, 10],
+    work=lambda size_mb: size_mb,
+)
+def jsonlines_render(size_mb: int) -> Callable[[], Any]:
+    """Decoding, schema inference and the tabular rendering of a JSON-lines upload."""
+    data = jsonl_bytes(size_mb * MB)
+    return lambda: jsonlines.render(data)
+
+
+@benchmark(
+    "csvlogs.render",
+    params=[1, 10, 100],
+    quick_params=[1, 10],
+    work=lambda size_mb: size_mb,
+)
+def csvlogs_render(size_mb: int) -> Callable[[], Any]:
+    """Three of eight columns of the 5xx rows of a CSV export, read in chunks."""
+    data = csv_bytes(size_mb * MB)
+    columns = csvlogs.read_columns(data)
+    query = csvlogs.parse_query(
+        columns, ["timestamp", "service", "message"], "status>=500"
+    )
+    return lambda: csvlogs.render(data, query, columns)
+
+
+@benchmark(
+    "logstore.from_jsonl",
+    params=[1, 10],
+    quick_params=[1],
+    work=lambda size_mb: size_mb,
+)
+def logstore_from_jsonl(size_mb: int) -> Callable[[], Any]:
+    data = jsonl_bytes(size_mb * MB)
+    return lambda: logstore.LogTable.from_jsonl(data)
+
+
+@benchmark(
+    "logstore.from_bytes",
+    params=[1, 10],
+    quick_params=[1],
+    work=lambda size_mb: size_mb,
+)
+def logstore_from_bytes(size_mb: int) -> Callable[[], Any]:
+    data = log_bytes(size_mb * MB)
+    return lambda: logstore.LogTable.from_bytes(data)
+
+
+@benchmark("logstore.facts", params=[10, 100], quick_params=[10])
+def logstore_facts(size_mb: int) -> Callable[[], Any]:
+    """Aggregates over an already parsed upload, as sent with each question."""
+    table = logstore.LogTable.from_bytes(log_bytes(size_mb * MB))
+    return lambda: logstore.facts(table)
+
+
+@benchmark("anomalies.detect", params=[10, 100], quick_params=[10])
+def anomalies_detect(size_mb: int) -> Callable[[], Any]:
+    """Spikes, bursts, new and rare templates of an already parsed upload."""
+    table = logstore.LogTable.from_bytes(log_bytes(size_mb * MB))
+    return lambda: anomalies.detect(table)
+
+
+@benchmark(
+    "correlation.index",
+    params=[10, 100],
+    quick_params=[10],
+    work=lambda size_mb: size_mb,
+)
+def correlation_index(size_mb: int) -> Callable[[], Any]:
+    """Decoding an upload and indexing its request IDs, in one pass."""
+    data = log_bytes(size_mb * MB)
+    return lambda: correlation.FileIndex.from_bytes("app.log", data)
+
+
+@benchmark("logdiff.diff", params=[10, 100], quick_params=[10])
+def logdiff_diff(size_mb: int) -> Callable[[], Any]:
+    """Template diff of two already parsed uploads of size_mb each."""
+    good = logstore.LogTable.from_bytes(log_bytes(size_mb * MB, seed=1))
+    bad = logstore.LogTable.from_bytes(log_bytes(size_mb * MB, seed=2))
+    return lambda: logdiff.diff(good, bad)
@@ -0,0 +1,95 @@
+# Copyright 2024 DataRobot, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Keyword guard throughput, inside the guard deployment and in the apps."""
+
+from __future__ import annotations
+
+import importlib.util
+import itertools
+import json
+import sys
+from typing import Any, Callable
+
+from benchmarks.corpus import log_lines
+from benchmarks.harness import benchmark
+from deployment_keyword_guard.blocklist import Blocklist
+from docsassist.keyword_guard import KeywordGuard
+from infra.common.globals import PROJECT_ROOT
+
+# Mirrors the blocklist runtime parameter in infra/settings_keyword_guard.py
+BLOCKLIST = json.dumps(
+    [
+        "dataiku",
+        "databrick",
+        "h20",
+        "microsoft",
+        "gcp",
+        "google",
+        "vertex\\s*ai",
+        "compet",
+    ]
+)
+
+
+def _load_custom() -> Any:
+    code_dir = PROJECT_ROOT / "deployment_keyword_guard"
+    # DRUM puts the code directory on the path, for the blocklist module
+    if str(code_dir) not in sys.path:
+        sys.path.insert(0, str(code_dir))
+    path = code_dir / "custom.py"
+    spec = importlib.util.spec_from_file_location("keyword_guard_custom", path)
+    assert spec is not None and spec.loader is not None
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@benchmark(
+    "keyword_guard.score",
+    params=[1_000, 100_000],
+    quick_params=[1_000],
+    work=lambda rows: rows,
+    unit="prompts",
+)
+def score(rows: int) -> Callable[[], Any]:
+    import pandas as pd
+
+    custom = _load_custom()
+    prompts = [
+        f"What went wrong here? {line}"
+        for line in itertools.islice(log_lines(seed=rows), rows)
+    ]
+    data = pd.DataFrame({"guardrailText": prompts})
+    return lambda: custom.score(
+        data,
+        (Blocklist.from_json(BLOCKLIST), "guardrailText"),
+        positive_class_label="true",
+        negative_class_label="false",
+    )
+
+
+@benchmark(
+    "keyword_guard.screen",
+    params=[1, 100],
+    quick_params=[1],
+    work=lambda attachment_kb: 1,
+    unit="prompts",
+)
+def screen(attachment_kb: int) -> Callable[[], Any]:
+    """A prompt that is let through, with an attachment of the given size."""
+    guard = KeywordGuard(Blocklist.from_json(BLOCKLIST))
+    lines = itertools.islice(log_lines(seed=attachment_kb), attachment_kb * 10)
+    prompt = "What went wrong here?\n\n" + "\n".join(lines)
+    return lambda: guard.screen(prompt)
@@ -0,0 +1,150 @@
+# Copyright 2024 DataRobot, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Wall-clock speedup of parsing a batch of uploads on the process pool.
+
+Parses the same files inline (the old behaviour, one after another in the
+calling thread) and then on pools of increasing size, reporting the
+speedup and parallel efficiency of each. Run it on the resource label the
+app is deployed with (cpu.xlarge, see infra/settings_app_infra.py):
+
+    python -m benchmarks.bench_parallel --files 12 --file-mb 8 --workers 1,2,4,8
+"""
+
+from __future__ import annotations
+
+import argparse
+import atexit
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+
+from benchmarks.corpus import log_bytes
+from benchmarks.harness import MB, benchmark
+from docsassist import parallel
+
+_INLINE = parallel.IngestSettings(INGEST_MIN_PARALLEL_BYTES=2**62)
+_ALWAYS = parallel.IngestSettings(INGEST_MIN_PARALLEL_BYTES=0)
+
+
+def _uploads(files: int, file_mb: float) -> List[Tuple[str, bytes]]:
+    return [
+        (f"service-{i}.log", log_bytes(int(file_mb * MB), seed=i)) for i in range(files)
+    ]
+
+
+def _start_pool(workers: int) -> ProcessPoolExecutor:
+    pool = ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+    )
+    # Start every worker and import the parser before timing
+    warmup = [(f"warmup-{i}.log", log_bytes(64 * 1024)) for i in range(workers)]
+    parallel.parse_uploads(warmup, settings=_ALWAYS, pool=pool)
+    return pool
+
+
+def _default_workers() -> List[int]:
+    cpus = os.cpu_count() or 1
+    counts = [1]
+    while counts[-1] * 2 <= cpus:
+        counts.append(counts[-1] * 2)
+    if counts[-1] != cpus:
+        counts.append(cpus)
+    return counts
+
+
+@benchmark(
+    "parallel.parse_uploads",
+    params=[1, 2, 4],
+    quick_params=[2],
+    work=lambda workers: 8,
+)
+def parse_uploads(workers: int) -> Callable[[], Any]:
+    """Eight 1 MB uploads on a pool of the given size."""
+    uploads = _uploads(8, 1)
+    pool = _start_pool(workers)
+    atexit.register(pool.shutdown)
+    return lambda: parallel.parse_uploads(uploads, settings=_ALWAYS, pool=pool)
+
+
+def run(files: int, file_mb: float, worker_counts: Sequence[int]) -> Dict[str, Any]:
+    uploads = _uploads(files, file_mb)
+    total_mb = files * file_mb
+
+    started = time.perf_counter()
+    parallel.parse_uploads(uploads, settings=_INLINE)
+    inline_s = time.perf_counter() - started
+
+    runs = []
+    for workers in worker_counts:
+        pool = _start_pool(workers)
+        try:
+            first_done = []
+            started = time.perf_counter()
+            parallel.parse_uploads(
+                uploads,
+                settings=_ALWAYS,
+                pool=pool,
+                progress=lambda done, total, name: first_done.append(
+                    time.perf_counter() - started
+                ),
+            )
+            elapsed = time.perf_counter() - started
+        finally:
+            pool.shutdown()
+        runs.append(
+            {
+                "workers": workers,
+                "wall_s": elapsed,
+                "first_file_s": first_done[0],
+                "mb_per_s": total_mb / elapsed,
+                "speedup": inline_s / elapsed,
+                "efficiency": inline_s / elapsed / workers,
+            }
+        )
+    return {
+        "cpus": os.cpu_count(),
+        "files": files,
+        "file_mb": file_mb,
+        "inline_s": inline_s,
+        "inline_mb_per_s": total_mb / inline_s,
+        "pool": runs,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Upload parsing pool speedup")
+    parser.add_argument("--files", type=int, default=12)
+    parser.add_argument("--file-mb", type=float, default=4.0)
+    parser.add_argument(
+        "--workers",
+        default=",".join(map(str, _default_workers())),
+        help="Comma-separated pool sizes, by default powers of two up to the CPUs",
+    )
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    report = run(args.files, args.file_mb, [int(n) for n in args.workers.split(",")])
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
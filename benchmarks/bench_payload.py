@@ -0,0 +1,118 @@
+# Copyright 2024 DataRobot, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Bytes on the wire and encoding time for chat payloads of pasted logs.
+
+Posts each payload to the local mock deployment, which decodes the body like
+the real endpoint would, so the round trip includes decompression on the far end.
+
+    python -m benchmarks.bench_payload --sizes-mb 1 10 50
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import time
+from typing import Any, Dict, List
+
+import requests
+
+from benchmarks.corpus import log_text
+from benchmarks.mock_deployment import MockDeploymentServer, MockSettings
+from docsassist import transport
+from docsassist.transport import PayloadSettings, encode_request
+
+
+def _time(fn: Any, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def run(sizes_mb: List[float], repeat: int = 3) -> List[Dict[str, Any]]:
+    server = MockDeploymentServer(MockSettings()).start()
+    url = f"{server.endpoint}/deployments/bench/chat/completions"
+    codecs = ["none", "gzip"] + (["zstd"] if transport.zstandard is not None else [])
+    results = []
+    try:
+        with requests.Session() as session:
+            for size_mb in sizes_mb:
+                data = {
+                    "model": "deployed-llm",
+                    "messages": [
+                        {
+                            "role": "user",
+                            "content": "Summarize the errors\n\n"
+                            + log_text(int(size_mb * 1024 * 1024)),
+                        }
+                    ],
+                }
+                json_s = _time(lambda: json.dumps(data).encode("utf-8"), repeat)
+                fast_s = _time(lambda: transport.dumps(data), repeat)
+                for codec in codecs:
+                    settings = PayloadSettings(compression=codec)
+                    body, headers = encode_request(data, settings)
+                    encode_s = _time(lambda: encode_request(data, settings), repeat)
+                    post_s = _time(
+                        lambda: session.post(url, data=body, headers=headers),
+                        repeat,
+                    )
+                    results.append(
+                        {
+                            "size_mb": size_mb,
+                            "codec": codec,
+                            "wire_bytes": len(body),
+                            "ratio": len(transport.dumps(data)) / len(body),
+                            "json_dumps_ms": json_s * 1000,
+                            "fast_dumps_ms": fast_s * 1000,
+                            "encode_ms": encode_s * 1000,
+                            "post_ms": post_s * 1000,
+                        }
+                    )
+    finally:
+        server.stop()
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes-mb", type=float, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    results = run(args.sizes_mb, args.repeat)
+    print(
+        f"{'size':>6} {'codec':>5} {'wire bytes':>12} {'ratio':>6} "
+        f"{'json ms':>8} {'fast ms':>8} {'encode ms':>9} {'post ms':>8}"
+    )
+    for row in results:
+        print(
+            f"{row['size_mb']:>5g}M {row['codec']:>5} {row['wire_bytes']:>12,} "
+            f"{row['ratio']:>6.1f} {row['json_dumps_ms']:>8.1f} "
+            f"{row['fast_dumps_ms']:>8.1f} {row['encode_ms']:>9.1f} "
+            f"{row['post_ms']:>8.1f}"
+        )
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
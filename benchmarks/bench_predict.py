@@ -0,0 +1,61 @@
+# Copyright 2024 DataRobot, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""End-to-end get_llm_completion against the local mock deployment."""
+
+from __future__ import annotations
+
+import atexit
+import os
+import warnings
+from functools import lru_cache
+from typing import Any, Callable
+
+from benchmarks.corpus import log_text
+from benchmarks.harness import benchmark
+from benchmarks.mock_deployment import MockDeploymentServer, MockSettings
+
+
+@lru_cache(maxsize=1)
+def _mock_endpoint() -> str:
+    server = MockDeploymentServer(MockSettings()).start()
+    atexit.register(server.stop)
+    return server.endpoint
+
+
+@benchmark(
+    "predict.get_llm_completion",
+    params=[1, 256, 4096],
+    quick_params=[1, 256],
+    work=lambda size_kb: size_kb,
+    unit="KB",
+)
+def get_llm_completion(size_kb: int) -> Callable[[], Any]:
+    os.environ.update(
+        DATAROBOT_ENDPOINT=_mock_endpoint(),
+        DATAROBOT_API_TOKEN="benchmark",
+        LLM_DEPLOYMENT_ID="benchmark",
+        RESPONSE_CACHE_ENABLED="false",
+        SEMANTIC_CACHE_ENABLED="false",
+    )
+    from docsassist import predict
+    from docsassist.cache import get_response_cache
+    from docsassist.semantic_cache import get_semantic_cache
+
+    # The mock reports an older API version than the installed client expects
+    warnings.filterwarnings("ignore", module="datarobot")
+    get_response_cache.cache_clear()
+    get_semantic_cache.cache_clear()
+    question = "Summarize the errors\n\n📎 app.log:\n" + log_text(size_kb * 1024)
+    return lambda: predict.get_llm_completion(question, [])
@@ -0,0 +1,74 @@
+# Copyright 2024 DataRobot, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Per-call overheads on the chat path: settings, translations, caches, transport."""
+
+from __future__ import annotations
+
+import os
+from typing import Any, Callable
+
+import numpy as np
+
+from benchmarks.corpus import log_text
+from benchmarks.harness import benchmark
+
+
+@benchmark("i18n.gettext", params=["en_US", "ja_JP"])
+def gettext(locale: str) -> Callable[[], Any]:
+    from docsassist.i18n import LocaleSettings, gettext
+
+    os.environ["MAIN_APP_LOCALE"] = locale
+    LocaleSettings().setup_locale()
+    return lambda: gettext("Getting AI response...")
+
+
+@benchmark("deployments.LLMDeployment")
+def llm_deployment(_: None) -> Callable[[], Any]:
+    from docsassist.deployments import LLMDeployment
+
+    os.environ.setdefault("LLM_DEPLOYMENT_ID", "benchmark")
+    return lambda: LLMDeployment().id
+
+
+@benchmark(
+    "semantic_cache.get",
+    params=[1_000, 100_000],
+    quick_params=[1_000],
+)
+def semantic_cache_get(entries: int) -> Callable[[], Any]:
+    from docsassist.semantic_cache import SemanticCache
+
+    cache = SemanticCache(threshold=0.9, ttl_seconds=3600, max_entries=entries)
+    rng = np.random.default_rng(0)
+    words = [f"word{i}" for i in range(5000)]
+    for i in range(entries):
+        cache.put("scope", " ".join(rng.choice(words, 6)), {"i": i})
+    return lambda: cache.get("scope", "which errors happened most often")
+
+
+@benchmark(
+    "transport.encode_request",
+    params=[1, 10],
+    work=lambda size_mb: size_mb,
+)
+def encode_request(size_mb: int) -> Callable[[], Any]:
+    from docsassist.transport import PayloadSettings, encode_request
+
+    data = {
+        "model": "deployed-llm",
+        "messages": [{"role": "user", "content": log_text(size_mb * 1024 * 1024)}],
+    }
+    settings = PayloadSettings()
+    return lambda: encode_request(data, settings)
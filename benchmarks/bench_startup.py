@@ -0,0 +1,157 @@
+# Copyright 2024 DataRobot, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Cold start and warm rerun time of the Streamlit app, with budgets.
+
+Each sample is a fresh interpreter that runs frontend/app.py with
+Streamlit's AppTest: "cold" is process start to the end of the first run
+(imports, asset loading, first render) and "warm" the median of further
+reruns of the same session. The DataRobot endpoint is the local mock
+deployment. Exits non-zero if a median exceeds its budget:
+
+    python -m benchmarks.bench_startup --samples 5 --cold-budget-ms 3000
+"""
+
+from __future__ import annotations
+
+import argparse
+import atexit
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+from benchmarks.harness import benchmark
+from benchmarks.mock_deployment import MockDeploymentServer, MockSettings
+
+FRONTEND_PATH = Path(__file__).resolve().parent.parent / "frontend"
+
+# Measured on 1 vCPU: about 1.9 s cold and 30 ms per warm rerun
+COLD_BUDGET_MS: float = 3000.0
+WARM_BUDGET_MS: float = 100.0
+
+
+def _child(reruns: int) -> None:
+    """Runs in the fresh interpreter; prints its timings as JSON."""
+    started = time.perf_counter()
+    os.chdir(FRONTEND_PATH)
+    sys.path.insert(0, str(FRONTEND_PATH))
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(str(FRONTEND_PATH / "app.py"), default_timeout=120)
+    at.run()
+    if at.exception:
+        raise RuntimeError(at.exception[0].message)
+    cold = time.perf_counter() - started
+    warm = []
+    for _ in range(reruns):
+        rerun_started = time.perf_counter()
+        at.run()
+        warm.append(time.perf_counter() - rerun_started)
+    print(json.dumps({"cold_in_process_s": cold, "warm_s": warm}))
+
+
+def sample(endpoint: str, reruns: int = 10) -> Dict[str, Any]:
+    env = dict(
+        os.environ,
+        DATAROBOT_ENDPOINT=endpoint,
+        DATAROBOT_API_TOKEN="benchmark",
+        LLM_DEPLOYMENT_ID="benchmark",
+        REDACT_KEY="benchmark",
+    )
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-m", "benchmarks.bench_startup", "--child", str(reruns)],
+        cwd=FRONTEND_PATH.parent,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    timings: Dict[str, Any] = json.loads(result.stdout.strip().splitlines()[-1])
+    timings["cold_s"] = time.perf_counter() - started
+    return timings
+
+
+@benchmark("app.cold_start")
+def cold_start(_: None) -> Callable[[], Any]:
+    import streamlit  # noqa: F401
+
+    server = MockDeploymentServer(MockSettings()).start()
+    atexit.register(server.stop)
+    return lambda: sample(server.endpoint, reruns=0)
+
+
+def run(samples: int, reruns: int) -> Dict[str, Any]:
+    server = MockDeploymentServer(MockSettings()).start()
+    try:
+        results = [sample(server.endpoint, reruns) for _ in range(samples)]
+    finally:
+        server.stop()
+    cold = [result["cold_s"] * 1000 for result in results]
+    warm: List[float] = [t * 1000 for result in results for t in result["warm_s"]]
+    return {
+        "samples": samples,
+        "reruns": reruns,
+        "cold_ms": {
+            "median": statistics.median(cold),
+            "min": min(cold),
+            "max": max(cold),
+            "in_process_median": statistics.median(
+                result["cold_in_process_s"] * 1000 for result in results
+            ),
+        },
+        "warm_ms": {
+            "median": statistics.median(warm) if warm else None,
+            "min": min(warm, default=None),
+            "max": max(warm, default=None),
+        },
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Streamlit app startup benchmark")
+    parser.add_argument("--samples", type=int, default=3)
+    parser.add_argument("--reruns", type=int, default=10)
+    parser.add_argument("--cold-budget-ms", type=float, default=COLD_BUDGET_MS)
+    parser.add_argument("--warm-budget-ms", type=float, default=WARM_BUDGET_MS)
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    parser.add_argument("--child", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child is not None:
+        _child(args.child)
+        return
+
+    report = run(args.samples, args.reruns)
+    report["budget_ms"] = {"cold": args.cold_budget_ms, "warm": args.warm_budget_ms}
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    over = report["cold_ms"]["median"] > args.cold_budget_ms or (
+        report["warm_ms"]["median"] is not None
+        and report["warm_ms"]["median"] > args.warm_budget_ms
+    )
+    if over:
+        print("Startup budget exceeded", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
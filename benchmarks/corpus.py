@@ -0,0 +1,149 @@
+# Copyright 2024 DataRobot, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Reproducible synthetic log corpora for benchmarks."""
+
+from __future__ import annotations
+
+import json
+import random
+from datetime import datetime, timedelta
+from typing import Iterator
+
+_SERVICES = ["api-gateway", "auth", "billing", "scheduler", "worker", "storage"]
+_LEVELS = ["DEBUG", "INFO", "INFO", "INFO", "WARN", "ERROR"]
+_TEMPLATES = [
+    "GET /api/v2/deployments/{hex} returned {status} in {ms} ms",
+    "POST /api/v2/predictions request_id={uuid} status={status} bytes={num}",
+    "Connection to {ip}:{port} timed out after {ms} ms",
+    "User {user} logged in from {ip}",
+    "Job {hex} finished with exit code {code}",
+    "Retrying task {uuid} (attempt {code}/5)",
+    "Cache miss for key {hex}, fetching from storage",
+    "Worker heartbeat ok, queue depth {num}",
+    "Failed to parse payload for trace_id={hex}: unexpected token at {num}",
+    "Disk usage at {code}% on /dev/sda{code}",
+]
+
+
+def log_lines(seed: int = 0, start: datetime | None = None) -> Iterator[str]:
+    """Yield an endless, deterministic stream of plain-text log lines."""
+    rng = random.Random(seed)
+    timestamp = start or datetime(2024, 1, 1)
+    while True:
+        timestamp += timedelta(milliseconds=rng.randint(1, 250))
+        template = rng.choice(_TEMPLATES)
+        message = template.format(
+            hex=f"{rng.getrandbits(64):016x}",
+            uuid=f"{rng.getrandbits(128):032x}",
+            status=rng.choice([200, 200, 200, 201, 404, 429, 500, 503]),
+            ms=rng.randint(1, 5000),
+            num=rng.randint(0, 1_000_000),
+            ip=".".join(str(rng.randint(1, 254)) for _ in range(4)),
+            port=rng.randint(1024, 65535),
+            user=f"user{rng.randint(1, 500)}",
+            code=rng.randint(0, 99),
+        )
+        yield (
+            f"{timestamp.isoformat(timespec='milliseconds')} "
+            f"{rng.choice(_LEVELS):5} [{rng.choice(_SERVICES)}] {message}"
+        )
+
+
+def log_text(size_bytes: int, seed: int = 0) -> str:
+    """Return a log of roughly size_bytes characters, ending on a full line."""
+    lines = []
+    total = 0
+    for line in log_lines(seed):
+        if total >= size_bytes:
+            break
+        lines.append(line)
+        total += len(line) + 1
+    return "\n".join(lines) + "\n"
+
+
+def log_bytes(
+    size_bytes: int, seed: int = 0, unique_bytes: int = 64 * 1024 * 1024
+) -> bytes:
+    """
+    Return size_bytes of UTF-8 log data.
+
+    Only the first unique_bytes are generated line by line; larger corpora
+    repeat that block, which keeps 1 GB inputs quick to build.
+    """
+    block = log_text(min(size_bytes, unique_bytes), seed).encode("utf-8")
+    repeats, remainder = divmod(size_bytes, len(block))
+    tail = block[:remainder]
+    return block * repeats + tail[: tail.rfind(b"\n") + 1]
+
+
+def jsonl_lines(seed: int = 0) -> Iterator[str]:
+    """Yield an endless stream of structured JSON-lines records."""
+    rng = random.Random(seed)
+    for line in log_lines(seed):
+        timestamp, level, service, message = line.split(maxsplit=3)
+        record = {
+            "ts": timestamp + "Z",
+            "level": level.lower(),
+            "service": service.strip("[]"),
+            "host": "web-1",
+            "env": "prod",
+            "msg": message,
+            "trace_id": f"{rng.getrandbits(64):016x}",
+        }
+        if rng.random() < 0.4:
+            record["http"] = {
+                "method": rng.choice(["GET", "POST"]),
+                "status": rng.choice([200, 200, 200, 201, 404, 429, 500, 503]),
+                "duration_ms": round(rng.lognormvariate(3, 1), 2),
+            }
+        yield json.dumps(record)
+
+
+def jsonl_bytes(size_bytes: int, seed: int = 0) -> bytes:
+    """Return roughly size_bytes of JSON-lines log data, ending on a full line."""
+    lines = []
+    total = 0
+    for line in jsonl_lines(seed):
+        if total >= size_bytes:
+            break
+        lines.append(line)
+        total += len(line) + 1
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def csv_bytes(size_bytes: int, seed: int = 0) -> bytes:
+    """Return roughly size_bytes of a CSV log export, ending on a full row."""
+    rng = random.Random(seed)
+    rows = ["timestamp,level,service,host,region,status,duration_ms,message"]
+    total = len(rows[0]) + 1
+    for line in log_lines(seed):
+        if total >= size_bytes:
+            break
+        timestamp, level, service, message = line.split(maxsplit=3)
+        row = ",".join(
+            (
+                timestamp + "Z",
+                level,
+                service.strip("[]"),
+                f"web-{rng.randrange(4)}",
+                "eu-west-1",
+                str(rng.choice([200, 200, 200, 201, 404, 429, 500, 503])),
+                f"{rng.lognormvariate(3, 1):.2f}",
+                '"' + message.replace('"', '""') + '"',
+            )
+        )
+        rows.append(row)
+        total += len(row) + 1
+    return ("\n".join(rows) + "\n").encode("utf-8")
@@ -0,0 +1,178 @@
+# Copyright 2024 DataRobot, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Minimal asv-style timing harness: registered cases, JSON results."""
+
+from __future__ import annotations
+
+import gc
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import timeit
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+MB: int = 1024 * 1024
+
+CaseFactory = Callable[[Any], Callable[[], Any]]
+
+
+@dataclass
+class Case:
+    name: str
+    factory: CaseFactory
+    params: Sequence[Any] = (None,)
+    quick_params: Optional[Sequence[Any]] = None
+    large_params: Sequence[Any] = ()
+    work: Optional[Callable[[Any], float]] = None
+    unit: str = "MB"
+
+
+@dataclass
+class Result:
+    name: str
+    param: Any
+    number: int
+    repeat: int
+    min_s: float
+    median_s: float
+    mean_s: float
+    stdev_s: float
+    throughput: Optional[float] = None
+    unit: Optional[str] = None
+    error: Optional[str] = None
+
+
+REGISTRY: List[Case] = []
+
+
+def benchmark(
+    name: str,
+    params: Sequence[Any] = (None,),
+    quick_params: Optional[Sequence[Any]] = None,
+    large_params: Sequence[Any] = (),
+    work: Optional[Callable[[Any], float]] = None,
+    unit: str = "MB",
+) -> Callable[[CaseFactory], CaseFactory]:
+    """
+    Register a benchmark case.
+
+    The decorated factory is called once per parameter, untimed, and returns
+    the zero-argument callable that is timed. work(param) is the amount of
+    work per call in unit, used to report throughput per second. large_params
+    only run when asked for, as they need several GB of memory.
+    """
+
+    def register(factory: CaseFactory) -> CaseFactory:
+        REGISTRY.append(
+            Case(name, factory, params, quick_params, large_params, work, unit)
+        )
+        return factory
+
+    return register
+
+
+def measure(fn: Callable[[], Any], repeat: int) -> Tuple[int, List[float]]:
+    """Calibrate a loop to at least 0.2 s like timeit, then time it repeatedly."""
+    timer = timeit.Timer(fn)
+    number, total = timer.autorange()
+    if number == 1:
+        # Slow cases (large inputs) are capped at roughly ten seconds each
+        repeat = max(1, min(repeat, int(10 / total)))
+    gc.collect()
+    return number, [t / number for t in timer.repeat(repeat=repeat, number=number)]
+
+
+def run_case(case: Case, param: Any, repeat: int = 5) -> Result:
+    try:
+        fn = case.factory(param)
+        number, timings = measure(fn, repeat)
+    except ImportError as e:
+        return Result(case.name, param, 0, 0, 0, 0, 0, 0, error=f"skipped: {e}")
+    except Exception as e:
+        return Result(case.name, param, 0, 0, 0, 0, 0, 0, error=repr(e))
+    median = statistics.median(timings)
+    throughput = None
+    if case.work is not None and median > 0:
+        throughput = case.work(param) / median
+    return Result(
+        name=case.name,
+        param=param,
+        number=number,
+        repeat=len(timings),
+        min_s=min(timings),
+        median_s=median,
+        mean_s=statistics.fmean(timings),
+        stdev_s=statistics.stdev(timings) if len(timings) > 1 else 0.0,
+        throughput=throughput,
+        unit=f"{case.unit}/s" if throughput is not None else None,
+    )
+
+
+def environment() -> Dict[str, Any]:
+    try:
+        commit = subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            text=True,
+            stderr=subprocess.DEVNULL,
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = "unknown"
+    return {
+        "commit": commit,
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def run_all(
+    select: Optional[str] = None,
+    quick: bool = False,
+    large: bool = False,
+    repeat: int = 5,
+) -> Dict[str, Any]:
+    results = []
+    for case in REGISTRY:
+        if select and select not in case.name:
+            continue
+        params = list(case.quick_params if quick and case.quick_params else case.params)
+        if large:
+            params += case.large_params
+        for param in params:
+            started = time.perf_counter()
+            result = run_case(case, param, repeat=3 if quick else repeat)
+            label = case.name if param is None else f"{case.name}[{param}]"
+            if result.error:
+                print(f"{label:<48} ERROR {result.error}", flush=True)
+            else:
+                rate = (
+                    f" {result.throughput:>12,.1f} {result.unit}"
+                    if result.throughput is not None
+                    else ""
+                )
+                print(
+                    f"{label:<48} {result.median_s * 1e3:>12.4f} ms{rate}"
+                    f"  ({time.perf_counter() - started:.1f}s)",
+                    flush=True,
+                )
+            results.append(asdict(result))
+    return {"meta": environment(), "results": results}
@@ -0,0 +1,199 @@
+# Copyright 2024 DataRobot, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Drive N concurrent simulated chat sessions through docsassist.predict.
+
+Each session uploads a synthetic log on its first turn and asks follow-ups
+with the same history handling as the Streamlit app. Runs against an
+in-process mock deployment unless --endpoint points at a running one:
+
+    python -m benchmarks.load_generator --sessions 32 --turns 5 \\
+        --latency lognormal:0.5:0.3 --rate-429 0.02
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import statistics
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from benchmarks.corpus import log_text
+from benchmarks.mock_deployment import (
+    MockDeploymentServer,
+    add_mock_arguments,
+    settings_from_args,
+)
+
+_QUESTIONS = [
+    "Summarize the errors in this log",
+    "Which service fails most often?",
+    "What happened right before the first 503?",
+    "Are there signs of a timeout cascade?",
+    "What should I look at first?",
+]
+
+
+@dataclass
+class LoadResult:
+    latencies: List[float] = field(default_factory=list)
+    errors: Counter[str] = field(default_factory=Counter)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def add(self, latency: float, error: Optional[str]) -> None:
+        with self._lock:
+            if error is None:
+                self.latencies.append(latency)
+            else:
+                self.errors[error] += 1
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
+
+
+def _session(
+    session_id: int, turns: int, log_kb: int, think_time: float, result: LoadResult
+) -> None:
+    from docsassist import predict
+    from docsassist.history import ConversationHistory
+
+    rng = random.Random(session_id)
+    history_manager = ConversationHistory.from_settings()
+    messages: List[Dict[str, Any]] = []
+    pending = None
+    attachment = f"\n\n📎 service-{session_id}.log:\n" + log_text(
+        log_kb * 1024, seed=session_id
+    )
+    for turn in range(turns):
+        question = rng.choice(_QUESTIONS) + (attachment if turn == 0 else "")
+        history = (
+            history_manager.build_messages(messages) if history_manager else messages
+        )
+        started = time.perf_counter()
+        try:
+            response = predict.get_llm_completion(question, history)
+        except Exception as e:
+            result.add(time.perf_counter() - started, str(e).split(" - ")[0][:60])
+            continue
+        result.add(time.perf_counter() - started, None)
+        messages += [
+            {"role": "user", "content": question},
+            {
+                "role": "assistant",
+                "content": response["choices"][0]["message"]["content"],
+            },
+        ]
+        if history_manager is not None:
+            pending = history_manager.schedule_update(
+                messages, predict.summarize_history
+            )
+        time.sleep(think_time)
+    if pending is not None:
+        pending.result()
+
+
+def run(
+    endpoint: str,
+    sessions: int,
+    turns: int,
+    log_kb: int,
+    think_time: float = 0.0,
+    with_cache: bool = False,
+) -> Dict[str, Any]:
+    os.environ.update(
+        DATAROBOT_ENDPOINT=endpoint,
+        DATAROBOT_API_TOKEN=os.environ.get("DATAROBOT_API_TOKEN", "mock"),
+        LLM_DEPLOYMENT_ID=os.environ.get("LLM_DEPLOYMENT_ID", "mock"),
+    )
+    if not with_cache:
+        os.environ["RESPONSE_CACHE_ENABLED"] = "false"
+        os.environ["SEMANTIC_CACHE_ENABLED"] = "false"
+
+    result = LoadResult()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=sessions) as pool:
+        for session_id in range(sessions):
+            pool.submit(_session, session_id, turns, log_kb, think_time, result)
+    elapsed = time.perf_counter() - started
+
+    latencies = result.latencies
+    return {
+        "sessions": sessions,
+        "turns": turns,
+        "log_kb": log_kb,
+        "elapsed_s": elapsed,
+        "completed": len(latencies),
+        "errors": dict(result.errors),
+        "throughput_rps": len(latencies) / elapsed if elapsed else 0.0,
+        "latency_ms": {
+            "mean": statistics.fmean(latencies) * 1000 if latencies else None,
+            "p50": percentile(latencies, 50) * 1000,
+            "p90": percentile(latencies, 90) * 1000,
+            "p99": percentile(latencies, 99) * 1000,
+            "max": max(latencies, default=float("nan")) * 1000,
+        },
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Chat session load generator")
+    parser.add_argument("--endpoint", help="Use a running (mock) deployment")
+    parser.add_argument("--sessions", type=int, default=8)
+    parser.add_argument("--turns", type=int, default=5)
+    parser.add_argument("--log-kb", type=int, default=256)
+    parser.add_argument("--think-time", type=float, default=0.0)
+    parser.add_argument("--with-cache", action="store_true")
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    add_mock_arguments(parser)
+    args = parser.parse_args()
+
+    server = None
+    endpoint = args.endpoint
+    if endpoint is None:
+        server = MockDeploymentServer(settings_from_args(args)).start()
+        endpoint = server.endpoint
+    try:
+        report = run(
+            endpoint,
+            args.sessions,
+            args.turns,
+            args.log_kb,
+            args.think_time,
+            args.with_cache,
+        )
+        if server is not None:
+            report["server_status_counts"] = dict(server.status_counts)
+    finally:
+        if server is not None:
+            server.stop()
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
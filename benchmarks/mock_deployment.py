@@ -0,0 +1,393 @@
+# Copyright 2024 DataRobot, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Local stand-in for the DataRobot chat/completions API.
+
+Serves POST /api/v2/deployments/{id}/chat/completions (plain and streaming),
+POST /api/v2/deployments/{id}/predictions for guard deployments and
+GET /api/v2/version/ so that docsassist.predict and the Streamlit app run
+unchanged against it. --cold-start delays the first request to each
+deployment id, and the first after it idled, as a deployment that scaled to
+zero would:
+
+    python -m benchmarks.mock_deployment --port 8080 --latency lognormal:0.8:0.4
+    DATAROBOT_ENDPOINT=http://127.0.0.1:8080/api/v2 DATAROBOT_API_TOKEN=mock \\
+        LLM_DEPLOYMENT_ID=mock streamlit run frontend/app.py
+"""
+
+from __future__ import annotations
+
+import argparse
+import gzip
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+from deployment_keyword_guard.blocklist import Blocklist
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional codec
+    zstandard = None
+
+_CHAT_PATH = re.compile(r"^/api/v2/deployments/(?P<id>[^/]+)/chat/completions/?$")
+_PREDICTIONS_PATH = re.compile(r"^/api/v2/deployments/(?P<id>[^/]+)/predictions/?$")
+
+DEFAULT_BLOCK_MESSAGE = (
+    "I have detected you are asking about another vendor. "
+    "I hear they have great products, but I think DataRobot is the best."
+)
+
+
+@dataclass
+class LatencyDistribution:
+    """Seconds to wait before answering: constant, uniform or lognormal."""
+
+    kind: str = "constant"
+    params: List[float] = field(default_factory=lambda: [0.0])
+
+    @classmethod
+    def parse(cls, spec: str) -> LatencyDistribution:
+        """Parse 'constant:S', 'uniform:LOW:HIGH' or 'lognormal:MEDIAN:SIGMA'."""
+        kind, *params = spec.split(":")
+        expected = {"constant": 1, "uniform": 2, "lognormal": 2}
+        if kind not in expected or len(params) != expected[kind]:
+            raise ValueError(f"Invalid latency distribution: {spec}")
+        return cls(kind, [float(p) for p in params])
+
+    def sample(self, rng: random.Random) -> float:
+        if self.kind == "uniform":
+            return rng.uniform(*self.params)
+        if self.kind == "lognormal":
+            median, sigma = self.params
+            return median * rng.lognormvariate(0.0, sigma)
+        return self.params[0]
+
+
+@dataclass
+class MockSettings:
+    latency: LatencyDistribution = field(default_factory=LatencyDistribution)
+    token_delay: float = 0.0
+    rate_429: float = 0.0
+    rate_503: float = 0.0
+    rate_timeout: float = 0.0
+    timeout_seconds: float = 30.0
+    blocklist: List[str] = field(default_factory=list)
+    block_message: str = DEFAULT_BLOCK_MESSAGE
+    # Extra seconds for the first request to a deployment, and to one that
+    # has not been called for scale_to_zero_after seconds
+    cold_start: float = 0.0
+    scale_to_zero_after: float = 300.0
+    seed: Optional[int] = None
+
+
+class MockDeploymentServer:
+    """Threaded HTTP server emulating a guarded LLM deployment."""
+
+    def __init__(
+        self, settings: MockSettings, host: str = "127.0.0.1", port: int = 0
+    ) -> None:
+        self.settings = settings
+        self.rng = random.Random(settings.seed)
+        self.blocklist = Blocklist(settings.blocklist)
+        self.status_counts: Counter[int] = Counter()
+        self.cold_starts: Counter[str] = Counter()
+        self._last_called: Dict[str, float] = {}
+        self.bytes_received = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), _make_handler(self))
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def endpoint(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/api/v2"
+
+    def start(self) -> MockDeploymentServer:
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def serve_forever(self) -> None:
+        self._server.serve_forever()
+
+    def __enter__(self) -> MockDeploymentServer:
+        return self.start()
+
+    def __exit__(self, *exc: Any) -> None:
+        self.stop()
+
+    def record(self, status: int, received: int) -> None:
+        with self._lock:
+            self.status_counts[status] += 1
+            self.bytes_received += received
+
+    def draw(self) -> tuple[str | None, float]:
+        """Pick the injected failure, if any, and the latency for one request."""
+        with self._lock:
+            roll = self.rng.random()
+            latency = self.settings.latency.sample(self.rng)
+        settings = self.settings
+        if roll < settings.rate_429:
+            return "429", latency
+        if roll < settings.rate_429 + settings.rate_503:
+            return "503", latency
+        if roll < settings.rate_429 + settings.rate_503 + settings.rate_timeout:
+            return "timeout", latency
+        return None, latency
+
+    def wake(self, deployment_id: str) -> float:
+        """Seconds of cold start for a request to a deployment, if it is cold."""
+        if not self.settings.cold_start:
+            return 0.0
+        now = time.monotonic()
+        with self._lock:
+            last = self._last_called.get(deployment_id)
+            self._last_called[deployment_id] = now
+            if last is not None and now - last < self.settings.scale_to_zero_after:
+                return 0.0
+            self.cold_starts[deployment_id] += 1
+        return self.settings.cold_start
+
+    def answer(self, messages: List[Dict[str, Any]]) -> tuple[str, str]:
+        """Return the completion text and finish reason for a message list."""
+        prompt = str(messages[-1]["content"]) if messages else ""
+        if self.blocklist.blocks(prompt):
+            return self.settings.block_message, "content_filter"
+        total_chars = sum(len(str(m["content"])) for m in messages)
+        first_line = prompt.strip().splitlines()[0][:80] if prompt.strip() else ""
+        return (
+            f"Mock analysis of {len(messages)} messages ({total_chars} characters). "
+            f"You asked: {first_line}",
+            "stop",
+        )
+
+
+def _completion(content: str, finish_reason: str) -> Dict[str, Any]:
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": "mock-llm",
+        "choices": [
+            {
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": finish_reason,
+            }
+        ],
+        "usage": {
+            "prompt_tokens": 0,
+            "completion_tokens": len(content.split()),
+            "total_tokens": len(content.split()),
+        },
+    }
+
+
+def _chunk(delta: Dict[str, Any], finish_reason: str | None) -> bytes:
+    payload = {
+        "object": "chat.completion.chunk",
+        "model": "mock-llm",
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+    return f"data: {json.dumps(payload)}\n\n".encode()
+
+
+def _make_handler(mock: MockDeploymentServer) -> type[BaseHTTPRequestHandler]:
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def log_message(self, format: str, *args: Any) -> None:
+            pass
+
+        def _send_json(
+            self,
+            status: int,
+            body: Dict[str, Any],
+            headers: Optional[Dict[str, str]] = None,
+        ) -> None:
+            encoded = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(encoded)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(encoded)
+
+        def _read_json(self) -> tuple[Dict[str, Any], int]:
+            raw = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            encoding = self.headers.get("Content-Encoding")
+            body = raw
+            if encoding == "gzip":
+                body = gzip.decompress(raw)
+            elif encoding == "zstd" and zstandard is not None:
+                body = zstandard.ZstdDecompressor().decompress(raw)
+            return json.loads(body or b"{}"), len(raw)
+
+        def do_GET(self) -> None:
+            if self.path.rstrip("/") == "/api/v2/version":
+                self._send_json(200, {"major": 2, "minor": 36, "versionString": "2.36"})
+            else:
+                self._send_json(404, {"message": "Not found"})
+
+        def _predict(self, deployment_id: str) -> None:
+            """Guard-style predictions: a 0.0 score for each JSON row."""
+            rows, received = self._read_json()
+            time.sleep(mock.wake(deployment_id) + mock.draw()[1])
+            mock.record(200, received)
+            self._send_json(
+                200,
+                {
+                    "data": [
+                        {"rowId": i, "prediction": 0.0, "predictionValues": []}
+                        for i in range(len(rows))
+                    ]
+                },
+            )
+
+        def do_POST(self) -> None:
+            path = self.path.split("?")[0]
+            predictions = _PREDICTIONS_PATH.match(path)
+            if predictions:
+                self._predict(predictions.group("id"))
+                return
+            chat = _CHAT_PATH.match(path)
+            if not chat:
+                self._send_json(404, {"message": "Not found"})
+                return
+            data, received = self._read_json()
+            failure, latency = mock.draw()
+            latency += mock.wake(chat.group("id"))
+            if failure == "timeout":
+                mock.record(504, received)
+                time.sleep(mock.settings.timeout_seconds)
+                self.close_connection = True
+                return
+            time.sleep(latency)
+            if failure == "429":
+                mock.record(429, received)
+                self._send_json(
+                    429, {"message": "Too many requests"}, {"Retry-After": "1"}
+                )
+                return
+            if failure == "503":
+                mock.record(503, received)
+                self._send_json(503, {"message": "Service unavailable"})
+                return
+
+            content, finish_reason = mock.answer(data.get("messages", []))
+            mock.record(200, received)
+            if not data.get("stream"):
+                self._send_json(200, _completion(content, finish_reason))
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            events = [_chunk({"role": "assistant"}, None)]
+            events += [
+                _chunk({"content": word + " "}, None) for word in content.split()
+            ]
+            events += [_chunk({}, finish_reason), b"data: [DONE]\n\n"]
+            for event in events:
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(event), event))
+                self.wfile.flush()
+                if mock.settings.token_delay:
+                    time.sleep(mock.settings.token_delay)
+            self.wfile.write(b"0\r\n\r\n")
+
+    return Handler
+
+
+def add_mock_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--latency",
+        type=LatencyDistribution.parse,
+        default=LatencyDistribution(),
+        help="constant:S, uniform:LOW:HIGH or lognormal:MEDIAN:SIGMA (seconds)",
+    )
+    parser.add_argument("--token-delay", type=float, default=0.0)
+    parser.add_argument("--rate-429", type=float, default=0.0)
+    parser.add_argument("--rate-503", type=float, default=0.0)
+    parser.add_argument("--rate-timeout", type=float, default=0.0)
+    parser.add_argument("--timeout-seconds", type=float, default=30.0)
+    parser.add_argument(
+        "--blocklist",
+        nargs="*",
+        default=[],
+        help="Regexes that trigger a guardrail-style block response",
+    )
+    parser.add_argument(
+        "--cold-start",
+        type=float,
+        default=0.0,
+        help="Extra seconds for the first request to each deployment id",
+    )
+    parser.add_argument(
+        "--scale-to-zero-after",
+        type=float,
+        default=300.0,
+        help="Idle seconds after which a deployment is cold again",
+    )
+    parser.add_argument("--seed", type=int)
+
+
+def settings_from_args(args: argparse.Namespace) -> MockSettings:
+    return MockSettings(
+        latency=args.latency,
+        token_delay=args.token_delay,
+        rate_429=args.rate_429,
+        rate_503=args.rate_503,
+        rate_timeout=args.rate_timeout,
+        timeout_seconds=args.timeout_seconds,
+        blocklist=args.blocklist,
+        cold_start=args.cold_start,
+        scale_to_zero_after=args.scale_to_zero_after,
+        seed=args.seed,
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Mock DataRobot chat deployment")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    add_mock_arguments(parser)
+    args = parser.parse_args()
+
+    server = MockDeploymentServer(settings_from_args(args), args.host, args.port)
+    print(f"Serving mock deployment at {server.endpoint}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+# Copyright 2024 DataRobot, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Blocklist matching shared by the keyword guard deployment and the apps.
+
+The guard deployment scores prompts with it, and the apps load the same
+blocklist to reject obviously blocked prompts without a round trip; the
+deployment stays the authority. Only the standard library is used, so the
+module runs in the guard's moderation environment as well.
+
+A blocklist is a JSON list of case-insensitive regular expressions, as in
+the guard's ``blocklist`` runtime parameter. Plain words are searched for
+in the lowercased prompt, which is much faster than an ignore-case
+alternation of all keywords.
+"""
+
+from __future__ import annotations
+
+import json
+import re
+from typing import List, Optional, Pattern, Sequence
+
+_PLAIN = re.compile(r"[\w ]+")
+
+
+class Blocklist:
+    """Case-insensitive search for any of a list of keyword regexes."""
+
+    def __init__(self, keywords: Sequence[str]) -> None:
+        self.keywords = list(keywords)
+        self._words: List[str] = []
+        self._patterns: List[Pattern[str]] = []
+        for keyword in self.keywords:
+            if _PLAIN.fullmatch(keyword):
+                self._words.append(keyword.lower())
+            else:
+                self._patterns.append(re.compile(keyword, re.IGNORECASE))
+
+    @classmethod
+    def from_json(cls, blocklist: str) -> Blocklist:
+        """A blocklist from a JSON list of keywords; empty for an empty string."""
+        return cls(json.loads(blocklist) if blocklist.strip() else [])
+
+    def __bool__(self) -> bool:
+        return bool(self.keywords)
+
+    def search(self, text: str) -> Optional[str]:
+        """The first blocked keyword found in the text, if any."""
+        if self._words:
+            lowered = text.lower()
+            for word in self._words:
+                if word in lowered:
+                    return word
+        for pattern in self._patterns:
+            if pattern.search(text):
+                return pattern.pattern
+        return None
+
+    def blocks(self, text: str) -> bool:
+        return self.search(text) is not None
@@ -12,28 +12,25 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import json
-import re
-
 import pandas as pd
+from blocklist import Blocklist
 from datarobot_drum import RuntimeParameters
 
 
 def load_model(code_dir):
-    blocklist = json.loads(RuntimeParameters.get("blocklist"))
+    blocklist = Blocklist.from_json(RuntimeParameters.get("blocklist"))
     prompt_feature_name = RuntimeParameters.get("prompt_feature_name")
-    regex = "({})".format("|".join([keyword for keyword in blocklist]))
-    return regex, prompt_feature_name
+    return blocklist, prompt_feature_name
 
 
 def score(data, model, **kwargs):
-    regex, prompt_feature_name = model
+    blocklist, prompt_feature_name = model
 
     output = []
     positive_label = kwargs["positive_class_label"]
     negative_label = kwargs["negative_class_label"]
     for prompt in data[prompt_feature_name]:
-        block_input = bool(re.search(regex, prompt, re.IGNORECASE))
+        block_input = blocklist.blocks(prompt)
         output.append(
             {positive_label: float(block_input), negative_label: 1 - float(block_input)}
         )
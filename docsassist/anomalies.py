@@ -0,0 +1,372 @@
+# Copyright 2024 DataRobot, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Statistical anomalies in a parsed log, so the LLM knows where to look.
+
+Lines of each template are counted per time bucket, and every count is
+compared with an exponentially weighted moving average (EWMA) of the
+buckets before it: a bucket whose z-score is at least ANOMALY_Z_THRESHOLD
+is a spike, and consecutive spikes are one window. A spike enters the
+average clamped to the threshold, so a long burst stays flagged past its
+first bucket. Lines with outlying timestamps, such as a clock reset to
+1970, are left out of the buckets. Errors as a whole are checked the same
+way, for bursts. Templates first seen after the baseline, the first
+ANOMALY_BASELINE_SHARE of the lines, are new; warnings and errors seen
+only a few times are rare.
+
+All of it is a few passes over the table's columns and a loop over at most
+MAX_BUCKETS buckets, in linear time; only the findings are sent with the
+question.
+"""
+
+from __future__ import annotations
+
+import math
+from typing import List, NamedTuple, Optional, Tuple
+
+import numpy as np
+import numpy.typing as npt
+from pydantic import AliasChoices, Field
+from pydantic_settings import BaseSettings
+
+from docsassist.ingest import ATTACHMENT_MARKER
+from docsassist.logstore import (
+    _INTERVALS,
+    ERROR_CODES,
+    LEVEL_NAMES,
+    LogTable,
+    _format_interval,
+    _format_timestamp,
+)
+
+anomaly_env_prefix: str = "ANOMALY_"
+
+MAX_BUCKETS: int = 240
+# Only the templates with the most lines are checked for spikes
+MAX_SERIES: int = 2000
+# Buckets before the moving average means anything
+WARMUP_BUCKETS: int = 3
+RARE_MAX_COUNT: int = 3
+# Templates are not new or rare in a shorter baseline
+MIN_BASELINE_LINES: int = 100
+WARN_CODE: int = LEVEL_NAMES.index("WARN")
+
+
+def _env_alias(name: str) -> AliasChoices:
+    return AliasChoices(
+        "MLOPS_RUNTIME_PARAM_" + anomaly_env_prefix + name,
+        anomaly_env_prefix + name,
+    )
+
+
+class AnomalySettings(BaseSettings):
+    """Anomaly detection settings from env or DR runtime parameters"""
+
+    enabled: bool = Field(default=True, validation_alias=_env_alias("ENABLED"))
+    z_threshold: float = Field(
+        default=4.0, gt=0, validation_alias=_env_alias("Z_THRESHOLD")
+    )
+    min_count: int = Field(
+        default=10,
+        ge=1,
+        validation_alias=_env_alias("MIN_COUNT"),
+        description="Buckets with fewer lines are never spikes",
+    )
+    span_buckets: int = Field(
+        default=12, ge=1, validation_alias=_env_alias("SPAN_BUCKETS")
+    )
+    baseline_share: float = Field(
+        default=0.5, gt=0.0, lt=1.0, validation_alias=_env_alias("BASELINE_SHARE")
+    )
+    max_findings: int = Field(
+        default=10,
+        ge=1,
+        validation_alias=_env_alias("MAX_FINDINGS"),
+        description="Findings of each kind sent with the question",
+    )
+
+
+class Window(NamedTuple):
+    """Consecutive buckets of a series with more lines than expected."""
+
+    series: int
+    start: float
+    end: float
+    count: int
+    expected: float
+    z: float
+
+
+class TemplateFinding(NamedTuple):
+    """A new or rare template, the most severe level it was logged at."""
+
+    template: int
+    count: int
+    first_seen: Optional[float]
+    level: int
+
+
+class Anomalies(NamedTuple):
+    interval: Optional[int]
+    spikes: List[Window]
+    error_bursts: List[Window]
+    new_templates: List[TemplateFinding]
+    rare_templates: List[TemplateFinding]
+
+    def __bool__(self) -> bool:
+        return bool(
+            self.spikes
+            or self.error_bursts
+            or self.new_templates
+            or self.rare_templates
+        )
+
+
+def _bucket_interval(span: float) -> int:
+    """The smallest round interval giving at most MAX_BUCKETS buckets."""
+    for interval in _INTERVALS:
+        if span / interval < MAX_BUCKETS:
+            return interval
+    # Whole days beyond that, so a span of years still gives few buckets
+    days = math.floor(span / MAX_BUCKETS / _INTERVALS[-1]) + 1
+    return days * _INTERVALS[-1]
+
+
+def ewma_zscores(
+    counts: npt.NDArray[np.float64], span: int, threshold: float = math.inf
+) -> Tuple[npt.NDArray[np.float64], npt.NDArray[np.float64]]:
+    """
+    Z-scores of each bucket against the moving average of the buckets before it.
+
+    Args:
+        counts: One series per row, one bucket per column
+        span: Span of the exponential weights, in buckets
+        threshold: Counts are clamped to this many standard deviations above
+            the average before updating it, so that the first bucket of a
+            burst does not hide the rest
+
+    Returns:
+        The z-scores, zero for the first WARMUP_BUCKETS buckets, and the
+        expected counts
+    """
+    alpha = 2.0 / (span + 1.0)
+    z = np.zeros_like(counts)
+    expected = np.zeros_like(counts)
+    if not counts.shape[1]:
+        return z, expected
+    mean = counts[:, 0].copy()
+    variance = np.zeros_like(mean)
+    expected[:, 0] = mean
+    for t in range(1, counts.shape[1]):
+        current = counts[:, t]
+        expected[:, t] = mean
+        if t >= WARMUP_BUCKETS:
+            # Counts are at least as noisy as a Poisson process, and a series
+            # that was flat so far should not make every line a spike
+            std = np.maximum(np.sqrt(np.maximum(variance, mean)), 1.0)
+            z[:, t] = (current - mean) / std
+            current = np.minimum(current, mean + threshold * std)
+        diff = current - mean
+        increment = alpha * diff
+        mean = mean + increment
+        variance = (1.0 - alpha) * (variance + diff * increment)
+    return z, expected
+
+
+def _windows(
+    counts: npt.NDArray[np.float64],
+    z: npt.NDArray[np.float64],
+    expected: npt.NDArray[np.float64],
+    flagged: npt.NDArray[np.bool_],
+    first: float,
+    interval: int,
+) -> List[Window]:
+    rows, buckets = np.nonzero(flagged)
+    if not len(rows):
+        return []
+    # A window starts wherever the series changes or a bucket is skipped
+    starts = np.flatnonzero(
+        np.concatenate(
+            ([True], (rows[1:] != rows[:-1]) | (buckets[1:] != buckets[:-1] + 1))
+        )
+    )
+    ends = np.append(starts[1:], len(rows)) - 1
+    window_counts = np.add.reduceat(counts[rows, buckets], starts)
+    window_expected = np.add.reduceat(expected[rows, buckets], starts)
+    window_z = np.maximum.reduceat(z[rows, buckets], starts)
+    return [
+        Window(
+            series=int(rows[s]),
+            start=first + int(buckets[s]) * interval,
+            end=first + (int(buckets[e]) + 1) * interval,
+            count=int(window_counts[i]),
+            expected=float(window_expected[i]),
+            z=float(window_z[i]),
+        )
+        for i, (s, e) in enumerate(zip(starts, ends))
+    ]
+
+
+def _top_windows(windows: List[Window], limit: int) -> List[Window]:
+    return sorted(windows, key=lambda window: -window.z)[:limit]
+
+
+def detect(table: LogTable, settings: Optional[AnomalySettings] = None) -> Anomalies:
+    """Spikes, error bursts, new and rare templates in the table."""
+    settings = settings or AnomalySettings()
+    limit = settings.max_findings
+    rows = len(table)
+    template_counts = np.bincount(table.template, minlength=len(table.templates))
+    # The most severe level each template was logged at
+    template_levels = np.full(len(table.templates), -1, dtype=np.int8)
+    np.maximum.at(template_levels, table.template, table.level)
+
+    # First row of every template; rows are in file order, which is time order
+    first_rows = np.full(len(table.templates), rows, dtype=np.int64)
+    np.minimum.at(first_rows, table.template, np.arange(rows, dtype=np.int64))
+    baseline_rows = int(rows * settings.baseline_share)
+    new = np.flatnonzero(first_rows >= baseline_rows)
+    # The most lines first, then the most severe
+    new = new[np.lexsort((-template_levels[new], -template_counts[new]))][:limit]
+
+    rare = np.flatnonzero(
+        (template_counts > 0)
+        & (template_counts <= RARE_MAX_COUNT)
+        & (template_levels >= WARN_CODE)
+        & (first_rows < baseline_rows)
+    )
+    rare = rare[np.lexsort((template_counts[rare], -template_levels[rare]))][:limit]
+    if baseline_rows < MIN_BASELINE_LINES:
+        # In a short log, every message is new or rare
+        new = rare = new[:0]
+
+    def findings(indices: npt.NDArray[np.int64]) -> List[TemplateFinding]:
+        found = []
+        for i in indices:
+            first_seen = table.timestamp[first_rows[i]]
+            found.append(
+                TemplateFinding(
+                    int(i),
+                    int(template_counts[i]),
+                    None if math.isnan(first_seen) else float(first_seen),
+                    int(template_levels[i]),
+                )
+            )
+        return found
+
+    new_templates, rare_templates = findings(new), findings(rare)
+
+    # Lines with outlying timestamps would stretch the buckets
+    time_range = table.robust_time_range()
+    if time_range is None:
+        return Anomalies(None, [], [], new_templates, rare_templates)
+    interval = _bucket_interval(time_range[1] - time_range[0])
+    first = math.floor(time_range[0] / interval) * interval
+    buckets = int((time_range[1] - first) // interval) + 1
+    timed = ~np.isnan(table.timestamp) & ~table.outside(time_range)
+    bucket = ((table.timestamp[timed] - first) // interval).astype(np.int64)
+    templates = table.template[timed]
+
+    # Series only for templates with enough lines to ever spike, densely numbered
+    series = np.flatnonzero(template_counts >= settings.min_count)
+    series = series[np.argsort(-template_counts[series], kind="stable")][:MAX_SERIES]
+    dense = np.full(len(table.templates), -1, dtype=np.int64)
+    dense[series] = np.arange(len(series))
+    codes = dense[templates]
+    kept = codes >= 0
+    counts = np.bincount(
+        codes[kept] * buckets + bucket[kept], minlength=len(series) * buckets
+    ).reshape(len(series), buckets)
+    counts = counts.astype(np.float64)
+    z, expected = ewma_zscores(counts, settings.span_buckets, settings.z_threshold)
+    flagged = (z >= settings.z_threshold) & (counts >= settings.min_count)
+    spikes = [
+        window._replace(series=int(series[window.series]))
+        for window in _top_windows(
+            _windows(counts, z, expected, flagged, first, interval), limit
+        )
+    ]
+
+    errors = np.isin(table.level[timed], ERROR_CODES)
+    error_counts = np.bincount(bucket[errors], minlength=buckets)
+    error_counts = error_counts.astype(np.float64).reshape(1, buckets)
+    z, expected = ewma_zscores(
+        error_counts, settings.span_buckets, settings.z_threshold
+    )
+    flagged = (z >= settings.z_threshold) & (error_counts >= settings.min_count)
+    error_bursts = _top_windows(
+        _windows(error_counts, z, expected, flagged, first, interval), limit
+    )
+    return Anomalies(interval, spikes, error_bursts, new_templates, rare_templates)
+
+
+def _level(code: int) -> str:
+    return LEVEL_NAMES[code] if code >= 0 else "-"
+
+
+def _when(timestamp: Optional[float]) -> str:
+    return "-" if timestamp is None else _format_timestamp(timestamp)
+
+
+def _window(window: Window) -> str:
+    return (
+        f"{_format_timestamp(window.start)} to {_format_timestamp(window.end)}: "
+        f"{window.count:,} lines, {window.expected:,.1f} expected (z {window.z:.1f})"
+    )
+
+
+def describe(table: LogTable, anomalies: Anomalies) -> str:
+    """The findings, phrased for the prompt."""
+    lines = []
+    if anomalies.interval is not None and (anomalies.spikes or anomalies.error_bursts):
+        lines.append(
+            f"Lines counted per {_format_interval(anomalies.interval)}, each count "
+            "compared with the moving average of the counts before it"
+        )
+    if anomalies.spikes:
+        lines.append("Rate spikes of a message:")
+        for window in anomalies.spikes:
+            lines.append(f"  {_window(window)}  {table.templates[window.series]}")
+    if anomalies.error_bursts:
+        lines.append("Bursts of errors:")
+        lines.extend(f"  {_window(window)}" for window in anomalies.error_bursts)
+    for title, found in (
+        ("Messages not seen in the first part of the file", anomalies.new_templates),
+        ("Rare warnings and errors", anomalies.rare_templates),
+    ):
+        if found:
+            lines.append(f"{title}:")
+            lines.extend(
+                f"  {item.count:>8,}  {_level(item.level):5}  first at "
+                f"{_when(item.first_seen)}  {table.templates[item.template]}"
+                for item in found
+            )
+    return "\n".join(lines)
+
+
+def anomalies_attachment(
+    name: str, table: LogTable, settings: Optional[AnomalySettings] = None
+) -> Optional[str]:
+    """The table's anomalies as a prompt attachment; None if disabled or none found."""
+    settings = settings or AnomalySettings()
+    if not settings.enabled:
+        return None
+    anomalies = detect(table, settings)
+    if not anomalies:
+        return None
+    return (
+        f"{ATTACHMENT_MARKER} {name} (anomalies, statistical):\n"
+        f"{describe(table, anomalies)}"
+    )
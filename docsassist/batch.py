@@ -0,0 +1,400 @@
+# Copyright 2024 DataRobot, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Headless batch analysis of log files against the LLM deployment.
+
+Each file is decoded with the same ingestion code as the app's uploader,
+clipped to a character budget and sent with the question through
+docsassist.predict, so the response and semantic caches, tracing and
+metrics all apply. Results are appended to a JSONL spool as they complete
+and every finished file is recorded in a checkpoint, so an interrupted run
+resumes where it stopped:
+
+    DATAROBOT_ENDPOINT=... DATAROBOT_API_TOKEN=... LLM_DEPLOYMENT_ID=... \\
+        python -m docsassist.batch /var/log/app "logs/**/*.log" \\
+        --output results.parquet --workers 8
+"""
+
+from __future__ import annotations
+
+import argparse
+import glob
+import importlib.util
+import json
+import logging
+import mimetypes
+import os
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set
+
+from docsassist import ingest, redaction
+from docsassist.exceptions import DeploymentError, RateLimitError
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUESTION: str = (
+    "Summarize this log: the main errors and warnings, when they started, "
+    "which components are affected and the most likely root cause."
+)
+DEFAULT_EXTENSIONS: tuple[str, ...] = (
+    ".txt",
+    ".csv",
+    ".log",
+    ".json",
+    ".jsonl",
+    ".ndjson",
+    ".md",
+)
+TRUNCATION_NOTE: str = "\n[... {0} characters omitted ...]\n"
+
+
+@dataclass(frozen=True)
+class LogFile:
+    path: str
+    size: int
+    mtime_ns: int
+
+    @property
+    def key(self) -> str:
+        """Identifies this version of the file in the checkpoint."""
+        return f"{self.path}:{self.size}:{self.mtime_ns}"
+
+
+@dataclass
+class BatchStats:
+    started: float = field(default_factory=time.perf_counter)
+    completed: int = 0
+    failed: int = 0
+    skipped: int = 0
+    unreadable: int = 0
+    bytes_read: int = 0
+    latencies: List[float] = field(default_factory=list)
+
+    def add(self, record: Dict[str, Any]) -> None:
+        if record["status"] == "ok":
+            self.completed += 1
+            self.latencies.append(record["latency_s"])
+        else:
+            self.failed += 1
+        self.bytes_read += record["size"]
+
+    def as_dict(self) -> Dict[str, Any]:
+        elapsed = time.perf_counter() - self.started
+        latencies = sorted(self.latencies)
+
+        def percentile(q: float) -> Optional[float]:
+            if not latencies:
+                return None
+            return latencies[min(len(latencies) - 1, int(q / 100 * len(latencies)))]
+
+        return {
+            "completed": self.completed,
+            "failed": self.failed,
+            "skipped": self.skipped,
+            "unreadable": self.unreadable,
+            "elapsed_s": round(elapsed, 3),
+            "files_per_s": round((self.completed + self.failed) / elapsed, 3)
+            if elapsed
+            else 0.0,
+            "mb_per_s": round(self.bytes_read / 1e6 / elapsed, 3) if elapsed else 0.0,
+            "latency_s": {
+                "p50": percentile(50),
+                "p95": percentile(95),
+                "max": latencies[-1] if latencies else None,
+            },
+        }
+
+
+def find_log_files(
+    patterns: Iterable[str], extensions: Iterable[str] = DEFAULT_EXTENSIONS
+) -> Iterator[LogFile]:
+    """Expand directories (recursively, by extension) and globs, in sorted order."""
+    suffixes = tuple(extensions)
+    seen: Set[str] = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            paths = sorted(
+                str(path)
+                for path in Path(pattern).rglob("*")
+                if path.is_file() and path.suffix.lower() in suffixes
+            )
+        else:
+            paths = sorted(glob.glob(pattern, recursive=True))
+        for path in paths:
+            if path in seen or not os.path.isfile(path):
+                continue
+            seen.add(path)
+            stat = os.stat(path)
+            yield LogFile(path, stat.st_size, stat.st_mtime_ns)
+
+
+def clip(content: str, max_chars: int) -> str:
+    """Keep the head and tail of content within max_chars, noting what was cut."""
+    if len(content) <= max_chars:
+        return content
+    head = max_chars * 2 // 3
+    tail = max_chars - head
+    omitted = len(content) - head - tail
+    return content[:head] + TRUNCATION_NOTE.format(omitted) + content[-tail:]
+
+
+def analyze_file(
+    log_file: LogFile, question: str, max_chars: int, retries: int = 2
+) -> Dict[str, Any]:
+    """Ask the deployment about one file and return its result record."""
+    from docsassist import predict
+
+    name = os.path.basename(log_file.path)
+    mime_type = mimetypes.guess_type(name)[0] or "text/plain"
+    with open(log_file.path, "rb") as f:
+        attachment = ingest.read_uploaded_file(name, mime_type, f.read())
+    attachment = redaction.redact(attachment)
+    clipped = clip(attachment, max_chars)
+    message = f"{question}\n\n{clipped}"
+    record: Dict[str, Any] = {
+        "path": log_file.path,
+        "size": log_file.size,
+        "mtime_ns": log_file.mtime_ns,
+        "question": question,
+        "truncated": len(clipped) < len(attachment),
+    }
+    started = time.perf_counter()
+    for attempt in range(retries + 1):
+        try:
+            response = predict.get_llm_completion(message, [])
+            choice = response["choices"][0]
+            record.update(
+                status="ok",
+                answer=choice["message"]["content"],
+                finish_reason=choice.get("finish_reason"),
+                error=None,
+            )
+            break
+        except Exception as e:
+            record.update(status="error", answer=None, finish_reason=None, error=str(e))
+            # Only throttling and gateway errors may succeed on another attempt
+            if attempt == retries or not (
+                isinstance(e, DeploymentError) and e.retryable
+            ):
+                break
+            retry_after = e.retry_after if isinstance(e, RateLimitError) else None
+            time.sleep(2**attempt if retry_after is None else retry_after)
+    record["attempts"] = attempt + 1
+    record["latency_s"] = round(time.perf_counter() - started, 4)
+    return record
+
+
+def read_checkpoint(path: str) -> Set[str]:
+    if not os.path.exists(path):
+        return set()
+    with open(path) as f:
+        return {line.strip() for line in f if line.strip()}
+
+
+def error_record(log_file: LogFile, question: str, error: Exception) -> Dict[str, Any]:
+    """The result record of a file whose analysis raised."""
+    return {
+        "path": log_file.path,
+        "size": log_file.size,
+        "mtime_ns": log_file.mtime_ns,
+        "question": question,
+        "truncated": False,
+        "status": "error",
+        "answer": None,
+        "finish_reason": None,
+        "error": f"{type(error).__name__}: {error}",
+        "attempts": 0,
+        "latency_s": 0.0,
+    }
+
+
+def compact_jsonl(path: str) -> None:
+    """Keep only the latest record of each file in a JSONL output, in place."""
+    latest: Dict[str, str] = {}
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                key = json.loads(line)["path"]
+                # Move a retried file to the position of its latest record
+                latest.pop(key, None)
+                latest[key] = line
+    temporary = path + ".tmp"
+    with open(temporary, "w") as f:
+        f.writelines(latest.values())
+    os.replace(temporary, path)
+
+
+def check_parquet_engine() -> None:
+    """Raise ImportError unless pandas has an engine to write parquet with."""
+    if not any(
+        importlib.util.find_spec(engine) for engine in ("pyarrow", "fastparquet")
+    ):
+        raise ImportError(
+            "Writing .parquet output needs pyarrow or fastparquet "
+            "(pip install pyarrow); use a .jsonl output otherwise"
+        )
+
+
+def write_parquet(spool_path: str, output: str) -> None:
+    import pandas as pd
+
+    # Files that failed before are retried on resume; keep their latest record
+    records = pd.read_json(spool_path, lines=True, dtype=False)
+    records.drop_duplicates("path", keep="last").to_parquet(output, index=False)
+
+
+def run(
+    patterns: List[str],
+    output: str,
+    question: str = DEFAULT_QUESTION,
+    workers: int = 4,
+    max_chars: int = 100_000,
+    retries: int = 2,
+    checkpoint: Optional[str] = None,
+    extensions: Iterable[str] = DEFAULT_EXTENSIONS,
+    progress_interval: float = 10.0,
+) -> Dict[str, Any]:
+    """
+    Analyze every matching file not yet in the checkpoint.
+
+    Args:
+        patterns (list): Directories and glob patterns to analyze
+        output (str): A .jsonl or .parquet path; parquet is written from a JSONL
+            spool once all files are done, and needs pyarrow or fastparquet
+        question (str): The question asked about each file
+        workers (int): Concurrent requests to the deployment
+        max_chars (int): Per-file character budget for the attachment
+        retries (int): Retries per file after retryable deployment errors,
+            after the server's Retry-After or with exponential backoff
+        checkpoint (str): Path of the checkpoint file, next to output by default
+        extensions (list): File suffixes picked up when walking directories
+        progress_interval (float): Seconds between progress log lines
+
+    Returns:
+        dict: Throughput and latency statistics for this run; files already in
+            the checkpoint are skipped, those that could not be read are
+            unreadable and, like failed ones, retried on the next run
+    """
+    to_parquet = output.endswith(".parquet")
+    if to_parquet:
+        # Before any file is analyzed, not once all of them are
+        check_parquet_engine()
+    spool_path = output + ".jsonl" if to_parquet else output
+    checkpoint = checkpoint or output + ".checkpoint"
+    done = read_checkpoint(checkpoint)
+    stats = BatchStats()
+    lock = threading.Lock()
+    last_progress = time.perf_counter()
+
+    with open(spool_path, "a") as spool, open(checkpoint, "a") as checkpoint_file:
+        pool = ThreadPoolExecutor(max_workers=workers)
+
+        def finish(future: Future[Dict[str, Any]], log_file: LogFile) -> None:
+            nonlocal last_progress
+            try:
+                record = future.result()
+            except (OSError, UnicodeDecodeError) as e:
+                # The file could not be read; retry it on the next run
+                logger.warning("Skipping %s: %s", log_file.path, e)
+                with lock:
+                    stats.unreadable += 1
+                return
+            except Exception as e:
+                logger.exception("Analyzing %s failed", log_file.path)
+                record = error_record(log_file, question, e)
+            with lock:
+                spool.write(json.dumps(record, ensure_ascii=False) + "\n")
+                spool.flush()
+                if record["status"] == "ok":
+                    checkpoint_file.write(log_file.key + "\n")
+                    checkpoint_file.flush()
+                stats.add(record)
+                if time.perf_counter() - last_progress >= progress_interval:
+                    last_progress = time.perf_counter()
+                    logger.info("Progress: %s", json.dumps(stats.as_dict()))
+
+        # Keep a bounded number of files in flight so memory does not grow
+        # with the size of the input set
+        pending: Dict[Future[Dict[str, Any]], LogFile] = {}
+        for log_file in find_log_files(patterns, extensions):
+            if log_file.key in done:
+                stats.skipped += 1
+                continue
+            if len(pending) >= 2 * workers:
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    finish(future, pending.pop(future))
+            future = pool.submit(analyze_file, log_file, question, max_chars, retries)
+            pending[future] = log_file
+        for future in list(pending):
+            finish(future, pending.pop(future))
+        pool.shutdown()
+
+    if to_parquet:
+        write_parquet(spool_path, output)
+    else:
+        compact_jsonl(output)
+    return stats.as_dict()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m docsassist.batch",
+        description="Analyze log files with the LLM deployment",
+    )
+    parser.add_argument("paths", nargs="+", help="Directories or glob patterns")
+    parser.add_argument("--output", "-o", required=True, help=".jsonl or .parquet")
+    parser.add_argument("--question", "-q", default=DEFAULT_QUESTION)
+    parser.add_argument("--workers", "-w", type=int, default=4)
+    parser.add_argument("--max-chars", type=int, default=100_000)
+    parser.add_argument("--retries", type=int, default=2)
+    parser.add_argument("--checkpoint", help="Defaults to <output>.checkpoint")
+    parser.add_argument(
+        "--extensions",
+        default=",".join(DEFAULT_EXTENSIONS),
+        help="Comma-separated suffixes picked up when walking directories",
+    )
+    parser.add_argument("--progress-interval", type=float, default=10.0)
+    args = parser.parse_args(argv)
+
+    if args.output.endswith(".parquet"):
+        try:
+            check_parquet_engine()
+        except ImportError as e:
+            parser.error(str(e))
+
+    logging.basicConfig(format="%(levelname)s:%(message)s", level=logging.INFO)
+    stats = run(
+        args.paths,
+        args.output,
+        question=args.question,
+        workers=args.workers,
+        max_chars=args.max_chars,
+        retries=args.retries,
+        checkpoint=args.checkpoint,
+        extensions=[ext.strip().lower() for ext in args.extensions.split(",")],
+        progress_interval=args.progress_interval,
+    )
+    print(json.dumps(stats, indent=2))
+    return 1 if stats["failed"] or stats["unreadable"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,275 @@
+# Copyright 2024 DataRobot, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Response cache for chat completions keyed by a normalized request hash."""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Dict, Literal, Mapping, Optional, Sequence, Tuple
+
+from pydantic import AliasChoices, Field
+from pydantic_settings import BaseSettings
+
+response_cache_env_prefix: str = "RESPONSE_CACHE_"
+
+
+def _env_alias(name: str) -> AliasChoices:
+    return AliasChoices(
+        "MLOPS_RUNTIME_PARAM_" + response_cache_env_prefix + name,
+        response_cache_env_prefix + name,
+    )
+
+
+class CacheSettings(BaseSettings):
+    """Response cache settings from env or DR runtime parameters"""
+
+    enabled: bool = Field(default=True, validation_alias=_env_alias("ENABLED"))
+    backend: Literal["memory", "sqlite"] = Field(
+        default="memory", validation_alias=_env_alias("BACKEND")
+    )
+    ttl_seconds: float = Field(default=3600.0, validation_alias=_env_alias("TTL"))
+    max_entries: int = Field(default=512, validation_alias=_env_alias("MAX_ENTRIES"))
+    sqlite_path: str = Field(
+        default="/tmp/log_analyzer_response_cache.sqlite3",
+        validation_alias=_env_alias("SQLITE_PATH"),
+    )
+
+
+def _normalize_text(text: str) -> str:
+    """Normalize line endings and trailing whitespace so cosmetic edits still hit."""
+    lines = text.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+    return "\n".join(line.rstrip() for line in lines).strip()
+
+
+def make_cache_key(
+    deployment_id: str,
+    messages: Sequence[Mapping[str, Any]],
+    settings: Optional[Mapping[str, Any]] = None,
+) -> str:
+    """
+    Build a stable cache key for a chat completion request.
+
+    Args:
+        deployment_id (str): The LLM deployment the request is sent to
+        messages (list): The full message list sent to the deployment
+        settings (dict): Any other request settings that influence the answer
+
+    Returns:
+        str: Hex digest identifying the request
+    """
+    payload = {
+        "deployment_id": deployment_id,
+        "settings": dict(settings or {}),
+        "messages": [
+            {"role": msg["role"], "content": _normalize_text(str(msg["content"]))}
+            for msg in messages
+        ],
+    }
+    encoded = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class CacheStats:
+    """Hit/miss counters for a response cache."""
+
+    hits: int = 0
+    misses: int = 0
+    bypasses: int = 0
+    evictions: int = 0
+    _lock: threading.Lock = field(
+        default_factory=threading.Lock, repr=False, compare=False
+    )
+
+    def record(self, name: str, count: int = 1) -> None:
+        with self._lock:
+            setattr(self, name, getattr(self, name) + count)
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def as_dict(self) -> Dict[str, float]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "bypasses": self.bypasses,
+            "evictions": self.evictions,
+            "hit_rate": self.hit_rate,
+        }
+
+
+class CacheBackend(ABC):
+    """Storage for cached responses with TTL and bounded size."""
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[Dict[str, Any]]: ...
+
+    @abstractmethod
+    def set(self, key: str, value: Dict[str, Any], ttl_seconds: float) -> int:
+        """Store a value and return the number of entries evicted to make room."""
+
+    @abstractmethod
+    def clear(self) -> None: ...
+
+    @abstractmethod
+    def __len__(self) -> int: ...
+
+
+class InMemoryCacheBackend(CacheBackend):
+    """Process-local LRU cache. Shared by all sessions of one replica."""
+
+    def __init__(self, max_entries: int) -> None:
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, Tuple[float, Dict[str, Any]]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Dict[str, Any], ttl_seconds: float) -> int:
+        evicted = 0
+        with self._lock:
+            self._entries[key] = (time.time() + ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                evicted += 1
+        return evicted
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteCacheBackend(CacheBackend):
+    """On-disk LRU cache that can be shared by replicas mounting the same path."""
+
+    def __init__(self, path: str, max_entries: int) -> None:
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=5.0, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "expires_at REAL NOT NULL, last_access REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS responses_last_access "
+                "ON responses (last_access)"
+            )
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] < now:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                return None
+            self._conn.execute(
+                "UPDATE responses SET last_access = ? WHERE key = ?", (now, key)
+            )
+        value: Dict[str, Any] = json.loads(row[0])
+        return value
+
+    def set(self, key: str, value: Dict[str, Any], ttl_seconds: float) -> int:
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now + ttl_seconds, now),
+            )
+            self._conn.execute("DELETE FROM responses WHERE expires_at < ?", (now,))
+            cursor = self._conn.execute(
+                "DELETE FROM responses WHERE key IN ("
+                "SELECT key FROM responses ORDER BY last_access DESC "
+                "LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+        return max(cursor.rowcount, 0)
+
+    def clear(self) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM responses")
+
+    def __len__(self) -> int:
+        with self._lock:
+            row = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()
+        return int(row[0])
+
+
+class ResponseCache:
+    """TTL/LRU cache of chat completion responses with hit-rate accounting."""
+
+    def __init__(self, backend: CacheBackend, ttl_seconds: float) -> None:
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self.stats = CacheStats()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        value = self.backend.get(key)
+        self.stats.record("hits" if value is not None else "misses")
+        return value
+
+    def put(self, key: str, value: Dict[str, Any]) -> None:
+        evicted = self.backend.set(key, value, self.ttl_seconds)
+        if evicted:
+            self.stats.record("evictions", evicted)
+
+    def bypass(self) -> None:
+        """Record a lookup that was skipped on purpose, e.g. a regenerate."""
+        self.stats.record("bypasses")
+
+
+@lru_cache(maxsize=1)
+def get_response_cache() -> Optional[ResponseCache]:
+    """Return the process-wide response cache, or None when disabled."""
+    settings = CacheSettings()
+    if not settings.enabled:
+        return None
+    backend: CacheBackend
+    if settings.backend == "sqlite":
+        backend = SQLiteCacheBackend(settings.sqlite_path, settings.max_entries)
+    else:
+        backend = InMemoryCacheBackend(settings.max_entries)
+    return ResponseCache(backend, settings.ttl_seconds)
@@ -0,0 +1,314 @@
+# Copyright 2024 DataRobot, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Correlating uploads by request and trace ID.
+
+An incident usually spans the logs of several services. Each upload is
+indexed in a single pass as it is decoded, a block of whole lines at a
+time: UUIDs, W3C ``traceparent`` trace IDs and values of keys such as
+``trace_id``, ``requestId`` or ``x-request-id`` are mapped to the offsets
+of the lines they appear on. IDs are lowercased, so services that log
+them in different cases still match.
+
+A question mentioning an indexed ID then gets that request's timeline:
+its lines from every file, merged by timestamp and prefixed with the file
+name, at most CORRELATION_MAX_LINES of them. With CORRELATION_TIMELINE_ONLY,
+the timelines and the files' facts are sent instead of the whole files.
+To try it on local files:
+
+    python -m docsassist.correlation api.log worker.log --id 4bf92f3577b34da6
+"""
+
+from __future__ import annotations
+
+import argparse
+import re
+import sys
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+from pydantic import AliasChoices, Field
+from pydantic_settings import BaseSettings
+
+from docsassist import decoding
+from docsassist.ingest import ATTACHMENT_MARKER
+from docsassist.parsing import parse_line
+
+correlation_env_prefix: str = "CORRELATION_"
+
+# Both patterns start with a literal, which the re module searches for fast
+_UUID = re.compile(r"-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}(?![0-9a-z])")
+_UUID_HEAD = re.compile(r"(?<![0-9a-z])[0-9a-f]{8}")
+_KEYED = re.compile(
+    r"id[\"']?\s{0,3}[:=]\s{0,3}[\"']?((?=[\w.:-]{0,127}\d)[\w.:-]{6,128})"
+)
+_ID_KEY = re.compile(
+    r"(?:trace|request|req|correlation|transaction|x-request|x-correlation)[_-]?$"
+)
+_TRACEPARENT = re.compile(
+    r"traceparent[\"']?\s{0,3}[:=]\s{0,3}[\"']?[0-9a-f]{2}-([0-9a-f]{32})-"
+)
+# Words of a question that may be an ID
+_TOKEN = re.compile(r"[\w.:-]{6,128}")
+
+
+def _env_alias(name: str) -> AliasChoices:
+    return AliasChoices(
+        "MLOPS_RUNTIME_PARAM_" + correlation_env_prefix + name,
+        correlation_env_prefix + name,
+    )
+
+
+class CorrelationSettings(BaseSettings):
+    """Correlation index settings from env or DR runtime parameters"""
+
+    enabled: bool = Field(default=True, validation_alias=_env_alias("ENABLED"))
+    max_lines: int = Field(
+        default=200,
+        ge=2,
+        validation_alias=_env_alias("MAX_LINES"),
+        description="Lines of a timeline; the first and last half are kept",
+    )
+    max_timelines: int = Field(
+        default=3, ge=1, validation_alias=_env_alias("MAX_TIMELINES")
+    )
+    max_ids: int = Field(
+        default=1_000_000,
+        ge=1,
+        validation_alias=_env_alias("MAX_IDS"),
+        description="IDs indexed per file; later IDs are not indexed",
+    )
+    timeline_only: bool = Field(
+        default=True,
+        validation_alias=_env_alias("TIMELINE_ONLY"),
+        description="Send timelines and facts instead of the files when there are any",
+    )
+
+
+def extract_ids(text: str) -> Set[Tuple[int, str]]:
+    """(position, ID) of the IDs in lowercased text."""
+    found = set()
+    for match in _UUID.finditer(text):
+        start = match.start() - 8
+        if start >= 0 and _UUID_HEAD.match(text, start):
+            found.add((start, text[start : match.end()]))
+    for match in _KEYED.finditer(text):
+        if _ID_KEY.search(text, max(0, match.start() - 16), match.start()):
+            found.add((match.start(), match.group(1)))
+    for match in _TRACEPARENT.finditer(text):
+        found.add((match.start(), match.group(1)))
+    return found
+
+
+class FileIndex:
+    """Decoded text of one file and the offsets of the lines of each ID in it."""
+
+    def __init__(self, name: str, max_ids: int = 1_000_000) -> None:
+        self.name = name
+        self.max_ids = max_ids
+        self.ids: Dict[str, List[int]] = {}
+        self.lines = 0
+        self._parts: List[str] = []
+        self._length = 0
+        self._text: Optional[str] = None
+
+    @classmethod
+    def from_bytes(
+        cls, name: str, data: bytes, settings: Optional[CorrelationSettings] = None
+    ) -> FileIndex:
+        """Decode and index a file in one pass, a chunk at a time."""
+        settings = settings or CorrelationSettings()
+        index = cls(name, settings.max_ids)
+        decoder = decoding.Decoder(decoding.detect_encoding(data))
+        view = memoryview(data)
+        pending = ""
+        for start in range(0, len(data), decoding.CHUNK_BYTES):
+            pending += decoder.decode(view[start : start + decoding.CHUNK_BYTES])
+            # Blocks end on a line break, so no line is split between two
+            end = pending.rfind("\n") + 1
+            if end:
+                index.add_block(pending[:end])
+                pending = pending[end:]
+        pending += decoder.decode(b"", final=True)
+        if pending:
+            index.add_block(pending)
+        return index
+
+    def add_block(self, block: str) -> None:
+        """Index a block of whole lines that follows the blocks added so far."""
+        base = self._length
+        # Lowercasing keeps offsets only when every character stays one character
+        lowered = block.lower() if block.isascii() else None
+        found = extract_ids(lowered) if lowered is not None else self._extract(block)
+        for position, found_id in sorted(found):
+            line_start = base + block.rfind("\n", 0, position) + 1
+            offsets = self.ids.get(found_id)
+            if offsets is None:
+                if len(self.ids) >= self.max_ids:
+                    continue
+                offsets = self.ids[found_id] = []
+            if not offsets or offsets[-1] != line_start:
+                offsets.append(line_start)
+        self._parts.append(block)
+        self._length += len(block)
+        self.lines += block.count("\n")
+        self._text = None
+
+    @staticmethod
+    def _extract(block: str) -> Set[Tuple[int, str]]:
+        # Line by line, so that only lines that change length when lowercased
+        # are found at the wrong position, and only within their line
+        found = set()
+        start = 0
+        for line in block.splitlines(keepends=True):
+            found.update(
+                (start + min(position, len(line) - 1), found_id)
+                for position, found_id in extract_ids(line.lower())
+            )
+            start += len(line)
+        return found
+
+    @property
+    def text(self) -> str:
+        if self._text is None:
+            self._text = "".join(self._parts)
+            self._parts = [self._text]
+        return self._text
+
+    def line_at(self, offset: int) -> str:
+        end = self.text.find("\n", offset)
+        return self.text[offset : end if end >= 0 else len(self.text)].rstrip("\r")
+
+
+class TimelineLine(NamedTuple):
+    timestamp: Optional[float]
+    file: int
+    offset: int
+    line: str
+
+
+def find_ids(question: str, files: Sequence[FileIndex]) -> List[str]:
+    """IDs in the question that are indexed in any of the files, in order."""
+    ids = []
+    for token in _TOKEN.findall(question.lower()):
+        token = token.strip(".:-")
+        if token not in ids and any(token in index.ids for index in files):
+            ids.append(token)
+    return ids
+
+
+def timeline(request_id: str, files: Sequence[FileIndex]) -> List[TimelineLine]:
+    """Lines of the ID in every file, by timestamp then file order."""
+    lines = []
+    for i, index in enumerate(files):
+        # Lines without a timestamp, such as stack traces, follow the line before
+        previous = None
+        for offset in index.ids.get(request_id, ()):
+            line = index.line_at(offset)
+            timestamp = parse_line(line).timestamp
+            if timestamp is None:
+                timestamp = previous
+            previous = timestamp
+            lines.append(TimelineLine(timestamp, i, offset, line))
+    lines.sort(
+        key=lambda item: (
+            item.timestamp is not None,
+            item.timestamp or 0.0,
+            item.file,
+            item.offset,
+        )
+    )
+    return lines
+
+
+def render_timeline(
+    request_id: str, files: Sequence[FileIndex], max_lines: int = 200
+) -> Optional[str]:
+    """The ID's timeline as a prompt attachment; None if it is nowhere."""
+    lines = timeline(request_id, files)
+    if not lines:
+        return None
+    names = sorted({files[item.file].name for item in lines})
+    width = max(len(name) for name in names)
+    rendered = [f"{files[item.file].name:{width}} | {item.line}" for item in lines]
+    if len(rendered) > max_lines:
+        head = max_lines // 2
+        tail = max_lines - head
+        omitted = len(rendered) - max_lines
+        rendered = (
+            rendered[:head] + [f"... {omitted:,} lines omitted ..."] + rendered[-tail:]
+        )
+    return (
+        f"{ATTACHMENT_MARKER} Timeline of {request_id} ({len(lines):,} lines in "
+        f"{len(names)} files: {', '.join(names)}):\n" + "\n".join(rendered)
+    )
+
+
+def timeline_attachments(
+    question: str,
+    files: Sequence[FileIndex],
+    settings: Optional[CorrelationSettings] = None,
+) -> List[str]:
+    """Timelines of the IDs the question mentions, if correlation is enabled."""
+    settings = settings or CorrelationSettings()
+    if not settings.enabled or not files:
+        return []
+    attachments = []
+    for request_id in find_ids(question, files)[: settings.max_timelines]:
+        attachment = render_timeline(request_id, files, settings.max_lines)
+        if attachment is not None:
+            attachments.append(attachment)
+    return attachments
+
+
+def index_files(paths: Iterable[str]) -> List[FileIndex]:
+    indexes = []
+    for path in paths:
+        with open(path, "rb") as f:
+            indexes.append(FileIndex.from_bytes(path, f.read()))
+    return indexes
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m docsassist.correlation",
+        description="Print the merged timeline of a request across log files",
+    )
+    parser.add_argument("paths", nargs="+", help="Log files to index")
+    parser.add_argument("--id", dest="request_id", help="Request or trace ID")
+    parser.add_argument("--max-lines", type=int, default=200)
+    args = parser.parse_args(argv)
+
+    files = index_files(args.paths)
+    if args.request_id is None:
+        # The IDs seen in the most files, then on the most lines
+        counts: Dict[str, Tuple[int, int]] = {}
+        for index in files:
+            for found_id, offsets in index.ids.items():
+                seen_in, lines = counts.get(found_id, (0, 0))
+                counts[found_id] = (seen_in + 1, lines + len(offsets))
+        top = sorted(counts.items(), key=lambda item: item[1], reverse=True)[:20]
+        for found_id, (seen_in, lines) in top:
+            print(f"{found_id}  {seen_in} files  {lines:,} lines")
+        return 0
+    rendered = render_timeline(args.request_id.lower(), files, args.max_lines)
+    if rendered is None:
+        print(f"{args.request_id} is not in any of the files", file=sys.stderr)
+        return 1
+    print(rendered)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
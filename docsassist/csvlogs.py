@@ -0,0 +1,310 @@
+# Copyright 2024 DataRobot, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+CSV log exports: chunked reading, column projection and row filters.
+
+Exports from observability tools have dozens of columns and far more rows
+than matter to a question. Here the file is read in chunks of CSV_CHUNK_ROWS
+rows, only the selected columns are kept and rows are filtered before
+anything is written to the prompt, so the memory used by pandas is bounded
+by the chunk size rather than the file size. Values are kept as the text
+of the file; column types are inferred from a sample and only decide how
+filters compare.
+
+Filters are space-separated conditions that must all hold, such as
+``status>=500 service=api "timed out"``: ``column<op>value`` with one of
+= != < <= > >=, where = and != on text columns match a substring, or
+plain text that must appear in one of the kept columns. Conditions on
+columns that do not exist are searched for as plain text.
+"""
+
+from __future__ import annotations
+
+import codecs
+import csv
+import io
+import operator
+import re
+import shlex
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Sequence
+
+from pydantic import AliasChoices, Field
+from pydantic_settings import BaseSettings
+
+from docsassist import decoding
+from docsassist.exceptions import InvalidFilterError
+from docsassist.ingest import ATTACHMENT_MARKER
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+csv_env_prefix: str = "CSV_"
+
+CSV_EXTENSIONS: tuple[str, ...] = (".csv", ".tsv")
+DELIMITERS: str = ",;\t|"
+
+_CONDITION = re.compile(r"^([^<>=!]+?)(<=|>=|!=|=|<|>)(.*)$")
+_OPERATORS: Dict[str, Callable[[Any, Any], Any]] = {
+    "=": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+}
+
+
+def _env_alias(name: str) -> AliasChoices:
+    return AliasChoices(
+        "MLOPS_RUNTIME_PARAM_" + csv_env_prefix + name,
+        csv_env_prefix + name,
+    )
+
+
+class CsvSettings(BaseSettings):
+    """CSV reading settings from env or DR runtime parameters"""
+
+    chunk_rows: int = Field(
+        default=50_000, ge=1, validation_alias=_env_alias("CHUNK_ROWS")
+    )
+    sample_rows: int = Field(
+        default=1000, ge=1, validation_alias=_env_alias("SAMPLE_ROWS")
+    )
+
+
+@dataclass
+class Condition:
+    column: str
+    op: str
+    value: str
+
+
+@dataclass
+class CsvQuery:
+    """Columns to keep (all when empty) and conditions rows must meet."""
+
+    columns: List[str] = field(default_factory=list)
+    conditions: List[Condition] = field(default_factory=list)
+    text: List[str] = field(default_factory=list)
+
+    def __bool__(self) -> bool:
+        return bool(self.columns or self.conditions or self.text)
+
+
+@dataclass
+class CsvColumns:
+    """Header and inferred column types of a CSV file."""
+
+    encoding: str
+    delimiter: str
+    names: List[str]
+    kinds: Dict[str, str]
+
+    def is_numeric(self, column: str) -> bool:
+        return self.kinds.get(column) in ("int", "float")
+
+
+def is_csv(name: str) -> bool:
+    return name.lower().endswith(CSV_EXTENSIONS)
+
+
+def _pandas_encoding(data: bytes, encoding: str) -> str:
+    # Codecs that drop a byte order mark, so it does not stick to the header
+    if encoding == "utf-8":
+        return "utf-8-sig"
+    if encoding.startswith(("utf-16", "utf-32")) and data.startswith(
+        (codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE, codecs.BOM_UTF32_BE)
+    ):
+        return encoding[:6]
+    return encoding
+
+
+def _sniff_delimiter(data: bytes, encoding: str) -> str:
+    head = decoding.Decoder(encoding).decode(data[: 64 * 1024])
+    if "\n" in head:
+        # Sniff whole lines only
+        head = head[: head.rindex("\n")]
+    try:
+        return csv.Sniffer().sniff(head, delimiters=DELIMITERS).delimiter
+    except csv.Error:
+        return ","
+
+
+def _kind(dtype: Any) -> str:
+    import pandas as pd
+
+    if pd.api.types.is_bool_dtype(dtype):
+        return "bool"
+    if pd.api.types.is_integer_dtype(dtype):
+        return "int"
+    if pd.api.types.is_float_dtype(dtype):
+        return "float"
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return "datetime"
+    return "text"
+
+
+def read_columns(data: bytes, settings: Optional[CsvSettings] = None) -> CsvColumns:
+    """The header of a CSV file, with column types inferred from its first rows."""
+    import pandas as pd
+
+    settings = settings or CsvSettings()
+    encoding = _pandas_encoding(data, decoding.detect_encoding(data))
+    delimiter = _sniff_delimiter(data, encoding)
+    sample = pd.read_csv(
+        io.BytesIO(data),
+        sep=delimiter,
+        nrows=settings.sample_rows,
+        encoding=encoding,
+        encoding_errors="replace",
+        on_bad_lines="skip",
+    )
+    names = [str(name) for name in sample.columns]
+    return CsvColumns(
+        encoding=encoding,
+        delimiter=delimiter,
+        names=names,
+        kinds={str(name): _kind(dtype) for name, dtype in sample.dtypes.items()},
+    )
+
+
+def parse_query(
+    columns: CsvColumns, selected: Sequence[str] = (), filter_text: str = ""
+) -> CsvQuery:
+    """
+    A query from selected columns and a filter such as ``status>=500 timeout``.
+
+    Raises:
+        InvalidFilterError: The filter compares a text column with < or >,
+            a numeric column with text, or is not properly quoted
+    """
+    try:
+        tokens = shlex.split(filter_text)
+    except ValueError as e:
+        raise InvalidFilterError(f"Invalid filter: {e}") from e
+    query = CsvQuery(columns=[name for name in selected if name in columns.names])
+    for token in tokens:
+        match = _CONDITION.match(token)
+        if match is None or match.group(1) not in columns.names:
+            # Such as "user=alice" in a message column
+            query.text.append(token)
+            continue
+        column, op, value = match.groups()
+        if columns.is_numeric(column):
+            try:
+                float(value)
+            except ValueError as e:
+                raise InvalidFilterError(
+                    f"{column} is numeric, {value!r} is not a number"
+                ) from e
+        elif op not in ("=", "!="):
+            raise InvalidFilterError(f"{column} is not numeric, use = or !=")
+        query.conditions.append(Condition(column, op, value))
+    return query
+
+
+def _row_mask(chunk: pd.DataFrame, query: CsvQuery, columns: CsvColumns) -> Any:
+    import pandas as pd
+
+    mask = pd.Series(True, index=chunk.index)
+    for condition in query.conditions:
+        values = chunk[condition.column]
+        if columns.is_numeric(condition.column):
+            numbers = pd.to_numeric(values, errors="coerce")
+            mask &= _OPERATORS[condition.op](numbers, float(condition.value))
+        else:
+            found = values.str.contains(condition.value, case=False, regex=False)
+            mask &= found if condition.op == "=" else ~found
+    if query.text:
+        shown = chunk[query.columns or list(chunk.columns)]
+        for text in query.text:
+            found = pd.Series(False, index=chunk.index)
+            for name in shown.columns:
+                found |= shown[name].str.contains(text, case=False, regex=False)
+            mask &= found
+    return mask
+
+
+def render(
+    data: bytes,
+    query: Optional[CsvQuery] = None,
+    columns: Optional[CsvColumns] = None,
+    settings: Optional[CsvSettings] = None,
+) -> str:
+    """
+    The selected columns of the rows matching the query, as CSV with a header.
+
+    The file is read CSV_CHUNK_ROWS rows at a time; a short note with the
+    number of matching rows comes first.
+    """
+    import pandas as pd
+
+    settings = settings or CsvSettings()
+    query = query or CsvQuery()
+    columns = columns or read_columns(data, settings)
+    shown = query.columns or columns.names
+    needed = set(shown)
+    needed.update(condition.column for condition in query.conditions)
+
+    output = io.StringIO()
+    total = kept = 0
+    reader = pd.read_csv(
+        io.BytesIO(data),
+        sep=columns.delimiter,
+        usecols=lambda name: name in needed,
+        # Cells are sent as written in the file; numbers are parsed only to filter
+        dtype=str,
+        keep_default_na=False,
+        chunksize=settings.chunk_rows,
+        encoding=columns.encoding,
+        encoding_errors="replace",
+        on_bad_lines="skip",
+    )
+    with reader:
+        for chunk in reader:
+            total += len(chunk)
+            if query.conditions or query.text:
+                chunk = chunk[_row_mask(chunk, query, columns)]
+            kept += len(chunk)
+            chunk.to_csv(
+                output,
+                columns=shown,
+                sep=columns.delimiter,
+                header=output.tell() == 0,
+                index=False,
+            )
+    if not output.tell():
+        output.write(columns.delimiter.join(shown) + "\n")
+
+    notes = [f"{kept:,} of {total:,} rows"]
+    if query.columns:
+        notes.append(f"{len(shown)} of {len(columns.names)} columns")
+    filters = [f"{c.column}{c.op}{c.value}" for c in query.conditions] + [
+        repr(text) for text in query.text
+    ]
+    if filters:
+        notes.append("rows where " + " and ".join(filters))
+    return f"CSV: {', '.join(notes)}\n{output.getvalue().rstrip()}"
+
+
+def csv_attachment(
+    name: str,
+    data: bytes,
+    query: Optional[CsvQuery] = None,
+    columns: Optional[CsvColumns] = None,
+) -> str:
+    """The projected and filtered CSV formatted as a prompt attachment."""
+    return f"{ATTACHMENT_MARKER} {name}:\n{render(data, query, columns)}"
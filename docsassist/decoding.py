@@ -0,0 +1,161 @@
+# Copyright 2024 DataRobot, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Decoding uploads whatever their encoding, with binary regions skipped.
+
+The encoding is detected from the first SAMPLE_BYTES of a file only: a
+byte order mark, UTF-16 without one (every other byte NUL), UTF-8, or
+else Shift_JIS (cp932) when the non-ASCII text reads as Japanese and
+Windows-1252 (Latin-1) otherwise. The file is then decoded once, in
+chunks, with invalid bytes replaced. In chunks with NULs or invalid bytes,
+runs of control and replacement characters, such as a core dump or a gzip
+member pasted into a log, are replaced by a one-line marker.
+"""
+
+from __future__ import annotations
+
+import codecs
+import re
+from typing import NamedTuple, Optional, Tuple
+
+SAMPLE_BYTES: int = 64 * 1024
+CHUNK_BYTES: int = 1024 * 1024
+
+# Longest first: the UTF-32 LE mark starts with the UTF-16 LE one
+_BOMS: Tuple[Tuple[bytes, str], ...] = (
+    (codecs.BOM_UTF32_LE, "utf-32-le"),
+    (codecs.BOM_UTF32_BE, "utf-32-be"),
+    (codecs.BOM_UTF8, "utf-8"),
+    (codecs.BOM_UTF16_LE, "utf-16-le"),
+    (codecs.BOM_UTF16_BE, "utf-16-be"),
+)
+# Control characters that do not occur in text (tab, newlines, form feed
+# and ESC of ANSI colors do), and the replacement character
+_BINARY_CHARS = "\\x00-\\x08\\x0e-\\x1a\\x1c-\\x1f\\x7f\\ufffd"
+# At least four binary characters, each within 64 characters of the previous
+_BINARY_RUN = re.compile(
+    f"[{_BINARY_CHARS}](?:[^{_BINARY_CHARS}]{{0,63}}[{_BINARY_CHARS}]){{3,}}"
+)
+# CJK punctuation, kana, kanji and half/full-width forms
+_JAPANESE = re.compile("[\\u3000-\\u30ff\\u4e00-\\u9fff\\uff00-\\uffef]")
+
+
+class DecodedText(NamedTuple):
+    text: str
+    encoding: str
+    binary_chars: int
+
+
+def _utf16_without_bom(sample: bytes) -> Optional[str]:
+    sample = sample[:4096]
+    half = len(sample) // 2
+    if half < 16:
+        return None
+    even = sample[0::2].count(0)
+    odd = sample[1::2].count(0)
+    # ASCII text in UTF-16 has a NUL in every other byte
+    if odd > 0.4 * half and even < 0.05 * half:
+        return "utf-16-le"
+    if even > 0.4 * half and odd < 0.05 * half:
+        return "utf-16-be"
+    return None
+
+
+def _non_ascii(text: str) -> int:
+    return len(text) - len(text.encode("ascii", errors="ignore"))
+
+
+def detect_encoding(sample: bytes) -> str:
+    """The encoding of a file, from its first bytes."""
+    sample = sample[:SAMPLE_BYTES]
+    for bom, encoding in _BOMS:
+        if sample.startswith(bom):
+            return encoding
+    utf16 = _utf16_without_bom(sample)
+    if utf16 is not None:
+        return utf16
+
+    # The sample may end inside a character
+    text = codecs.getincrementaldecoder("utf-8")(errors="replace").decode(sample)
+    invalid = text.count("\ufffd")
+    if not invalid:
+        return "utf-8"
+    # A few bad bytes in otherwise valid UTF-8 are damage, not another encoding
+    if _non_ascii(text) - invalid >= invalid:
+        return "utf-8"
+    text = sample.decode("cp932", errors="replace")
+    non_ascii = _non_ascii(text)
+    if (
+        text.count("\ufffd") < 0.05 * non_ascii
+        and len(_JAPANESE.findall(text)) > 0.5 * non_ascii
+    ):
+        return "cp932"
+    return "cp1252"
+
+
+class Decoder:
+    """Incremental decoding with replacement; binary runs become markers."""
+
+    def __init__(self, encoding: str) -> None:
+        self.encoding = encoding
+        self.binary_chars = 0
+        self._decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+        self._started = False
+
+    def _mark(self, match: re.Match[str]) -> str:
+        run = len(match.group())
+        self.binary_chars += run
+        return f"[binary data, {run:,} characters skipped]"
+
+    def decode(self, data: bytes, final: bool = False) -> str:
+        text = self._decoder.decode(data, final)
+        if not self._started and text:
+            self._started = True
+            if text[0] == "\ufeff":
+                text = text[1:]
+        # Binary data has NULs, or invalid bytes; searching for either is
+        # much faster than the regular expression
+        if "\x00" in text or "\ufffd" in text:
+            text = _BINARY_RUN.sub(self._mark, text).replace("\x00", "")
+        return text
+
+
+def decode(data: bytes, encoding: Optional[str] = None) -> DecodedText:
+    """Decode a whole file, detecting its encoding unless given."""
+    decoder = Decoder(encoding or detect_encoding(data))
+    view = memoryview(data)
+    parts = [
+        decoder.decode(view[start : start + CHUNK_BYTES])
+        for start in range(0, len(data), CHUNK_BYTES)
+    ]
+    parts.append(decoder.decode(b"", final=True))
+    return DecodedText("".join(parts), decoder.encoding, decoder.binary_chars)
+
+
+def tail(data: bytes, max_bytes: int, encoding: str) -> Tuple[int, bytes]:
+    """The complete lines in the last max_bytes of data, and the bytes skipped."""
+    if len(data) <= max_bytes:
+        return 0, data
+    newline = "\n".encode(encoding)
+    start = len(data) - max_bytes
+    while True:
+        start = data.find(newline, start)
+        if start < 0:
+            return len(data), b""
+        # A match must start on a character boundary of fixed-width encodings
+        if start % len(newline) == 0:
+            start += len(newline)
+            return start, data[start:]
+        start += 1
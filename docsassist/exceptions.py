@@ -0,0 +1,58 @@
+# Copyright 2024 DataRobot, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Errors raised by the docsassist core; UIs decide how to present them."""
+
+from __future__ import annotations
+
+from typing import Optional
+
+
+class DocsAssistError(Exception):
+    """Base class for errors raised by docsassist."""
+
+
+class DeploymentNotFoundError(DocsAssistError):
+    """The LLM deployment ID could not be resolved from settings or the stack."""
+
+
+class DeploymentError(DocsAssistError):
+    """The LLM deployment answered with a non-200 status."""
+
+    def __init__(self, status_code: int, body: str) -> None:
+        super().__init__(f"DataRobot API Error: {status_code} - {body}")
+        self.status_code = status_code
+        self.body = body
+
+    @property
+    def retryable(self) -> bool:
+        return self.status_code in (429, 502, 503, 504)
+
+
+class RateLimitError(DeploymentError):
+    """The deployment rejected the request with 429 Too Many Requests."""
+
+    def __init__(
+        self, status_code: int, body: str, retry_after: Optional[float] = None
+    ) -> None:
+        super().__init__(status_code, body)
+        self.retry_after = retry_after
+
+
+class CompletionFormatError(DocsAssistError):
+    """The deployment's response could not be decoded as a chat completion."""
+
+
+class InvalidFilterError(DocsAssistError):
+    """A row filter typed by the user could not be parsed."""
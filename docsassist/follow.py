@@ -0,0 +1,376 @@
+# Copyright 2024 DataRobot, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Follow mode: tail growing logs and ask about what changed.
+
+Each followed source (a local path, or an upload that is re-sent with lines
+appended) keeps the byte offset it has consumed. Only bytes past the offset
+are decoded and parsed, and they update a running digest of the whole
+source: line and level counts, the most frequent message templates and the
+latest errors. A question then carries the digest and only the lines added
+since the previous question, instead of the whole file:
+
+    DATAROBOT_ENDPOINT=... DATAROBOT_API_TOKEN=... LLM_DEPLOYMENT_ID=... \\
+        python -m docsassist.follow /var/log/app/service.log --interval 30
+"""
+
+from __future__ import annotations
+
+import argparse
+import logging
+import os
+import sys
+import time
+from collections import Counter, deque
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Callable, Deque, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from pydantic import AliasChoices, Field
+from pydantic_settings import BaseSettings
+
+from docsassist.decoding import Decoder, detect_encoding
+from docsassist.ingest import ATTACHMENT_MARKER
+from docsassist.parsing import ERROR_LEVELS, ParsedLine, TemplateIndex, parse_lines
+
+logger = logging.getLogger(__name__)
+
+follow_env_prefix: str = "FOLLOW_"
+
+DEFAULT_QUESTION: str = (
+    "What changed in these new log lines? Point out new errors or warnings "
+    "and anything that needs attention."
+)
+# Bytes kept from the start and from just before the offset, to recognise
+# a re-sent upload as the same file with lines appended
+FINGERPRINT_BYTES: int = 4096
+READ_CHUNK_BYTES: int = 1024 * 1024
+MAX_ERROR_LINE_CHARS: int = 300
+
+
+def _env_alias(name: str) -> AliasChoices:
+    return AliasChoices(
+        "MLOPS_RUNTIME_PARAM_" + follow_env_prefix + name,
+        follow_env_prefix + name,
+    )
+
+
+class FollowSettings(BaseSettings):
+    """Follow mode settings from env or DR runtime parameters"""
+
+    delta_max_chars: int = Field(
+        default=20_000, ge=1, validation_alias=_env_alias("DELTA_MAX_CHARS")
+    )
+    top_templates: int = Field(
+        default=15, ge=1, validation_alias=_env_alias("TOP_TEMPLATES")
+    )
+    recent_errors: int = Field(
+        default=5, ge=0, validation_alias=_env_alias("RECENT_ERRORS")
+    )
+
+
+def _format_timestamp(timestamp: float) -> str:
+    moment = datetime.fromtimestamp(timestamp, tz=timezone.utc)
+    return moment.isoformat(timespec="seconds").replace("+00:00", "Z")
+
+
+class LogDigest:
+    """Running aggregates over every line seen from one source."""
+
+    def __init__(self, top_templates: int = 15, recent_errors: int = 5) -> None:
+        self.top_templates = top_templates
+        self.lines = 0
+        self.levels: Counter[str] = Counter()
+        self.sources: Counter[str] = Counter()
+        self.templates: Counter[int] = Counter()
+        self.index = TemplateIndex()
+        self.first_timestamp: Optional[float] = None
+        self.last_timestamp: Optional[float] = None
+        self.recent_errors: Deque[str] = deque(maxlen=recent_errors)
+        self._new_templates: List[int] = []
+
+    def update(self, parsed: Iterable[ParsedLine]) -> None:
+        known = len(self.index)
+        for line in parsed:
+            self.lines += 1
+            self.templates[self.index.id_of(line.template)] += 1
+            if line.level is not None:
+                self.levels[line.level] += 1
+                if line.level in ERROR_LEVELS:
+                    self.recent_errors.append(line.line[:MAX_ERROR_LINE_CHARS])
+            if line.source is not None:
+                self.sources[line.source] += 1
+            if line.timestamp is not None:
+                if self.first_timestamp is None:
+                    self.first_timestamp = line.timestamp
+                self.last_timestamp = line.timestamp
+        self._new_templates.extend(range(known, len(self.index)))
+
+    def render(self) -> str:
+        """Describe the source so far; templates are "new" once per render."""
+        span = ""
+        if self.first_timestamp is not None and self.last_timestamp is not None:
+            span = (
+                f", {_format_timestamp(self.first_timestamp)}"
+                f" to {_format_timestamp(self.last_timestamp)}"
+            )
+        lines = [f"{self.lines:,} lines{span}"]
+        if self.levels:
+            lines.append(
+                "Levels: "
+                + ", ".join(f"{level} {n:,}" for level, n in self.levels.most_common())
+            )
+        if self.sources:
+            lines.append(
+                "Sources: "
+                + ", ".join(f"{name} {n:,}" for name, n in self.sources.most_common(10))
+            )
+        lines.append("Most frequent messages:")
+        for template_id, n in self.templates.most_common(self.top_templates):
+            lines.append(f"  {n:>8,}  {self.index.template(template_id)}")
+        # Skip the first render, where every template is new
+        if self._new_templates and len(self._new_templates) < len(self.index):
+            lines.append("New messages since the last question:")
+            for template_id in self._new_templates[: self.top_templates]:
+                lines.append(
+                    f"  {self.templates[template_id]:>8,}"
+                    f"  {self.index.template(template_id)}"
+                )
+        self._new_templates = []
+        if self.recent_errors:
+            lines.append("Latest errors:")
+            lines.extend(f"  {line}" for line in self.recent_errors)
+        return "\n".join(lines)
+
+
+@dataclass
+class FollowedSource:
+    name: str
+    digest: LogDigest
+    delta_max_chars: int = 20_000
+    offset: int = 0
+    decoder: Optional[Decoder] = None
+    pending: str = ""
+    head: bytes = b""
+    tail: bytes = b""
+    identity: Optional[Tuple[int, int]] = None
+    delta: Deque[str] = field(default_factory=deque)
+    delta_lines: int = 0
+    delta_chars: int = 0
+
+    def continues(self, data: bytes) -> bool:
+        """Whether data is this source's bytes so far, possibly with more appended."""
+        return (
+            len(data) >= self.offset
+            and data.startswith(self.head)
+            and data[self.offset - len(self.tail) : self.offset] == self.tail
+        )
+
+    def restart(self) -> None:
+        """Read from the beginning again; the digest keeps what was counted."""
+        self.offset = 0
+        self.decoder = None
+        self.pending = ""
+        self.head = self.tail = b""
+
+    def consume(self, data: bytes) -> int:
+        """Process bytes appended to the source; returns the new complete lines."""
+        if len(self.head) < FINGERPRINT_BYTES:
+            self.head += data[: FINGERPRINT_BYTES - len(self.head)]
+        self.tail = (self.tail + data[-FINGERPRINT_BYTES:])[-FINGERPRINT_BYTES:]
+        self.offset += len(data)
+
+        if self.decoder is None:
+            self.decoder = Decoder(detect_encoding(data))
+        # The decoder keeps a character split across appends until it is complete
+        text = self.pending + self.decoder.decode(data)
+        end = text.rfind("\n") + 1
+        self.pending = text[end:]
+        if not end:
+            return 0
+        lines = [line for line in text[:end].splitlines() if line.strip()]
+        self.digest.update(parse_lines(lines))
+        self.delta.extend(lines)
+        self.delta_lines += len(lines)
+        self.delta_chars += sum(len(line) + 1 for line in lines)
+        # Keep the newest lines within budget; older ones are only in the digest
+        while self.delta_chars > self.delta_max_chars and len(self.delta) > 1:
+            self.delta_chars -= len(self.delta.popleft()) + 1
+        return len(lines)
+
+    def take_delta(self) -> Tuple[int, str]:
+        """Return and forget the lines added since the last call."""
+        count, lines = self.delta_lines, list(self.delta)
+        if self.pending.strip():
+            # Shown while incomplete, and again once its newline arrives
+            lines.append(self.pending.rstrip())
+        omitted = count - len(self.delta)
+        if omitted:
+            lines.insert(0, f"[... {omitted:,} earlier new lines omitted ...]")
+        self.delta.clear()
+        self.delta_lines = self.delta_chars = 0
+        return count, "\n".join(lines)
+
+
+class FollowUpdate(NamedTuple):
+    source: str
+    new_bytes: int
+    new_lines: int
+    restarted: bool
+
+
+class LogFollower:
+    """Followed sources by name, and the follow-up messages built from them."""
+
+    def __init__(
+        self,
+        delta_max_chars: int = 20_000,
+        top_templates: int = 15,
+        recent_errors: int = 5,
+    ) -> None:
+        self.delta_max_chars = delta_max_chars
+        self.top_templates = top_templates
+        self.recent_errors = recent_errors
+        self.sources: Dict[str, FollowedSource] = {}
+
+    @classmethod
+    def from_settings(cls, settings: Optional[FollowSettings] = None) -> LogFollower:
+        settings = settings or FollowSettings()
+        return cls(
+            delta_max_chars=settings.delta_max_chars,
+            top_templates=settings.top_templates,
+            recent_errors=settings.recent_errors,
+        )
+
+    def _source(self, name: str) -> FollowedSource:
+        source = self.sources.get(name)
+        if source is None:
+            source = self.sources[name] = FollowedSource(
+                name,
+                LogDigest(self.top_templates, self.recent_errors),
+                self.delta_max_chars,
+            )
+        return source
+
+    def feed_upload(self, name: str, data: bytes) -> FollowUpdate:
+        """
+        Process an upload of the whole file.
+
+        If it starts with the bytes already consumed, only the rest is new;
+        otherwise the file was replaced and is read from the beginning.
+        """
+        source = self._source(name)
+        restarted = not source.continues(data)
+        if restarted:
+            source.restart()
+        new_bytes = len(data) - source.offset
+        new_lines = source.consume(data[source.offset :]) if new_bytes else 0
+        return FollowUpdate(name, new_bytes, new_lines, restarted)
+
+    def append(self, name: str, data: bytes) -> FollowUpdate:
+        """Process bytes appended to a source, such as a streamed upload."""
+        return FollowUpdate(name, len(data), self._source(name).consume(data), False)
+
+    def poll_path(self, path: str) -> FollowUpdate:
+        """
+        Read what was appended to a local file since the last poll.
+
+        A different inode, a shorter file or changed first bytes mean the log
+        was rotated or truncated, and it is read from the beginning.
+        """
+        source = self._source(path)
+        with open(path, "rb") as f:
+            stat = os.fstat(f.fileno())
+            identity = (stat.st_dev, stat.st_ino)
+            restarted = source.offset > 0 and (
+                identity != source.identity
+                or stat.st_size < source.offset
+                or f.read(len(source.head)) != source.head
+            )
+            if restarted:
+                source.restart()
+            source.identity = identity
+            f.seek(source.offset)
+            new_bytes = new_lines = 0
+            while chunk := f.read(READ_CHUNK_BYTES):
+                new_bytes += len(chunk)
+                new_lines += source.consume(chunk)
+        return FollowUpdate(path, new_bytes, new_lines, restarted)
+
+    def build_message(
+        self, question: str, redact: Optional[Callable[[str], str]] = None
+    ) -> str:
+        """
+        The question with each source's digest and its lines since the last one.
+
+        Args:
+            question: The question, sent as is
+            redact: Applied to the digests and new lines
+        """
+        blocks = []
+        for source in self.sources.values():
+            count, delta = source.take_delta()
+            news = f"{count:,} new lines" if count else "no new lines"
+            blocks.append(
+                f"{ATTACHMENT_MARKER} {source.name} (summary, {news}):\n"
+                f"{source.digest.render()}"
+            )
+            if delta:
+                blocks.append(
+                    f"{ATTACHMENT_MARKER} {source.name} (new lines):\n{delta}"
+                )
+        if redact is not None:
+            blocks = [redact(block) for block in blocks]
+        return "\n\n".join([question] + blocks)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m docsassist.follow",
+        description="Follow growing log files and ask about new lines",
+    )
+    parser.add_argument("paths", nargs="+", help="Log files to follow")
+    parser.add_argument("--question", "-q", default=DEFAULT_QUESTION)
+    parser.add_argument("--interval", type=float, default=30.0)
+    parser.add_argument(
+        "--once", action="store_true", help="Ask once about the files and exit"
+    )
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(format="%(levelname)s:%(message)s", level=logging.INFO)
+    from docsassist import predict, redaction
+
+    follower = LogFollower.from_settings()
+    try:
+        while True:
+            updates = [follower.poll_path(path) for path in args.paths]
+            for update in updates:
+                if update.restarted:
+                    logger.info("%s was rotated or truncated", update.source)
+            if any(update.new_lines for update in updates):
+                response = predict.get_llm_completion(
+                    follower.build_message(args.question, redaction.redact), []
+                )
+                print(f"--- {_format_timestamp(time.time())}")
+                print(response["choices"][0]["message"]["content"], flush=True)
+            if args.once:
+                return 0
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,206 @@
+# Copyright 2024 DataRobot, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Conversation history compaction with a rolling summary of older turns."""
+
+from __future__ import annotations
+
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Mapping, Optional, Sequence
+
+from pydantic import AliasChoices, Field
+from pydantic_settings import BaseSettings
+
+from docsassist.ingest import ATTACHMENT_MARKER
+
+logger = logging.getLogger(__name__)
+
+history_env_prefix: str = "HISTORY_"
+
+SUMMARY_PREFIX: str = "Summary of the earlier conversation:\n"
+OMITTED_ATTACHMENT: str = " [{0:,} characters sent with this question, not repeated]"
+
+Message = Dict[str, Any]
+Summarizer = Callable[[str, Sequence[Mapping[str, Any]]], str]
+
+
+def _env_alias(name: str) -> AliasChoices:
+    return AliasChoices(
+        "MLOPS_RUNTIME_PARAM_" + history_env_prefix + name,
+        history_env_prefix + name,
+    )
+
+
+class HistorySettings(BaseSettings):
+    """History compaction settings from env or DR runtime parameters"""
+
+    enabled: bool = Field(default=True, validation_alias=_env_alias("COMPACTION"))
+    verbatim_turns: int = Field(
+        default=3, ge=1, validation_alias=_env_alias("VERBATIM_TURNS")
+    )
+    summary_max_chars: int = Field(
+        default=4000, validation_alias=_env_alias("SUMMARY_MAX_CHARS")
+    )
+    turn_max_chars: int = Field(
+        default=8000, validation_alias=_env_alias("TURN_MAX_CHARS")
+    )
+    max_chars: int = Field(
+        default=32000,
+        validation_alias=_env_alias("MAX_CHARS"),
+        description="Unsummarized turns sent; the oldest are dropped beyond it",
+    )
+
+
+@lru_cache(maxsize=1)
+def _summary_executor() -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(max_workers=2, thread_name_prefix="history-summary")
+
+
+class ConversationHistory:
+    """
+    Keeps the last N turns verbatim and folds older turns into a summary.
+
+    The summary is updated in a background thread after each answer, so the
+    next question only waits for it if it is still running when asked.
+    Until the update lands, the turns it covers are sent verbatim.
+
+    Turns sent verbatim are clipped to turn_max_chars, without the files
+    attached to their question, which the current question carries again.
+    If updates keep failing, the oldest turns beyond max_chars are dropped.
+    """
+
+    def __init__(
+        self,
+        verbatim_turns: int = 3,
+        summary_max_chars: int = 4000,
+        turn_max_chars: int = 8000,
+        max_chars: int = 32000,
+    ) -> None:
+        self.verbatim_turns = verbatim_turns
+        self.summary_max_chars = summary_max_chars
+        self.turn_max_chars = turn_max_chars
+        self.max_chars = max_chars
+        self.summary = ""
+        self.summarized_upto = 0
+        self._pending: Optional[Future[None]] = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(
+        cls, settings: Optional[HistorySettings] = None
+    ) -> Optional[ConversationHistory]:
+        """Return a history manager, or None if compaction is disabled."""
+        settings = settings or HistorySettings()
+        if not settings.enabled:
+            return None
+        return cls(
+            verbatim_turns=settings.verbatim_turns,
+            summary_max_chars=settings.summary_max_chars,
+            turn_max_chars=settings.turn_max_chars,
+            max_chars=settings.max_chars,
+        )
+
+    def build_messages(self, messages: Sequence[Mapping[str, Any]]) -> List[Message]:
+        """Return the summary as a system message followed by the unsummarized turns."""
+        with self._lock:
+            summary = self.summary
+            upto = min(self.summarized_upto, len(messages))
+        compacted: List[Message] = []
+        if summary:
+            compacted.append({"role": "system", "content": SUMMARY_PREFIX + summary})
+        turns = [
+            {
+                "role": msg["role"],
+                "content": self._clip(self._without_attachments(str(msg["content"]))),
+            }
+            for msg in messages[upto:]
+        ]
+        # Turns pile up while summary updates fail; drop the oldest exchanges
+        total = sum(len(turn["content"]) for turn in turns)
+        while total > self.max_chars and len(turns) > 2:
+            total -= sum(len(turn["content"]) for turn in turns[:2])
+            del turns[:2]
+        compacted.extend(turns)
+        return compacted
+
+    def schedule_update(
+        self, messages: Sequence[Mapping[str, Any]], summarize: Summarizer
+    ) -> Optional[Future[None]]:
+        """
+        Fold turns older than the verbatim window into the summary asynchronously.
+
+        Args:
+            messages (list): The full conversation so far
+            summarize (callable): Takes the previous summary and the turns to fold
+                in and returns the new summary
+
+        Returns:
+            Future: The pending update, or None if nothing needs summarizing
+        """
+        with self._lock:
+            if self._pending is not None and not self._pending.done():
+                return self._pending
+            start = self.summarized_upto
+            stop = len(messages) - 2 * self.verbatim_turns
+            if stop <= start:
+                return None
+            previous = self.summary
+        turns = [
+            {"role": msg["role"], "content": self._clip(str(msg["content"]))}
+            for msg in messages[start:stop]
+        ]
+
+        def update() -> None:
+            try:
+                summary = summarize(previous, turns)
+            except Exception:
+                logger.warning("History summary update failed", exc_info=True)
+                return
+            with self._lock:
+                if self.summarized_upto == start:
+                    self.summary = summary[: self.summary_max_chars]
+                    self.summarized_upto = stop
+
+        future = _summary_executor().submit(update)
+        with self._lock:
+            self._pending = future
+        return future
+
+    def reset(self) -> None:
+        with self._lock:
+            self.summary = ""
+            self.summarized_upto = 0
+            self._pending = None
+
+    @staticmethod
+    def _without_attachments(content: str) -> str:
+        """The turn with only the first line of each attached file."""
+        parts = content.split(f"\n\n{ATTACHMENT_MARKER}")
+        if len(parts) == 1:
+            return content
+        kept = [parts[0]]
+        for part in parts[1:]:
+            header, _, body = part.partition("\n")
+            kept.append(
+                f"{ATTACHMENT_MARKER}{header}" + OMITTED_ATTACHMENT.format(len(body))
+            )
+        return "\n\n".join(kept)
+
+    def _clip(self, content: str) -> str:
+        if len(content) <= self.turn_max_chars:
+            return content
+        return content[: self.turn_max_chars] + "\n[... truncated]"
@@ -0,0 +1,70 @@
+# Copyright 2024 DataRobot, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Turning uploaded files into prompt attachments and parsing them back out."""
+
+from __future__ import annotations
+
+from typing import List, Tuple
+
+from docsassist import decoding, jsonlines
+
+ATTACHMENT_MARKER: str = "📎"
+
+
+def read_uploaded_file(name: str, mime_type: str, data: bytes) -> str:
+    """
+    Decode an uploaded file and format it as a prompt attachment.
+
+    The encoding is detected and binary regions are skipped; JSON-lines logs
+    are rendered as a table of their relevant fields.
+
+    Args:
+        name (str): The file name shown to the user and the LLM
+        mime_type (str): The MIME type reported by the uploader
+        data (bytes): The raw file contents
+
+    Returns:
+        str: The attachment block, or a note that the file could not be read
+    """
+    try:
+        if jsonlines.looks_like_jsonl(name, data):
+            return f"{ATTACHMENT_MARKER} {name}:\n{jsonlines.render(data)}"
+        content = decoding.decode(data).text
+        return f"{ATTACHMENT_MARKER} {name}:\n{content}"
+    except Exception as e:
+        return f"{ATTACHMENT_MARKER} {name}: Failed to read file. Error: {str(e)}"
+
+
+def parse_message(message: str) -> Tuple[str, List[Tuple[str, str]]]:
+    """
+    Split a chat message into the typed text and its (filename, content) attachments.
+
+    Args:
+        message (str): A user message, possibly with attachment blocks
+
+    Returns:
+        tuple: The typed text and the list of attachments
+    """
+    parts = message.split(ATTACHMENT_MARKER)
+    attachments = []
+    for i, part in enumerate(parts[1:], 1):
+        if part.strip():
+            lines = part.strip().split("\n")
+            filename = lines[0].split(":")[0] if ":" in lines[0] else f"File {i}"
+            content = (
+                "\n".join(lines[1:]) if len(lines) > 1 else "Unable to read content"
+            )
+            attachments.append((filename, content))
+    return parts[0].strip(), attachments
@@ -0,0 +1,453 @@
+# Copyright 2024 DataRobot, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+JSON-lines logs: schema inference, field projection and a compact rendering.
+
+Pasting JSON-lines logs raw repeats every key on every line. Instead, a
+sample of records is used to infer which fields are present, which hold
+the timestamp, level, source and message, and which are constant. Only
+the fields that matter are kept, and the records are rendered as a
+tab-separated table with a single header row. Lines that are not JSON
+objects are kept verbatim, marked with "!".
+
+Records are decoded with orjson, or with pysimdjson, when either is
+installed.
+"""
+
+from __future__ import annotations
+
+import json
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+from pydantic import AliasChoices, Field
+from pydantic_settings import BaseSettings
+
+from docsassist.parsing import (
+    LEVELS,
+    MAX_TIMESTAMP,
+    MIN_TIMESTAMP,
+    ParsedLine,
+    parse_timestamp,
+    template_of,
+)
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+try:
+    import simdjson
+except ImportError:  # pragma: no cover - optional speedup
+    simdjson = None
+
+jsonlines_env_prefix: str = "JSONLINES_"
+
+# JSON-lines logs are often saved as .log or .txt, so those are sniffed too
+JSONL_EXTENSIONS: Tuple[str, ...] = (".jsonl", ".ndjson", ".json", ".log", ".txt")
+MALFORMED_MARKER: str = "!"
+MAX_DEPTH: int = 3
+MAX_DISTINCT: int = 64
+
+# Flattened key names (case-insensitive) that play a role, in order of preference
+TIMESTAMP_KEYS: Tuple[str, ...] = (
+    "timestamp",
+    "@timestamp",
+    "time",
+    "ts",
+    "datetime",
+    "date",
+    "asctime",
+    "eventtime",
+)
+LEVEL_KEYS: Tuple[str, ...] = ("level", "severity", "levelname", "lvl", "log.level")
+SOURCE_KEYS: Tuple[str, ...] = (
+    "service",
+    "logger",
+    "component",
+    "source",
+    "module",
+    "app",
+    "name",
+    "logger_name",
+)
+MESSAGE_KEYS: Tuple[str, ...] = ("message", "msg", "event", "log", "text", "error")
+# Fields that, like the message, are cut at JSONLINES_MAX_MESSAGE_CHARS
+ERROR_KEYS: Tuple[str, ...] = (
+    "error",
+    "err",
+    "exception",
+    "exc_info",
+    "stack",
+    "stack_trace",
+    "stacktrace",
+)
+# pino/bunyan numeric levels
+NUMERIC_LEVELS: Dict[int, str] = {
+    10: "TRACE",
+    20: "DEBUG",
+    30: "INFO",
+    40: "WARN",
+    50: "ERROR",
+    60: "FATAL",
+}
+
+
+def _env_alias(name: str) -> AliasChoices:
+    return AliasChoices(
+        "MLOPS_RUNTIME_PARAM_" + jsonlines_env_prefix + name,
+        jsonlines_env_prefix + name,
+    )
+
+
+class JsonLinesSettings(BaseSettings):
+    """JSON-lines rendering settings from env or DR runtime parameters"""
+
+    sample_records: int = Field(
+        default=1000, ge=1, validation_alias=_env_alias("SAMPLE_RECORDS")
+    )
+    max_columns: int = Field(
+        default=12, ge=1, validation_alias=_env_alias("MAX_COLUMNS")
+    )
+    min_presence: float = Field(
+        default=0.05, ge=0.0, le=1.0, validation_alias=_env_alias("MIN_PRESENCE")
+    )
+    max_value_chars: int = Field(
+        default=120, ge=1, validation_alias=_env_alias("MAX_VALUE_CHARS")
+    )
+    max_message_chars: int = Field(
+        default=2000,
+        ge=1,
+        validation_alias=_env_alias("MAX_MESSAGE_CHARS"),
+        description="Characters kept of the message and error fields",
+    )
+
+
+def _simdjson_loads() -> Callable[[bytes], Any]:
+    parser = simdjson.Parser()
+
+    def loads(line: bytes) -> Any:
+        # Parsed values are views into the parser's buffer; copy them out
+        value = parser.parse(line)
+        if isinstance(value, simdjson.Object):
+            return value.as_dict()
+        if isinstance(value, simdjson.Array):
+            return value.as_list()
+        return value
+
+    return loads
+
+
+if orjson is not None:
+    loads: Callable[[bytes], Any] = orjson.loads
+elif simdjson is not None:
+    loads = _simdjson_loads()
+else:
+    loads = json.loads
+
+
+def _flatten(
+    record: Dict[str, Any], prefix: str = "", depth: int = 1
+) -> Dict[str, Any]:
+    flat: Dict[str, Any] = {}
+    for key, value in record.items():
+        if type(value) is dict and value and depth < MAX_DEPTH:
+            flat.update(_flatten(value, f"{prefix}{key}.", depth + 1))
+        else:
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+
+def flatten(record: Dict[str, Any]) -> Dict[str, Any]:
+    """Nested objects as dotted keys, down to MAX_DEPTH levels."""
+    for value in record.values():
+        if type(value) is dict:
+            return _flatten(record)
+    return record
+
+
+def format_value(value: Any, max_chars: int = 120) -> str:
+    if value is None:
+        return ""
+    if value is True or value is False:
+        return "true" if value else "false"
+    if isinstance(value, str):
+        text = value
+    elif isinstance(value, (int, float)):
+        return repr(value)
+    else:
+        text = json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+    if len(text) > max_chars:
+        text = text[: max_chars - 1] + "…"
+    # Keep one record per row and one value per cell
+    if "\n" in text or "\t" in text or "\r" in text:
+        text = text.replace("\r", "").replace("\n", "\\n").replace("\t", " ")
+    return text
+
+
+@dataclass
+class FieldStats:
+    count: int = 0
+    chars: int = 0
+    types: Counter[str] = field(default_factory=Counter)
+    distinct: Set[str] = field(default_factory=set)
+
+    def add(self, value: Any) -> None:
+        self.count += 1
+        self.types[type(value).__name__] += 1
+        text = format_value(value, max_chars=1000)
+        self.chars += len(text)
+        if len(self.distinct) < MAX_DISTINCT:
+            self.distinct.add(text)
+
+
+@dataclass
+class JsonSchema:
+    records: int
+    fields: Dict[str, FieldStats]
+    columns: List[str]
+    constants: Dict[str, str]
+    omitted: List[str]
+    timestamp: Optional[str] = None
+    level: Optional[str] = None
+    source: Optional[str] = None
+    message: Optional[str] = None
+
+
+def _find_role(
+    fields: Dict[str, FieldStats], candidates: Tuple[str, ...]
+) -> Optional[str]:
+    by_name: Dict[str, str] = {}
+    for name in fields:
+        lowered = name.lower()
+        by_name.setdefault(lowered, name)
+        by_name.setdefault(lowered.rsplit(".", 1)[-1], name)
+    for candidate in candidates:
+        if candidate in by_name:
+            return by_name[candidate]
+    return None
+
+
+def infer_schema(
+    records: List[Dict[str, Any]], settings: Optional[JsonLinesSettings] = None
+) -> JsonSchema:
+    """Decide the roles, columns and constants from a sample of flattened records."""
+    settings = settings or JsonLinesSettings()
+    fields: Dict[str, FieldStats] = {}
+    for record in records:
+        for name, value in record.items():
+            stats = fields.get(name)
+            if stats is None:
+                stats = fields[name] = FieldStats()
+            stats.add(value)
+
+    roles = {
+        role: _find_role(fields, candidates)
+        for role, candidates in (
+            ("timestamp", TIMESTAMP_KEYS),
+            ("level", LEVEL_KEYS),
+            ("source", SOURCE_KEYS),
+            ("message", MESSAGE_KEYS),
+        )
+    }
+    constants: Dict[str, str] = {}
+    candidates: List[Tuple[str, FieldStats]] = []
+    for name, stats in fields.items():
+        if name in roles.values():
+            continue
+        if stats.count == len(records) and len(stats.distinct) == 1:
+            constants[name] = next(iter(stats.distinct))
+        elif stats.count >= settings.min_presence * len(records):
+            candidates.append((name, stats))
+    # Role columns first, then the most common fields, preferring short values
+    candidates.sort(key=lambda item: (-item[1].count, item[1].chars / item[1].count))
+    columns = [name for name in roles.values() if name is not None]
+    extra = settings.max_columns - len(columns)
+    columns += [name for name, _ in candidates[: max(extra, 0)]]
+    omitted = [name for name in fields if name not in columns and name not in constants]
+    return JsonSchema(
+        records=len(records),
+        fields=fields,
+        columns=columns,
+        constants=constants,
+        omitted=omitted,
+        **roles,
+    )
+
+
+def looks_like_jsonl(name: str, data: bytes) -> bool:
+    """Whether an upload is JSON lines: its first two lines are JSON objects."""
+    if not name.lower().endswith(JSONL_EXTENSIONS):
+        return False
+    head = data[:1024]
+    start = len(head) - len(head.lstrip())
+    for _ in range(2):
+        if not data.startswith(b"{", start):
+            return False
+        end = data.find(b"\n", start)
+        if end < 0:
+            # A single object is a JSON document, better attached as is
+            return False
+        try:
+            if not isinstance(loads(data[start:end]), dict):
+                return False
+        except ValueError:
+            # A pretty-printed JSON document, not one object per line
+            return False
+        start = end + 1
+        while data[start : start + 1] in (b"\r", b"\n", b" ", b"\t"):
+            start += 1
+    return True
+
+
+def _records(data: bytes) -> Iterator[Tuple[int, bytes, Optional[Dict[str, Any]]]]:
+    """(line number, raw line, flattened record or None if malformed) per line."""
+    for number, line in enumerate(data.splitlines(), 1):
+        if not line.strip():
+            continue
+        try:
+            value = loads(line)
+        except ValueError:
+            yield number, line, None
+            continue
+        yield number, line, flatten(value) if isinstance(value, dict) else None
+
+
+def sample_schema(
+    data: bytes, settings: Optional[JsonLinesSettings] = None
+) -> JsonSchema:
+    settings = settings or JsonLinesSettings()
+    sample = []
+    for _, _, record in _records(data):
+        if record is not None:
+            sample.append(record)
+            if len(sample) >= settings.sample_records:
+                break
+    return infer_schema(sample, settings)
+
+
+def _column_chars(
+    schema: JsonSchema, settings: JsonLinesSettings
+) -> List[Tuple[str, int]]:
+    """(field, characters kept) of each column, the message and errors kept longer."""
+    budgets = []
+    for name in schema.columns:
+        leaf = name.lower().rsplit(".", 1)[-1]
+        if name == schema.message or leaf in ERROR_KEYS:
+            budgets.append((name, settings.max_message_chars))
+        else:
+            budgets.append((name, settings.max_value_chars))
+    return budgets
+
+
+def render(data: bytes, settings: Optional[JsonLinesSettings] = None) -> str:
+    """The projected records as a tab-separated table, with a short preamble."""
+    settings = settings or JsonLinesSettings()
+    schema = sample_schema(data, settings)
+    columns = schema.columns
+    budgets = _column_chars(schema, settings)
+    max_chars = settings.max_value_chars
+    rows = ["\t".join(columns)]
+    records = malformed = 0
+    for _, line, record in _records(data):
+        if record is None:
+            malformed += 1
+            text = line.decode("utf-8", errors="replace")
+            rows.append(f"{MALFORMED_MARKER} {format_value(text, max_chars * 4)}")
+            continue
+        records += 1
+        rows.append(
+            "\t".join(format_value(record.get(name), chars) for name, chars in budgets)
+        )
+
+    preamble = [f"JSON lines: {records:,} records, shown as tab-separated columns"]
+    if malformed:
+        preamble.append(
+            f"{malformed:,} lines are not JSON objects and are shown verbatim "
+            f"after '{MALFORMED_MARKER}'"
+        )
+    if schema.constants:
+        preamble.append(
+            "Same in every record: "
+            + ", ".join(f"{name}={value}" for name, value in schema.constants.items())
+        )
+    if schema.omitted:
+        preamble.append("Fields not shown: " + ", ".join(schema.omitted))
+    return "\n".join(preamble + rows)
+
+
+def _level(value: Any) -> Optional[str]:
+    if isinstance(value, str):
+        return LEVELS.get(value.upper())
+    if isinstance(value, int):
+        return NUMERIC_LEVELS.get(value)
+    return None
+
+
+def _timestamp(value: Any) -> Optional[float]:
+    if isinstance(value, str):
+        return parse_timestamp(value)
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        # Epoch seconds, or milli-, micro- or nanoseconds, told apart by size:
+        # today is about 1.7e9 seconds, and 1e11 seconds is the year 5138
+        try:
+            for threshold, scale in ((1e17, 1e9), (1e14, 1e6), (1e11, 1e3)):
+                if abs(value) > threshold:
+                    value = value / scale
+                    break
+            seconds = float(value)
+        except OverflowError:
+            return None
+        if MIN_TIMESTAMP <= seconds <= MAX_TIMESTAMP:
+            return seconds
+    return None
+
+
+def parse_records(
+    data: bytes, settings: Optional[JsonLinesSettings] = None
+) -> Iterator[ParsedLine]:
+    """
+    JSON-lines records as parsed log lines, for the parsed-log store.
+
+    The line text is the message followed by the record's numeric fields as
+    key=value pairs, so they become numeric columns.
+    """
+    schema = sample_schema(data, settings)
+    for _, line, record in _records(data):
+        if record is None:
+            text = line.decode("utf-8", errors="replace")
+            template, params = template_of(text)
+            yield ParsedLine(None, None, None, template, params, text)
+            continue
+        message = record.get(schema.message) if schema.message else None
+        message = "" if message is None else format_value(message, max_chars=1000)
+        template, params = template_of(message)
+        # "http.status" becomes "status", like the fields of plain-text logs
+        numbers = " ".join(
+            f"{name.rsplit('.', 1)[-1]}={value}"
+            for name, value in record.items()
+            if type(value) in (int, float) and name != schema.timestamp
+        )
+        source = record.get(schema.source) if schema.source else None
+        yield ParsedLine(
+            _timestamp(record.get(schema.timestamp)) if schema.timestamp else None,
+            _level(record.get(schema.level)) if schema.level else None,
+            None if source is None else format_value(source, max_chars=64),
+            template,
+            params,
+            f"{message} {numbers}" if numbers else message,
+        )
@@ -0,0 +1,98 @@
+# Copyright 2024 DataRobot, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Screening prompts with the keyword guard's blocklist before they are sent.
+
+The keyword guard deployment blocks prompts that match its blocklist, but
+only after a round trip through the LLM deployment. The apps load the same
+blocklist from KEYWORD_GUARD_BLOCKLIST and answer such prompts locally
+with the guard's message. Prompts let through are still screened by the
+deployment, which remains the authority.
+"""
+
+from __future__ import annotations
+
+from functools import lru_cache
+from typing import Optional
+
+from pydantic import AliasChoices, Field
+from pydantic_settings import BaseSettings
+
+from deployment_keyword_guard.blocklist import Blocklist
+from docsassist.i18n import gettext
+
+keyword_guard_env_prefix: str = "KEYWORD_GUARD_"
+
+
+def _env_alias(name: str) -> AliasChoices:
+    return AliasChoices(
+        "MLOPS_RUNTIME_PARAM_" + keyword_guard_env_prefix + name,
+        keyword_guard_env_prefix + name,
+    )
+
+
+class KeywordGuardSettings(BaseSettings):
+    """Keyword guard settings from env or DR runtime parameters"""
+
+    blocklist: str = Field(
+        default="",
+        validation_alias=_env_alias("BLOCKLIST"),
+        description="JSON list of the guard's keyword regexes; no screening if empty",
+    )
+    message: str = Field(
+        default="",
+        validation_alias=_env_alias("MESSAGE"),
+        description="Answer to blocked prompts, the guard's intervention message",
+    )
+
+
+class KeywordGuard:
+    """Answers prompts matching the blocklist the way the guard deployment does."""
+
+    def __init__(self, blocklist: Blocklist, message: str = "") -> None:
+        self.blocklist = blocklist
+        self.message = message or gettext(
+            "This question was blocked by the keyword guard."
+        )
+
+    def screen(self, question: str) -> Optional[dict]:
+        """A blocked chat completion if the question matches, else None."""
+        if not self.blocklist.blocks(question):
+            return None
+        return {
+            "choices": [
+                {
+                    "index": 0,
+                    "message": {"role": "assistant", "content": self.message},
+                    "finish_reason": "content_filter",
+                }
+            ]
+        }
+
+
+@lru_cache(maxsize=1)
+def get_keyword_guard() -> Optional[KeywordGuard]:
+    """Return the process-wide keyword guard, or None without a blocklist."""
+    settings = KeywordGuardSettings()
+    blocklist = Blocklist.from_json(settings.blocklist)
+    if not blocklist:
+        return None
+    return KeywordGuard(blocklist, settings.message)
+
+
+def screen(question: str) -> Optional[dict]:
+    """Screen a question with the process-wide keyword guard, if configured."""
+    guard = get_keyword_guard()
+    return None if guard is None else guard.screen(question)
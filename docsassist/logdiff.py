@@ -0,0 +1,269 @@
+# Copyright 2024 DataRobot, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Differences between a good and a bad run of the same service.
+
+Both logs are parsed into tables, and the lines of each message template
+are counted in each of them. Templates only in the bad log are new, those
+only in the good log vanished, and those in both shifted when their share
+of the lines changed by at least DIFF_MIN_Z standard errors (a two-
+proportion z-test), so that a log twice as long is not all shifts. Only
+this summary is sent, instead of both files. Counting is one pass over the
+template column of each table and one over the templates of both.
+
+    python -m docsassist.logdiff yesterday.log today.log
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+import numpy.typing as npt
+from pydantic import AliasChoices, Field
+from pydantic_settings import BaseSettings
+
+from docsassist.ingest import ATTACHMENT_MARKER
+from docsassist.logstore import (
+    ERROR_CODES,
+    LEVEL_NAMES,
+    LogTable,
+    _format_interval,
+    _format_timestamp,
+    table_from_upload,
+)
+
+diff_env_prefix: str = "DIFF_"
+
+
+def _env_alias(name: str) -> AliasChoices:
+    return AliasChoices(
+        "MLOPS_RUNTIME_PARAM_" + diff_env_prefix + name,
+        diff_env_prefix + name,
+    )
+
+
+class DiffSettings(BaseSettings):
+    """Log diff settings from env or DR runtime parameters"""
+
+    min_z: float = Field(
+        default=4.0,
+        gt=0,
+        validation_alias=_env_alias("MIN_Z"),
+        description="Smallest z-score of a change in share that is a shift",
+    )
+    max_templates: int = Field(
+        default=15,
+        ge=1,
+        validation_alias=_env_alias("MAX_TEMPLATES"),
+        description="Templates listed in each section of the diff",
+    )
+
+
+class TemplateChange(NamedTuple):
+    template: str
+    good: int
+    bad: int
+    # Most severe level in either log; -1 without levels
+    level: int
+    z: float
+
+
+class LogDiff(NamedTuple):
+    good_lines: int
+    bad_lines: int
+    common: int
+    new: List[TemplateChange]
+    vanished: List[TemplateChange]
+    increased: List[TemplateChange]
+    decreased: List[TemplateChange]
+    # Counts of each kind, of which the lists above hold the top ones
+    totals: Dict[str, int]
+
+
+def _template_levels(table: LogTable) -> npt.NDArray[np.int8]:
+    levels = np.full(len(table.templates), -1, dtype=np.int8)
+    np.maximum.at(levels, table.template, table.level)
+    return levels
+
+
+def diff(
+    good: LogTable, bad: LogTable, settings: Optional[DiffSettings] = None
+) -> LogDiff:
+    """Templates new, vanished or shifted in the bad log compared with the good one."""
+    settings = settings or DiffSettings()
+    limit = settings.max_templates
+    # Template IDs are per table; number the templates of both together
+    codes: Dict[str, int] = {}
+    good_codes = np.array(
+        [codes.setdefault(t, len(codes)) for t in good.templates], dtype=np.int64
+    )
+    bad_codes = np.array(
+        [codes.setdefault(t, len(codes)) for t in bad.templates], dtype=np.int64
+    )
+    templates = list(codes)
+    good_counts = np.zeros(len(templates), dtype=np.int64)
+    good_counts[good_codes] = np.bincount(good.template, minlength=len(good.templates))
+    bad_counts = np.zeros(len(templates), dtype=np.int64)
+    bad_counts[bad_codes] = np.bincount(bad.template, minlength=len(bad.templates))
+    levels = np.full(len(templates), -1, dtype=np.int8)
+    np.maximum.at(levels, good_codes, _template_levels(good))
+    np.maximum.at(levels, bad_codes, _template_levels(bad))
+
+    good_total = max(len(good), 1)
+    bad_total = max(len(bad), 1)
+    pooled = (good_counts + bad_counts) / (good_total + bad_total)
+    error = np.sqrt(pooled * (1 - pooled) * (1 / good_total + 1 / bad_total))
+    shift = bad_counts / bad_total - good_counts / good_total
+    z = np.divide(shift, error, out=np.zeros_like(shift), where=error > 0)
+
+    def changes(
+        selected: npt.NDArray[np.bool_], order: npt.NDArray[np.float64]
+    ) -> List[TemplateChange]:
+        indices = np.flatnonzero(selected)
+        # Ties, such as the z-score of every new template, go to the most severe
+        indices = indices[np.lexsort((-levels[indices], order[indices]))][:limit]
+        return [
+            TemplateChange(
+                templates[i],
+                int(good_counts[i]),
+                int(bad_counts[i]),
+                int(levels[i]),
+                float(z[i]),
+            )
+            for i in indices
+        ]
+
+    in_both = (good_counts > 0) & (bad_counts > 0)
+    selections = {
+        "new": (good_counts == 0) & (bad_counts > 0),
+        "vanished": (good_counts > 0) & (bad_counts == 0),
+        "increased": in_both & (z >= settings.min_z),
+        "decreased": in_both & (z <= -settings.min_z),
+    }
+    return LogDiff(
+        good_lines=len(good),
+        bad_lines=len(bad),
+        common=int(in_both.sum()),
+        new=changes(selections["new"], -bad_counts.astype(np.float64)),
+        vanished=changes(selections["vanished"], -good_counts.astype(np.float64)),
+        increased=changes(selections["increased"], -z),
+        decreased=changes(selections["decreased"], z),
+        totals={kind: int(selected.sum()) for kind, selected in selections.items()},
+    )
+
+
+def _share(count: int, total: int) -> str:
+    return f"{100 * count / max(total, 1):.3g}%"
+
+
+def _level(code: int) -> str:
+    return LEVEL_NAMES[code] if code >= 0 else "-"
+
+
+def _overview(name: str, table: LogTable) -> str:
+    text = f"{name}: {len(table):,} lines"
+    time_range = table.time_range()
+    if time_range is not None:
+        text += (
+            f", {_format_timestamp(time_range[0])} to "
+            f"{_format_timestamp(time_range[1])} "
+            f"({_format_interval(time_range[1] - time_range[0])})"
+        )
+    errors = int(np.isin(table.level, ERROR_CODES).sum())
+    return text + f", {errors:,} errors ({_share(errors, len(table))} of lines)"
+
+
+def describe(
+    good_name: str, good: LogTable, bad_name: str, bad: LogTable, result: LogDiff
+) -> str:
+    """The diff, phrased for the prompt."""
+    lines = [
+        _overview(f"Good ({good_name})", good),
+        _overview(f"Bad ({bad_name})", bad),
+        f"Message templates: {result.common:,} in both, "
+        + ", ".join(f"{count:,} {kind}" for kind, count in result.totals.items()),
+    ]
+    sections: Sequence[Tuple[str, str, List[TemplateChange]]] = (
+        ("new", f"Only in {bad_name} (lines)", result.new),
+        ("vanished", f"Only in {good_name} (lines)", result.vanished),
+        ("increased", "More frequent in the bad log", result.increased),
+        ("decreased", "Less frequent in the bad log", result.decreased),
+    )
+    for kind, title, changes in sections:
+        if not changes:
+            continue
+        shown = len(changes)
+        total = result.totals[kind]
+        lines.append(
+            f"{title}, top {shown} of {total:,}:" if shown < total else f"{title}:"
+        )
+        for change in changes:
+            if kind in ("new", "vanished"):
+                count = change.bad if kind == "new" else change.good
+                lines.append(
+                    f"  {count:>8,}  {_level(change.level):5}  {change.template}"
+                )
+            else:
+                lines.append(
+                    f"  {change.good:,} -> {change.bad:,} lines "
+                    f"({_share(change.good, result.good_lines)} -> "
+                    f"{_share(change.bad, result.bad_lines)}, z {change.z:+.1f})  "
+                    f"{_level(change.level):5}  {change.template}"
+                )
+    return "\n".join(lines)
+
+
+def diff_attachment(
+    good_name: str,
+    good: LogTable,
+    bad_name: str,
+    bad: LogTable,
+    settings: Optional[DiffSettings] = None,
+) -> str:
+    """The diff of two parsed logs formatted as a prompt attachment."""
+    result = diff(good, bad, settings)
+    return (
+        f"{ATTACHMENT_MARKER} {good_name} vs {bad_name} "
+        f"(diff of message templates, exact):\n"
+        f"{describe(good_name, good, bad_name, bad, result)}"
+    )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m docsassist.logdiff",
+        description="Compare the message templates of a good and a bad log",
+    )
+    parser.add_argument("good", help="Log of a healthy run")
+    parser.add_argument("bad", help="Log of the run to explain")
+    args = parser.parse_args(argv)
+
+    tables = []
+    for path in (args.good, args.bad):
+        with open(path, "rb") as f:
+            table = table_from_upload(f.read(), name=path)
+        if table is None:
+            print(f"{path} does not look like a log", file=sys.stderr)
+            return 1
+        tables.append(table)
+    print(diff_attachment(args.good, tables[0], args.bad, tables[1]))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,517 @@
+# Copyright 2024 DataRobot, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Columnar store of parsed log lines and the aggregates asked about most.
+
+Uploads are parsed once into NumPy columns (timestamp, level, source,
+template ID and numeric fields such as HTTP status or durations). Counts,
+group-bys and time histograms over them take milliseconds and are exact,
+so they are sent with the question as precomputed facts instead of leaving
+the LLM to count lines.
+
+This module imports NumPy; import it where uploads are processed rather
+than at app start.
+"""
+
+from __future__ import annotations
+
+import math
+import re
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import numpy.typing as npt
+from pydantic import AliasChoices, Field
+from pydantic_settings import BaseSettings
+
+from docsassist import decoding, jsonlines
+from docsassist.ingest import ATTACHMENT_MARKER
+from docsassist.parsing import (
+    MAX_TIMESTAMP,
+    MIN_TIMESTAMP,
+    ParsedLine,
+    TemplateIndex,
+    parse_lines,
+)
+
+logstore_env_prefix: str = "LOGSTORE_"
+
+LEVEL_NAMES: Tuple[str, ...] = ("TRACE", "DEBUG", "INFO", "WARN", "ERROR", "FATAL")
+ERROR_CODES: Tuple[int, ...] = (4, 5)
+NO_LEVEL: int = -1
+NO_SOURCE: int = -1
+_LEVEL_CODES: Dict[str, int] = {name: code for code, name in enumerate(LEVEL_NAMES)}
+
+# Field columns beyond these are ignored, so random keys cannot blow up memory
+MAX_FIELDS: int = 32
+HISTOGRAM_BUCKETS: int = 48
+_INTERVALS: Tuple[int, ...] = (1, 5, 10, 30, 60, 300, 600, 1800, 3600, 21600, 86400)
+# Timestamps beyond these quantiles, widened by the span between them (at
+# least OUTLIER_MARGIN seconds), are outliers such as a line stamped 1970
+OUTLIER_QUANTILE: float = 0.001
+OUTLIER_MARGIN: float = 86400.0
+
+_KEY_VALUE = re.compile(r"\b([A-Za-z_][\w.-]{0,39})=(-?\d+(?:\.\d+)?)\b")
+_STATUS = re.compile(
+    r"(?:\bstatus(?: code)?[ :]\s*|\breturned |HTTP/\d(?:\.\d)?\"? )([1-5]\d\d)\b"
+)
+_DURATION = re.compile(r"\b(\d+(?:\.\d+)?) ?ms\b")
+
+
+def _env_alias(name: str) -> AliasChoices:
+    return AliasChoices(
+        "MLOPS_RUNTIME_PARAM_" + logstore_env_prefix + name,
+        logstore_env_prefix + name,
+    )
+
+
+class LogStoreSettings(BaseSettings):
+    """Parsed-log store settings from env or DR runtime parameters"""
+
+    enabled: bool = Field(default=True, validation_alias=_env_alias("FACTS"))
+    max_bytes: int = Field(
+        default=100 * 1024 * 1024, ge=0, validation_alias=_env_alias("MAX_BYTES")
+    )
+    min_parsed_ratio: float = Field(
+        default=0.5, ge=0.0, le=1.0, validation_alias=_env_alias("MIN_PARSED_RATIO")
+    )
+
+
+def extract_fields(line: str) -> Dict[str, float]:
+    """Numeric key=value pairs, plus the HTTP status and a duration in ms if found."""
+    # Substring checks are much cheaper than running each regex on every line
+    fields = (
+        {
+            key: float(value)
+            for key, value in _KEY_VALUE.findall(line)
+            if not key.lower().endswith("id")
+        }
+        if "=" in line
+        else {}
+    )
+    if "status" not in fields and (
+        "status" in line or "returned" in line or "HTTP/" in line
+    ):
+        status = _STATUS.search(line)
+        if status is not None:
+            fields["status"] = float(status.group(1))
+    if "duration_ms" not in fields and "ms" in line:
+        duration = _DURATION.search(line)
+        if duration is not None:
+            fields["duration_ms"] = float(duration.group(1))
+    return fields
+
+
+def _format_timestamp(timestamp: float) -> str:
+    if not MIN_TIMESTAMP <= timestamp <= MAX_TIMESTAMP:
+        # Tables built by LogTableBuilder have none, but columns may come from elsewhere
+        return f"{timestamp:g} s since the epoch"
+    moment = datetime.fromtimestamp(timestamp, tz=timezone.utc)
+    return moment.isoformat(timespec="seconds").replace("+00:00", "Z")
+
+
+def _format_interval(seconds: float) -> str:
+    for unit, size in (("d", 86400), ("h", 3600), ("min", 60)):
+        if seconds >= size:
+            return f"{seconds / size:.3g} {unit}"
+    return f"{seconds:.3g} s"
+
+
+def _format_number(value: float) -> str:
+    return f"{value:,.0f}" if value == int(value) else f"{value:,.2f}"
+
+
+class LogTable:
+    """Parsed lines as parallel columns; categorical columns hold dictionary codes."""
+
+    def __init__(
+        self,
+        timestamp: npt.NDArray[np.float64],
+        level: npt.NDArray[np.int8],
+        source: npt.NDArray[np.int32],
+        template: npt.NDArray[np.int32],
+        fields: Dict[str, npt.NDArray[np.float64]],
+        sources: Sequence[str],
+        templates: Sequence[str],
+        bytes_skipped: int = 0,
+    ) -> None:
+        self.timestamp = timestamp
+        self.level = level
+        self.source = source
+        self.template = template
+        self.fields = fields
+        self.sources = list(sources)
+        self.templates = list(templates)
+        self.bytes_skipped = bytes_skipped
+
+    def __len__(self) -> int:
+        return len(self.timestamp)
+
+    @classmethod
+    def from_lines(cls, lines: Iterable[str], bytes_skipped: int = 0) -> LogTable:
+        builder = LogTableBuilder()
+        builder.extend(parse_lines(lines))
+        return builder.build(bytes_skipped=bytes_skipped)
+
+    @classmethod
+    def from_bytes(cls, data: bytes, max_bytes: Optional[int] = None) -> LogTable:
+        """Parse a log file; beyond max_bytes, only its most recent lines."""
+        encoding = decoding.detect_encoding(data)
+        skipped = 0
+        if max_bytes is not None:
+            skipped, data = decoding.tail(data, max_bytes, encoding)
+        return cls.from_lines(
+            decoding.decode(data, encoding).text.splitlines(), bytes_skipped=skipped
+        )
+
+    @classmethod
+    def from_jsonl(cls, data: bytes, max_bytes: Optional[int] = None) -> LogTable:
+        """Parse a JSON-lines log; beyond max_bytes, only its most recent records."""
+        skipped = 0
+        if max_bytes is not None:
+            skipped, data = decoding.tail(data, max_bytes, "utf-8")
+        builder = LogTableBuilder()
+        builder.extend(jsonlines.parse_records(data))
+        return builder.build(bytes_skipped=skipped)
+
+    @property
+    def parsed_ratio(self) -> float:
+        """Share of lines with a timestamp or a level, i.e. that look like log records."""
+        if not len(self):
+            return 0.0
+        parsed = ~np.isnan(self.timestamp) | (self.level != NO_LEVEL)
+        return float(parsed.mean())
+
+    def mask(
+        self,
+        levels: Optional[Iterable[str]] = None,
+        sources: Optional[Iterable[str]] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        field: Optional[str] = None,
+        low: float = -math.inf,
+        high: float = math.inf,
+    ) -> npt.NDArray[np.bool_]:
+        """Rows matching every given condition; a field range is inclusive."""
+        selected = np.ones(len(self), dtype=bool)
+        if levels is not None:
+            codes = [_LEVEL_CODES[level] for level in levels if level in _LEVEL_CODES]
+            selected &= np.isin(self.level, codes)
+        if sources is not None:
+            codes = [self.sources.index(s) for s in sources if s in self.sources]
+            selected &= np.isin(self.source, codes)
+        if since is not None:
+            selected &= self.timestamp >= since
+        if until is not None:
+            selected &= self.timestamp < until
+        if field is not None:
+            values = self.fields.get(field)
+            if values is None:
+                return np.zeros(len(self), dtype=bool)
+            selected &= (values >= low) & (values <= high)
+        return selected
+
+    def count_by(
+        self,
+        column: str,
+        mask: Optional[npt.NDArray[np.bool_]] = None,
+        top: Optional[int] = None,
+    ) -> List[Tuple[str, int]]:
+        """
+        Row counts per value of "level", "source", "template" or a field,
+        most frequent first; rows without a value are left out.
+        """
+        if column in ("level", "source", "template"):
+            codes = getattr(self, column)
+            labels: Sequence[str] = {
+                "level": LEVEL_NAMES,
+                "source": self.sources,
+                "template": self.templates,
+            }[column]
+            if mask is not None:
+                codes = codes[mask]
+            counts = np.bincount(codes[codes >= 0], minlength=len(labels))
+            order = np.argsort(-counts, kind="stable")
+            result = [(labels[i], int(counts[i])) for i in order if counts[i]]
+        else:
+            values = self.fields.get(column, np.empty(0))
+            if mask is not None and len(values):
+                values = values[mask]
+            unique, counts = np.unique(values[~np.isnan(values)], return_counts=True)
+            order = np.argsort(-counts, kind="stable")
+            result = [(_format_number(unique[i]), int(counts[i])) for i in order]
+        return result[:top] if top is not None else result
+
+    def time_range(self) -> Optional[Tuple[float, float]]:
+        timestamps = self.timestamp[~np.isnan(self.timestamp)]
+        if not len(timestamps):
+            return None
+        return float(timestamps.min()), float(timestamps.max())
+
+    def robust_time_range(self) -> Optional[Tuple[float, float]]:
+        """The time range without outlying timestamps; see outside()."""
+        timestamps = self.timestamp[~np.isnan(self.timestamp)]
+        if not len(timestamps):
+            return None
+        last = len(timestamps) - 1
+        low = math.ceil(OUTLIER_QUANTILE * last)
+        high = math.floor((1 - OUTLIER_QUANTILE) * last)
+        if low > high:
+            low, high = 0, last
+        core = np.partition(timestamps, (low, high))
+        margin = max(float(core[high] - core[low]), OUTLIER_MARGIN)
+        inside = timestamps[
+            (timestamps >= core[low] - margin) & (timestamps <= core[high] + margin)
+        ]
+        return float(inside.min()), float(inside.max())
+
+    def outside(self, time_range: Tuple[float, float]) -> npt.NDArray[np.bool_]:
+        """Rows whose timestamp is outside time_range; rows without one are not."""
+        with np.errstate(invalid="ignore"):
+            return (self.timestamp < time_range[0]) | (self.timestamp > time_range[1])
+
+    def histogram(
+        self,
+        interval_seconds: float,
+        mask: Optional[npt.NDArray[np.bool_]] = None,
+        time_range: Optional[Tuple[float, float]] = None,
+    ) -> List[Tuple[float, int]]:
+        """
+        Row counts per time bucket, including empty buckets, oldest first.
+
+        Rows outside time_range, the whole time range by default, are not
+        counted.
+        """
+        time_range = time_range or self.time_range()
+        if time_range is None:
+            return []
+        timestamps = self.timestamp if mask is None else self.timestamp[mask]
+        timestamps = timestamps[
+            (timestamps >= time_range[0]) & (timestamps <= time_range[1])
+        ]
+        first = math.floor(time_range[0] / interval_seconds) * interval_seconds
+        buckets = int((time_range[1] - first) // interval_seconds) + 1
+        counts = np.bincount(
+            ((timestamps - first) // interval_seconds).astype(np.int64),
+            minlength=buckets,
+        )
+        return [
+            (first + i * interval_seconds, int(count)) for i, count in enumerate(counts)
+        ]
+
+    def field_summary(
+        self, name: str, mask: Optional[npt.NDArray[np.bool_]] = None
+    ) -> Optional[Dict[str, float]]:
+        values = self.fields.get(name)
+        if values is None:
+            return None
+        if mask is not None:
+            values = values[mask]
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return None
+        p50, p95, p99 = np.percentile(values, [50, 95, 99])
+        return {
+            "count": float(len(values)),
+            "min": float(values.min()),
+            "mean": float(values.mean()),
+            "p50": float(p50),
+            "p95": float(p95),
+            "p99": float(p99),
+            "max": float(values.max()),
+        }
+
+
+class LogTableBuilder:
+    """Accumulates parsed lines in lists and converts them to columns once."""
+
+    def __init__(self) -> None:
+        self.timestamps: List[float] = []
+        self.levels: List[int] = []
+        self.sources: List[int] = []
+        self.templates: List[int] = []
+        self.fields: Dict[str, Tuple[List[int], List[float]]] = {}
+        self.template_index = TemplateIndex()
+        self.source_codes: Dict[str, int] = {}
+
+    def add(self, parsed: ParsedLine) -> None:
+        row = len(self.timestamps)
+        timestamp = parsed.timestamp
+        # A corrupt timestamp beyond the years a datetime can hold is none at all
+        if timestamp is None or not MIN_TIMESTAMP <= timestamp <= MAX_TIMESTAMP:
+            timestamp = math.nan
+        self.timestamps.append(timestamp)
+        self.levels.append(
+            NO_LEVEL if parsed.level is None else _LEVEL_CODES[parsed.level]
+        )
+        if parsed.source is None:
+            self.sources.append(NO_SOURCE)
+        else:
+            code = self.source_codes.setdefault(parsed.source, len(self.source_codes))
+            self.sources.append(code)
+        self.templates.append(self.template_index.id_of(parsed.template))
+        if not parsed.params:
+            return
+        for name, value in extract_fields(parsed.line).items():
+            column = self.fields.get(name)
+            if column is None:
+                if len(self.fields) >= MAX_FIELDS:
+                    continue
+                column = self.fields[name] = ([], [])
+            column[0].append(row)
+            column[1].append(value)
+
+    def extend(self, parsed: Iterable[ParsedLine]) -> None:
+        for line in parsed:
+            self.add(line)
+
+    def build(self, bytes_skipped: int = 0) -> LogTable:
+        rows = len(self.timestamps)
+        fields = {}
+        for name, (indices, values) in self.fields.items():
+            column = np.full(rows, np.nan)
+            column[indices] = values
+            fields[name] = column
+        return LogTable(
+            np.array(self.timestamps, dtype=np.float64),
+            np.array(self.levels, dtype=np.int8),
+            np.array(self.sources, dtype=np.int32),
+            np.array(self.templates, dtype=np.int32),
+            fields,
+            sources=list(self.source_codes),
+            templates=self.template_index.templates,
+            bytes_skipped=bytes_skipped,
+        )
+
+
+def _histogram_interval(span: float) -> int:
+    """The smallest round interval giving at most HISTOGRAM_BUCKETS buckets."""
+    for interval in _INTERVALS:
+        if span / interval < HISTOGRAM_BUCKETS:
+            return interval
+    # Whole days beyond that, so a span of years still gives few buckets
+    days = math.floor(span / HISTOGRAM_BUCKETS / _INTERVALS[-1]) + 1
+    return days * _INTERVALS[-1]
+
+
+def _counts(pairs: Sequence[Tuple[str, int]]) -> str:
+    return ", ".join(f"{label} {count:,}" for label, count in pairs)
+
+
+def facts(table: LogTable, top: int = 10) -> str:
+    """Exact aggregates over the table, phrased for the prompt."""
+    lines = [f"Parsed lines: {len(table):,}"]
+    if table.bytes_skipped:
+        lines[0] += (
+            f" (the first {table.bytes_skipped:,} bytes of the file are not included)"
+        )
+    time_range = table.robust_time_range()
+    if time_range is not None:
+        lines.append(
+            f"Time span: {_format_timestamp(time_range[0])} to "
+            f"{_format_timestamp(time_range[1])} "
+            f"({_format_interval(time_range[1] - time_range[0])})"
+        )
+        outliers = table.timestamp[table.outside(time_range)]
+        if len(outliers):
+            earliest = _format_timestamp(outliers.min())
+            latest = _format_timestamp(outliers.max())
+            when = earliest if earliest == latest else f"{earliest} to {latest}"
+            lines.append(
+                f"Lines with outlying timestamps ({when}), not in the time span or "
+                f"the counts per interval: {len(outliers):,}"
+            )
+    levels = table.count_by("level")
+    if levels:
+        lines.append(f"Lines per level: {_counts(levels)}")
+    sources = table.count_by("source", top=top)
+    if sources:
+        lines.append(f"Lines per source: {_counts(sources)}")
+
+    errors = table.mask(levels=[LEVEL_NAMES[code] for code in ERROR_CODES])
+    if errors.any():
+        lines.append("Most frequent error messages:")
+        lines.extend(
+            f"  {count:>8,}  {template}"
+            for template, count in table.count_by("template", errors, top=top)
+        )
+        error_sources = table.count_by("source", errors, top=top)
+        if error_sources:
+            lines.append(f"Errors per source: {_counts(error_sources)}")
+
+    statuses = table.count_by("status", top=top)
+    if statuses:
+        lines.append(f"HTTP status codes: {_counts(statuses)}")
+    if time_range is not None:
+        interval = _histogram_interval(time_range[1] - time_range[0])
+        for label, mask in (
+            ("Errors", errors),
+            ("5xx responses", table.mask(field="status", low=500, high=599)),
+        ):
+            if not mask.any():
+                continue
+            buckets = table.histogram(interval, mask, time_range)
+            counts = [count for _, count in buckets]
+            peak = int(np.argmax(counts))
+            lines.append(
+                f"{label} per {_format_interval(interval)} from "
+                f"{_format_timestamp(buckets[0][0])}: {', '.join(map(str, counts))} "
+                f"(peak {counts[peak]:,} at {_format_timestamp(buckets[peak][0])})"
+            )
+
+    summaries = [
+        (name, summary)
+        for name in table.fields
+        if name != "status"
+        and (summary := table.field_summary(name)) is not None
+        and summary["count"] >= 2
+    ]
+    summaries.sort(key=lambda item: -item[1]["count"])
+    for name, summary in summaries[:top]:
+        lines.append(
+            f"{name} (n={summary['count']:,.0f}): "
+            + ", ".join(
+                f"{stat} {_format_number(summary[stat])}"
+                for stat in ("min", "p50", "p95", "p99", "max")
+            )
+        )
+    return "\n".join(lines)
+
+
+def table_from_upload(
+    data: bytes, settings: Optional[LogStoreSettings] = None, name: str = ""
+) -> Optional[LogTable]:
+    """
+    Parse an upload into a table; the name tells JSON-lines logs apart.
+
+    Returns None when facts are disabled or when the file does not look like
+    a log.
+    """
+    settings = settings or LogStoreSettings()
+    if not settings.enabled:
+        return None
+    if jsonlines.looks_like_jsonl(name, data):
+        table = LogTable.from_jsonl(data, max_bytes=settings.max_bytes)
+    else:
+        table = LogTable.from_bytes(data, max_bytes=settings.max_bytes)
+    if not len(table) or table.parsed_ratio < settings.min_parsed_ratio:
+        return None
+    return table
+
+
+def facts_attachment(name: str, table: LogTable) -> str:
+    """The table's facts formatted as a prompt attachment."""
+    return f"{ATTACHMENT_MARKER} {name} (precomputed facts, exact):\n{facts(table)}"
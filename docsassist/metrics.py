@@ -0,0 +1,381 @@
+# Copyright 2024 DataRobot, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+In-process Prometheus-style metrics: counters, gauges and fixed-bucket histograms.
+
+Updates are a dict lookup and an addition under a lock. The registry is
+rendered in the Prometheus text format on a side HTTP port and/or written
+periodically to a file for a node-exporter textfile collector.
+"""
+
+from __future__ import annotations
+
+import bisect
+import logging
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from pydantic import AliasChoices, Field, field_validator
+from pydantic_settings import BaseSettings
+
+logger = logging.getLogger(__name__)
+
+metrics_env_prefix: str = "METRICS_"
+
+LabelValues = Tuple[str, ...]
+
+DEFAULT_LATENCY_BUCKETS: Tuple[float, ...] = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+)
+
+
+def _env_alias(name: str) -> AliasChoices:
+    return AliasChoices(
+        "MLOPS_RUNTIME_PARAM_" + metrics_env_prefix + name,
+        metrics_env_prefix + name,
+    )
+
+
+class MetricsSettings(BaseSettings):
+    """Metrics exposition settings from env or DR runtime parameters"""
+
+    port: Optional[int] = Field(default=None, validation_alias=_env_alias("PORT"))
+    file: Optional[str] = Field(default=None, validation_alias=_env_alias("FILE"))
+    file_interval_seconds: float = Field(
+        default=15.0, validation_alias=_env_alias("FILE_INTERVAL")
+    )
+
+    @field_validator("port", "file", mode="before")
+    @classmethod
+    def _empty_is_unset(cls, value: Any) -> Any:
+        # Unset string runtime parameters arrive as empty strings
+        return value or None
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: LabelValues, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric(ABC):
+    kind: str = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str]):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Tuple[str, ...]) -> LabelValues:
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}")
+        return tuple(labels)
+
+    @abstractmethod
+    def samples(self) -> List[str]:
+        """Sample lines in the text format, without HELP and TYPE."""
+
+    def render(self) -> List[str]:
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+            *self.samples(),
+        ]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(
+        self, name: str, documentation: str, labelnames: Sequence[str] = ()
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [
+            f"{self.name}{_labels(self.labelnames, key)} {value}"
+            for key, value in items
+        ]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        function: Optional[Callable[[], float]] = None,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        self._function = function
+
+    def set(self, value: float, *labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self) -> List[str]:
+        if self._function is not None:
+            return [f"{self.name} {self._function()}"]
+        with self._lock:
+            items = list(self._values.items())
+        return [
+            f"{self.name}{_labels(self.labelnames, key)} {value}"
+            for key, value in items
+        ]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [count per bucket..., count above the last bucket], sum
+        self._counts: Dict[LabelValues, List[int]] = {}
+        self._sums: Dict[LabelValues, float] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._counts.get(key)
+            if counts is None:
+                counts = self._counts[key] = [0] * (len(self.buckets) + 1)
+                self._sums[key] = 0.0
+            counts[index] += 1
+            self._sums[key] += value
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = [
+                (key, list(counts), self._sums[key])
+                for key, counts in self._counts.items()
+            ]
+        lines = []
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                le = _labels(self.labelnames, key, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            cumulative += counts[-1]
+            le = _labels(self.labelnames, key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{le} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {total}")
+            lines.append(
+                f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}"
+            )
+        return lines
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: Any) -> Any:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+class ActivityTracker:
+    """Counts distinct keys (e.g. sessions) seen within a sliding time window."""
+
+    def __init__(self, window_seconds: float) -> None:
+        self.window_seconds = window_seconds
+        self._last_seen: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def touch(self, key: str) -> None:
+        with self._lock:
+            self._last_seen[key] = time.monotonic()
+
+    def count(self) -> int:
+        cutoff = time.monotonic() - self.window_seconds
+        with self._lock:
+            self._last_seen = {
+                key: seen for key, seen in self._last_seen.items() if seen >= cutoff
+            }
+            return len(self._last_seen)
+
+
+REGISTRY = Registry()
+
+SESSIONS = ActivityTracker(window_seconds=15 * 60)
+
+CHAT_REQUESTS = REGISTRY.register(
+    Counter(
+        "log_analyzer_chat_requests_total",
+        "Chat completion requests by outcome "
+        "(ok, error, cache_hit, semantic_hit, blocked).",
+        ["outcome"],
+    )
+)
+CHAT_LATENCY = REGISTRY.register(
+    Histogram(
+        "log_analyzer_chat_request_duration_seconds",
+        "Latency of get_llm_completion calls, including cache hits.",
+        ["outcome"],
+    )
+)
+DEPLOYMENT_ERRORS = REGISTRY.register(
+    Counter(
+        "log_analyzer_deployment_errors_total",
+        "Non-200 responses from the LLM deployment by status code.",
+        ["status"],
+    )
+)
+WARMUP_LATENCY = REGISTRY.register(
+    Histogram(
+        "log_analyzer_warmup_duration_seconds",
+        "Latency of warm-up requests by deployment, cold starts included.",
+        ["deployment", "outcome"],
+        buckets=(0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0),
+    )
+)
+REQUEST_BYTES = REGISTRY.register(
+    Counter(
+        "log_analyzer_deployment_request_bytes_total",
+        "Bytes sent to the LLM deployment after encoding.",
+    )
+)
+CACHE_LOOKUPS = REGISTRY.register(
+    Counter(
+        "log_analyzer_cache_lookups_total",
+        "Cache lookups by cache and result.",
+        ["cache", "result"],
+    )
+)
+UPLOADED_FILES = REGISTRY.register(
+    Counter("log_analyzer_uploaded_files_total", "Files uploaded by users.")
+)
+UPLOADED_BYTES = REGISTRY.register(
+    Counter("log_analyzer_uploaded_bytes_total", "Bytes uploaded by users.")
+)
+ACTIVE_SESSIONS = REGISTRY.register(
+    Gauge(
+        "log_analyzer_active_sessions",
+        "Sessions that reran the app in the last 15 minutes.",
+        function=SESSIONS.count,
+    )
+)
+
+
+def _make_handler(registry: Registry) -> type[BaseHTTPRequestHandler]:
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:
+            body = registry.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format: str, *args: Any) -> None:
+            pass
+
+    return Handler
+
+
+def _write_periodically(registry: Registry, path: str, interval: float) -> None:
+    while True:
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                f.write(registry.render())
+            os.replace(tmp_path, path)
+        except OSError:
+            logger.warning("Could not write metrics to %s", path, exc_info=True)
+        time.sleep(interval)
+
+
+@lru_cache(maxsize=1)
+def start_exporters() -> None:
+    """Start the configured metrics endpoint and file writer once per process."""
+    settings = MetricsSettings()
+    if settings.port is not None:
+        try:
+            server = ThreadingHTTPServer(
+                ("0.0.0.0", settings.port), _make_handler(REGISTRY)
+            )
+        except OSError:
+            logger.warning("Metrics port %s unavailable", settings.port, exc_info=True)
+        else:
+            server.daemon_threads = True
+            threading.Thread(
+                target=server.serve_forever, name="metrics-http", daemon=True
+            ).start()
+            logger.info("Serving metrics on port %s", settings.port)
+    if settings.file:
+        threading.Thread(
+            target=_write_periodically,
+            args=(REGISTRY, settings.file, settings.file_interval_seconds),
+            name="metrics-file",
+            daemon=True,
+        ).start()
@@ -0,0 +1,293 @@
+# Copyright 2024 DataRobot, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Parsing uploads into log tables on a bounded process pool.
+
+Decoding, parsing and template mining are CPU-bound and hold the GIL, so
+a dozen uploads parsed in the script thread block the session (and every
+other session of the replica) for seconds. Here each file is parsed by a
+worker process. File contents and the resulting columns travel through
+shared memory, so only names, offsets and the small dictionaries are
+pickled. Small batches are parsed inline, where starting the hand-off
+would cost more than it saves.
+"""
+
+from __future__ import annotations
+
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, as_completed
+from functools import lru_cache
+from multiprocessing.shared_memory import SharedMemory
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+from pydantic import AliasChoices, Field
+from pydantic_settings import BaseSettings
+
+if TYPE_CHECKING:
+    from docsassist.logstore import LogTable
+
+logger = logging.getLogger(__name__)
+
+ingest_env_prefix: str = "INGEST_"
+
+# Column name, dtype; 8-byte columns first keeps every column aligned
+_COLUMNS: Tuple[Tuple[str, str], ...] = (
+    ("timestamp", "float64"),
+    ("template", "int32"),
+    ("source", "int32"),
+    ("level", "int8"),
+)
+
+Progress = Callable[[int, int, str], None]
+
+
+def _env_alias(name: str) -> AliasChoices:
+    return AliasChoices(
+        "MLOPS_RUNTIME_PARAM_" + ingest_env_prefix + name,
+        ingest_env_prefix + name,
+    )
+
+
+class IngestSettings(BaseSettings):
+    """Upload parsing pool settings from env or DR runtime parameters"""
+
+    workers: int = Field(
+        default=min(4, os.cpu_count() or 1),
+        ge=0,
+        validation_alias=_env_alias("WORKERS"),
+    )
+    min_parallel_bytes: int = Field(
+        default=2 * 1024 * 1024,
+        ge=0,
+        validation_alias=_env_alias("MIN_PARALLEL_BYTES"),
+    )
+
+
+class _PackedTable(NamedTuple):
+    """A LogTable whose columns are in a shared memory block."""
+
+    shm_name: str
+    rows: int
+    fields: List[str]
+    sources: List[str]
+    templates: List[str]
+    bytes_skipped: int
+    seconds: float
+
+
+def get_pool(workers: Optional[int] = None) -> Optional[ProcessPoolExecutor]:
+    """
+    Return the process-wide parsing pool, or None when it is disabled.
+
+    Args:
+        workers: Worker processes, INGEST_WORKERS by default; each count gets
+            its own pool, created on first use
+    """
+    if workers is None:
+        workers = IngestSettings().workers
+    return _pool(workers)
+
+
+@lru_cache(maxsize=None)
+def _pool(workers: int) -> Optional[ProcessPoolExecutor]:
+    if workers < 1:
+        return None
+    # Forking a process that runs server threads is unsafe; spawned workers
+    # import only what parsing needs
+    return ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+    )
+
+
+def _column_layout(rows: int, fields: Sequence[str]) -> Tuple[List[Any], int]:
+    import numpy as np
+
+    layout = []
+    offset = 0
+    for name, dtype in (
+        *_COLUMNS[:1],
+        *((f"field:{field}", "float64") for field in fields),
+        *_COLUMNS[1:],
+    ):
+        layout.append((name, np.dtype(dtype), offset))
+        offset += rows * np.dtype(dtype).itemsize
+    return layout, offset
+
+
+def _parse_in_worker(shm_name: str, size: int, name: str) -> Optional[_PackedTable]:
+    """Runs in a pool worker: parse the upload, publish its columns."""
+    import numpy as np
+
+    from docsassist import logstore
+
+    started = time.perf_counter()
+    upload = SharedMemory(name=shm_name)
+    try:
+        data = bytes(upload.buf[:size])
+    finally:
+        upload.close()
+    table = logstore.table_from_upload(data, name=name)
+    if table is None:
+        return None
+
+    fields = list(table.fields)
+    layout, total = _column_layout(len(table), fields)
+    packed = SharedMemory(create=True, size=max(total, 1))
+    try:
+        for name, dtype, offset in layout:
+            column = (
+                table.fields[name[len("field:") :]]
+                if name.startswith("field:")
+                else getattr(table, name)
+            )
+            target = np.ndarray(
+                len(table), dtype=dtype, buffer=packed.buf, offset=offset
+            )
+            target[:] = column
+    finally:
+        packed.close()
+    return _PackedTable(
+        packed.name,
+        len(table),
+        fields,
+        table.sources,
+        table.templates,
+        table.bytes_skipped,
+        time.perf_counter() - started,
+    )
+
+
+def _unpack(packed: _PackedTable) -> LogTable:
+    import numpy as np
+
+    from docsassist.logstore import LogTable
+
+    layout, _ = _column_layout(packed.rows, packed.fields)
+    block = SharedMemory(name=packed.shm_name)
+    try:
+        columns: Dict[str, Any] = {
+            name: np.ndarray(
+                packed.rows, dtype=dtype, buffer=block.buf, offset=offset
+            ).copy()
+            for name, dtype, offset in layout
+        }
+    finally:
+        block.close()
+        block.unlink()
+    return LogTable(
+        columns["timestamp"],
+        columns["level"],
+        columns["source"],
+        columns["template"],
+        {field: columns[f"field:{field}"] for field in packed.fields},
+        sources=packed.sources,
+        templates=packed.templates,
+        bytes_skipped=packed.bytes_skipped,
+    )
+
+
+def _submit(
+    pool: ProcessPoolExecutor, name: str, data: bytes
+) -> Tuple[Future, SharedMemory]:
+    upload = SharedMemory(create=True, size=max(len(data), 1))
+    upload.buf[: len(data)] = data
+    return pool.submit(_parse_in_worker, upload.name, len(data), name), upload
+
+
+def parse_uploads(
+    uploads: Sequence[Tuple[str, bytes]],
+    progress: Optional[Progress] = None,
+    settings: Optional[IngestSettings] = None,
+    pool: Optional[ProcessPoolExecutor] = None,
+) -> List[Optional[LogTable]]:
+    """
+    Parse (name, data) uploads into log tables, in input order.
+
+    Args:
+        uploads: File names and contents
+        progress: Called as progress(done, total, name) after each file, in
+            the calling thread and in completion order
+        settings: Pool size and threshold, read from the environment by default
+        pool: Use this pool instead of the process-wide one
+
+    Returns:
+        list: A table per upload, or None where facts are disabled or the
+            file does not look like a log
+    """
+    from docsassist import logstore
+
+    results: List[Optional[LogTable]] = [None] * len(uploads)
+    if not logstore.LogStoreSettings().enabled:
+        return results
+    settings = settings or IngestSettings()
+    if pool is None and sum(len(data) for _, data in uploads) >= (
+        settings.min_parallel_bytes
+    ):
+        pool = get_pool(settings.workers)
+    if pool is None:
+        for i, (name, data) in enumerate(uploads):
+            results[i] = logstore.table_from_upload(data, name=name)
+            if progress is not None:
+                progress(i + 1, len(uploads), name)
+        return results
+
+    futures: Dict[Future, int] = {}
+    blocks: List[SharedMemory] = []
+    try:
+        for i, (name, data) in enumerate(uploads):
+            future, block = _submit(pool, name, data)
+            futures[future] = i
+            blocks.append(block)
+        for done, future in enumerate(as_completed(futures), 1):
+            i = futures.pop(future)
+            packed = future.result()
+            if packed is not None:
+                results[i] = _unpack(packed)
+                logger.debug(
+                    "Parsed %s in %.2f s in a worker", uploads[i][0], packed.seconds
+                )
+            if progress is not None:
+                progress(done, len(uploads), uploads[i][0])
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+        # After an error, free the columns of files that are still parsing
+        for future in futures:
+            future.add_done_callback(_discard)
+    return results
+
+
+def _discard(future: Future) -> None:
+    if future.cancelled() or future.exception() is not None:
+        return
+    packed = future.result()
+    if packed is not None:
+        block = SharedMemory(name=packed.shm_name)
+        block.close()
+        block.unlink()
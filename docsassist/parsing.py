@@ -0,0 +1,163 @@
+# Copyright 2024 DataRobot, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Splitting log lines into timestamp, level, source and a message template.
+
+The template is the message with its variable parts (UUIDs, IPs, hex IDs
+and numbers) replaced by "<*>", so lines logged by the same statement share
+a template and can be counted together. TemplateIndex hands out dense
+integer IDs for templates.
+"""
+
+from __future__ import annotations
+
+import re
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional
+
+PLACEHOLDER: str = "<*>"
+
+LEVELS: Dict[str, str] = {
+    "TRACE": "TRACE",
+    "DEBUG": "DEBUG",
+    "INFO": "INFO",
+    "NOTICE": "INFO",
+    "WARN": "WARN",
+    "WARNING": "WARN",
+    "ERR": "ERROR",
+    "ERROR": "ERROR",
+    "SEVERE": "ERROR",
+    "CRITICAL": "FATAL",
+    "FATAL": "FATAL",
+}
+ERROR_LEVELS: frozenset[str] = frozenset({"ERROR", "FATAL"})
+# Seconds since the epoch that a datetime can represent
+MIN_TIMESTAMP: float = datetime(1, 1, 1, tzinfo=timezone.utc).timestamp()
+MAX_TIMESTAMP: float = datetime(
+    9999, 12, 31, 23, 59, 59, tzinfo=timezone.utc
+).timestamp()
+
+_HEADER = re.compile(
+    r"(?P<timestamp>\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}(?:[.,]\d+)?"
+    r"(?:Z|[+-]\d{2}:?\d{2})?)?\s*"
+    r"(?:\[?(?P<level>(?i:trace|debug|info|notice|warn(?:ing)?|err(?:or)?|severe"
+    r"|critical|fatal))\]?(?::\s*|\s+))?"
+    r"(?:\[(?P<source>[^\]\s]{1,64})\]:?\s+)?"
+)
+# One capturing group, so re.split() alternates literal text and variables;
+# the leading lookahead skips most positions without trying each alternative
+_VARIABLE = re.compile(
+    r"((?=[0-9a-fA-F-])(?:"
+    r"[0-9a-fA-F]{8}-(?:[0-9a-fA-F]{4}-){3}[0-9a-fA-F]{12}"  # UUID
+    r"|\d{1,3}(?:\.\d{1,3}){3}(?::\d{1,5})?"  # IPv4 with optional port
+    r"|\b0[xX][0-9a-fA-F]+\b"
+    r"|\b(?=[0-9a-fA-F]*\d)(?=[0-9a-fA-F]*[a-fA-F])[0-9a-fA-F]{8,}\b"  # hex IDs
+    r"|-?\d+(?:\.\d+)?"
+    r"))"
+)
+_NAIVE_TIMESTAMP = re.compile(
+    r"(\d{4}-\d{2}-\d{2})[T ](\d{2}):(\d{2}):(\d{2})(?:[.,](\d+))?"
+)
+
+
+class ParsedLine(NamedTuple):
+    timestamp: Optional[float]
+    level: Optional[str]
+    source: Optional[str]
+    template: str
+    params: List[str]
+    line: str
+
+
+@lru_cache(maxsize=1024)
+def _day_start(date: str) -> float:
+    return datetime.fromisoformat(date).replace(tzinfo=timezone.utc).timestamp()
+
+
+def parse_timestamp(value: str) -> Optional[float]:
+    """Seconds since the epoch of an ISO 8601 timestamp; naive ones are UTC."""
+    naive = _NAIVE_TIMESTAMP.fullmatch(value)
+    if naive is not None:
+        # Most logs use naive timestamps; avoid a datetime per line
+        date, hours, minutes, seconds, fraction = naive.groups()
+        try:
+            day = _day_start(date)
+        except ValueError:
+            return None
+        total = day + int(hours) * 3600 + int(minutes) * 60 + int(seconds)
+        return total + float("0." + fraction) if fraction else float(total)
+    try:
+        parsed = datetime.fromisoformat(value.replace(",", ".", 1))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def template_of(message: str) -> tuple[str, List[str]]:
+    """Return the message's template and the variable values it replaced."""
+    parts = _VARIABLE.split(message)
+    return PLACEHOLDER.join(parts[::2]), parts[1::2]
+
+
+def parse_line(line: str) -> ParsedLine:
+    """
+    Parse one log line.
+
+    Lines without a recognizable header, such as stack trace continuations,
+    have no timestamp or level and are templated as a whole.
+    """
+    header = _HEADER.match(line)
+    assert header is not None  # every group is optional
+    timestamp, level, source = header.group("timestamp", "level", "source")
+    template, params = template_of(line[header.end() :].rstrip())
+    return ParsedLine(
+        parse_timestamp(timestamp) if timestamp else None,
+        LEVELS[level.upper()] if level else None,
+        source,
+        template,
+        params,
+        line,
+    )
+
+
+def parse_lines(lines: Iterable[str]) -> Iterator[ParsedLine]:
+    """Parse non-blank lines."""
+    for line in lines:
+        if line.strip():
+            yield parse_line(line)
+
+
+class TemplateIndex:
+    """Dense integer IDs for templates, in order of first appearance."""
+
+    def __init__(self) -> None:
+        self.templates: List[str] = []
+        self._ids: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.templates)
+
+    def id_of(self, template: str) -> int:
+        template_id = self._ids.get(template)
+        if template_id is None:
+            template_id = self._ids[template] = len(self.templates)
+            self.templates.append(template)
+        return template_id
+
+    def template(self, template_id: int) -> str:
+        return self.templates[template_id]
@@ -12,30 +12,70 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+"""
+UI-free calls to the LLM deployment.
+
+Failures are raised as docsassist.exceptions types; presenting them is up to
+the caller. datarobot is imported on the first call rather than at import
+time, so headless consumers import this module quickly.
+"""
+
+from __future__ import annotations
+
+import json
 import logging
 import requests
-import json
-
-import datarobot as dr
-import streamlit as st
-from openai.types.chat.chat_completion_message_param import ChatCompletionMessageParam
+import requests.adapters
+import time
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any, Iterator, Mapping, Optional, Sequence, Tuple
 
+from docsassist import keyword_guard, metrics, tracing
+from docsassist.cache import get_response_cache, make_cache_key
 from docsassist.deployments import LLMDeployment
+from docsassist.exceptions import (
+    CompletionFormatError,
+    DeploymentError,
+    DeploymentNotFoundError,
+    RateLimitError,
+)
+from docsassist.semantic_cache import (
+    attachment_digest,
+    get_semantic_cache,
+    split_question,
+)
+from docsassist.transport import encode_request
+
+if TYPE_CHECKING:
+    from openai.types.chat.chat_completion_message_param import (
+        ChatCompletionMessageParam,
+    )
 
 logger = logging.getLogger(__name__)
 
 
-def get_llm_completion(question: str, messages: list[ChatCompletionMessageParam]) -> dict:
+@tracing.traced("predict.get_llm_completion")
+def get_llm_completion(
+    question: str,
+    messages: list[ChatCompletionMessageParam],
+    use_cache: bool = True,
+) -> dict:
     """
     Send a prompt to the DataRobot Chat API and return the response
     
     Args:
         question (str): The user's question
         messages (list): Previous conversation messages
+        use_cache (bool): Set to False to skip cached answers, e.g. to regenerate
         
     Returns:
         dict: Response from the DataRobot Chat API
+
+    Raises:
+        DeploymentNotFoundError: If the deployment ID cannot be resolved
+        DeploymentError: If the deployment answers with an error status
     """
+    started = time.perf_counter()
     # Combine previous messages with the new question
     all_messages = []
     for msg in messages:
@@ -49,31 +89,350 @@ def get_llm_completion(question: str, messages: list[ChatCompletionMessageParam]
         "messages": all_messages
     }
 
+    # Obviously blocked prompts are answered without a round trip
+    blocked = keyword_guard.screen(question)
+    if blocked is not None:
+        _record_completion("blocked", started)
+        return blocked
+
+    deployment_id = _get_deployment_id()
+
+    caches = _CompletionCaches(deployment_id, question, messages, data)
+    cached, outcome = caches.lookup(use_cache)
+    if cached is not None:
+        _record_completion(outcome, started)
+        return cached
+
     try:
-        deployment_id = LLMDeployment().id
-    except Exception as e:
-        st.error(f"Failed to retrieve deployment ID: {str(e)}")
+        result = _post_chat_completion(deployment_id, data)
+        caches.store(result)
+        _record_completion("ok", started)
+        return result
+
+    except Exception:
+        _record_completion("error", started)
         raise
 
+
+def stream_llm_completion(
+    question: str,
+    messages: Sequence[Mapping[str, Any]],
+    use_cache: bool = True,
+) -> Iterator[str]:
+    """
+    Send a prompt to the DataRobot Chat API and yield the answer as it streams
+
+    Cached answers are yielded in one piece. Streamed answers are cached once
+    complete, so they are reused by get_llm_completion() as well.
+
+    Args:
+        question (str): The user's question
+        messages (list): Previous conversation messages
+        use_cache (bool): Set to False to skip cached answers, e.g. to regenerate
+
+    Yields:
+        str: Pieces of the answer's content
+    """
+    started = time.perf_counter()
+    all_messages = [{"role": msg["role"], "content": msg["content"]} for msg in messages]
+    all_messages.append({"role": "user", "content": question})
+    data = {"model": "deployed-llm", "messages": all_messages}
+    blocked = keyword_guard.screen(question)
+    if blocked is not None:
+        _record_completion("blocked", started)
+        yield str(blocked["choices"][0]["message"]["content"])
+        return
+    deployment_id = _get_deployment_id()
+
+    caches = _CompletionCaches(deployment_id, question, messages, data)
+    cached, outcome = caches.lookup(use_cache)
+    if cached is not None:
+        _record_completion(outcome, started)
+        yield str(cached["choices"][0]["message"]["content"])
+        return
+
+    content: list[str] = []
+    finish_reason = None
     try:
-        client = dr.Client()
-        base_url = client.endpoint
-        
-        # Retrieve deployment information
-        url = f"{base_url}/deployments/{deployment_id}/chat/completions"
-        # Request headers
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {client.token}"
+        for chunk in _stream_chat_completion(deployment_id, {**data, "stream": True}):
+            for choice in chunk.get("choices", []):
+                delta = choice.get("delta", {}).get("content")
+                finish_reason = choice.get("finish_reason") or finish_reason
+                if delta:
+                    content.append(delta)
+                    yield delta
+    except Exception:
+        _record_completion("error", started)
+        raise
+    caches.store(
+        {
+            "choices": [
+                {
+                    "index": 0,
+                    "message": {"role": "assistant", "content": "".join(content)},
+                    "finish_reason": finish_reason,
+                }
+            ]
         }
-        response = requests.post(url, headers=headers, data=json.dumps(data))
-        
-        if response.status_code != 200:
-            raise Exception(
-                f"DataRobot API Error: {response.status_code} - {response.text}")
-        
-        return response.json()
+    )
+    _record_completion("ok", started)
+
+
+class _CompletionCaches:
+    """Response and semantic cache lookups for one question."""
+
+    def __init__(
+        self,
+        deployment_id: str,
+        question: str,
+        messages: Sequence[Mapping[str, Any]],
+        data: dict,
+    ) -> None:
+        self.cache = get_response_cache()
+        self.cache_key = make_cache_key(
+            deployment_id,
+            data["messages"],
+            {key: value for key, value in data.items() if key != "messages"},
+        )
+        # Paraphrased questions about the same attachments reuse the earlier answer
+        self.semantic_cache = get_semantic_cache()
+        self.semantic_scope = None
+        self.typed_question, attachments = split_question(question)
+        for msg in reversed(messages):
+            if attachments:
+                break
+            if msg["role"] == "user":
+                attachments = split_question(str(msg["content"]))[1]
+        if self.semantic_cache is not None and attachments:
+            self.semantic_scope = attachment_digest(deployment_id, attachments)
+
+    def lookup(self, use_cache: bool) -> Tuple[Optional[dict], str]:
+        """Return a cached response and which cache it came from, if any."""
+        cache, semantic_cache = self.cache, self.semantic_cache
+        if cache is not None:
+            if use_cache:
+                with tracing.span("predict.response_cache") as cache_span:
+                    cached = cache.get(self.cache_key)
+                    cache_span.set_attribute("hit", cached is not None)
+                metrics.CACHE_LOOKUPS.inc("response", "miss" if cached is None else "hit")
+                if cached is not None:
+                    logger.info("Response cache hit (%s)", cache.stats.as_dict())
+                    return cached, "cache_hit"
+            else:
+                cache.bypass()
+
+        if semantic_cache is not None and self.semantic_scope is not None:
+            if use_cache:
+                with tracing.span("predict.semantic_cache") as cache_span:
+                    match = semantic_cache.get(self.semantic_scope, self.typed_question)
+                    cache_span.set_attribute("hit", match is not None)
+                metrics.CACHE_LOOKUPS.inc("semantic", "miss" if match is None else "hit")
+                if match is not None:
+                    logger.info(
+                        "Semantic cache hit at similarity %.3f (%s)",
+                        match.similarity,
+                        semantic_cache.stats.as_dict(),
+                    )
+                    return match.response, "semantic_hit"
+            else:
+                semantic_cache.bypass()
+        return None, ""
+
+    def store(self, result: dict) -> None:
+        if self.cache is not None:
+            self.cache.put(self.cache_key, result)
+        if self.semantic_cache is not None and self.semantic_scope is not None:
+            self.semantic_cache.put(self.semantic_scope, self.typed_question, result)
+
+
+@lru_cache(maxsize=1)
+def _get_client() -> Any:
+    """
+    Process-wide DataRobot client, created on first use
+
+    Construction reads the environment or config file and checks the server
+    version over the network, so it is done once rather than per request.
+    """
+    import datarobot as dr
 
+    return dr.Client()
+
+
+def _get_deployment_id() -> str:
+    try:
+        with tracing.span("predict.deployment_id"):
+            return _resolve_deployment_id()
     except Exception as e:
-        st.error(f"An error occurred: {str(e)}")
-        raise
+        raise DeploymentNotFoundError(
+            f"Failed to retrieve deployment ID: {str(e)}"
+        ) from e
+
+
+@lru_cache(maxsize=1)
+def _resolve_deployment_id() -> str:
+    # Settings may shell out to `pulumi stack output`; failures are not cached
+    return LLMDeployment().id
+
+
+def _record_completion(outcome: str, started: float) -> None:
+    metrics.CHAT_REQUESTS.inc(outcome)
+    metrics.CHAT_LATENCY.observe(time.perf_counter() - started, outcome)
+
+
+def summarize_history(
+    previous_summary: str, turns: Sequence[Mapping[str, Any]]
+) -> str:
+    """
+    Ask the LLM deployment to fold older turns into the running summary
+
+    Args:
+        previous_summary (str): The summary produced for earlier turns, if any
+        turns (list): The messages to fold into the summary
+
+    Returns:
+        str: The updated summary
+    """
+    transcript = "\n\n".join(f"{turn['role']}: {turn['content']}" for turn in turns)
+    prompt = (
+        "Update the summary of a conversation between a user and a log analysis "
+        "assistant. Keep file names, error messages, counts, timestamps and "
+        "conclusions; drop pleasantries. Reply with the summary only.\n\n"
+        f"Current summary:\n{previous_summary or '(none)'}\n\n"
+        f"New turns:\n{transcript}"
+    )
+    data = {
+        "model": "deployed-llm",
+        "messages": [{"role": "user", "content": prompt}],
+    }
+    result = _post_chat_completion(_get_deployment_id(), data)
+    return str(result["choices"][0]["message"]["content"]).strip()
+
+
+def ping_deployment(
+    deployment_id: Optional[str] = None,
+    input_column: Optional[str] = None,
+    timeout: float = 300.0,
+) -> int:
+    """
+    Send a cheap request that wakes a deployment scaled to zero
+
+    Args:
+        deployment_id (str): The deployment; the LLM deployment when None
+        input_column (str): For a guard or other predictive deployment, the
+            column of its one-row prediction request; the LLM deployment is
+            asked for a one-token chat completion instead
+        timeout (float): Seconds to wait, including the cold start
+
+    Returns:
+        int: The HTTP status code of the response
+    """
+    client = _get_client()
+    deployment_id = deployment_id or _get_deployment_id()
+    url = f"{client.endpoint}/deployments/{deployment_id}"
+    data: Any
+    if input_column is None:
+        url += "/chat/completions"
+        data = {
+            "model": "deployed-llm",
+            "messages": [{"role": "user", "content": "Hello"}],
+            "max_tokens": 1,
+        }
+    else:
+        url += "/predictions"
+        data = [{input_column: "Hello"}]
+    response = _get_session().post(
+        url,
+        json=data,
+        headers={"Authorization": f"Bearer {client.token}"},
+        timeout=timeout,
+    )
+    return response.status_code
+
+
+@lru_cache(maxsize=1)
+def _get_session() -> requests.Session:
+    """Process-wide session, so concurrent callers share pooled connections."""
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=32)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def _send_chat_completion(
+    deployment_id: str, data: dict, stream: bool = False
+) -> Tuple[requests.Response, int]:
+    with tracing.span("predict.client"):
+        client = _get_client()
+    base_url = client.endpoint
+    
+    # Retrieve deployment information
+    url = f"{base_url}/deployments/{deployment_id}/chat/completions"
+    with tracing.span("predict.encode") as encode_span:
+        body, headers = encode_request(data)
+        encode_span.set_attribute("request_bytes", len(body))
+    metrics.REQUEST_BYTES.inc(amount=len(body))
+    headers["Authorization"] = f"Bearer {client.token}"
+    with tracing.span("predict.network") as network_span:
+        response = _get_session().post(url, headers=headers, data=body, stream=stream)
+        network_span.set_attribute("status", response.status_code)
+        # Time spent in the deployment itself, including guardrails, if reported
+        execution_ms = response.headers.get("X-DataRobot-Execution-Time")
+        if execution_ms is not None:
+            network_span.set_attribute("server_ms", execution_ms)
+    
+    if response.status_code != 200:
+        metrics.DEPLOYMENT_ERRORS.inc(str(response.status_code))
+        if response.status_code == 429:
+            retry_after = response.headers.get("Retry-After")
+            raise RateLimitError(
+                response.status_code,
+                response.text,
+                float(retry_after) if retry_after and retry_after.isdigit() else None,
+            )
+        raise DeploymentError(response.status_code, response.text)
+    return response, len(body)
+
+
+def _post_chat_completion(deployment_id: str, data: dict) -> dict:
+    started = time.perf_counter()
+    response, request_bytes = _send_chat_completion(deployment_id, data)
+    logger.info(
+        "Chat completion: %d messages, %d request bytes, %.0f ms",
+        len(data["messages"]),
+        request_bytes,
+        (time.perf_counter() - started) * 1000,
+    )
+    
+    with tracing.span("predict.decode"):
+        try:
+            return response.json()
+        except ValueError as e:
+            raise CompletionFormatError(
+                f"Invalid chat completion response: {response.text[:200]}"
+            ) from e
+
+
+def _stream_chat_completion(deployment_id: str, data: dict) -> Iterator[dict]:
+    """Yield the chunks of a streamed chat completion as they arrive."""
+    started = time.perf_counter()
+    response, request_bytes = _send_chat_completion(deployment_id, data, stream=True)
+    with response:
+        for line in response.iter_lines():
+            if not line.startswith(b"data:"):
+                continue
+            payload = line[len(b"data:") :].strip()
+            if payload == b"[DONE]":
+                break
+            try:
+                yield json.loads(payload)
+            except ValueError as e:
+                raise CompletionFormatError(
+                    f"Invalid chat completion chunk: {payload[:200]!r}"
+                ) from e
+    logger.info(
+        "Chat completion stream: %d messages, %d request bytes, %.0f ms",
+        len(data["messages"]),
+        request_bytes,
+        (time.perf_counter() - started) * 1000,
+    )
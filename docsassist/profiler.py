@@ -0,0 +1,220 @@
+# Copyright 2024 DataRobot, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Opt-in sampling profiler for Streamlit script threads.
+
+A single daemon thread wakes every few milliseconds, reads the stacks of the
+threads currently running a profiled rerun from sys._current_frames() and
+counts them in flamegraph-compatible collapsed form ("a;b;c 42"). If
+sampling takes more than the allowed share of wall time, the interval is
+stretched. Distinct stacks and the rendered artifact are capped.
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from functools import lru_cache
+from types import CodeType, FrameType
+from typing import Dict, Iterator, List, Optional
+
+from pydantic import AliasChoices, Field
+from pydantic_settings import BaseSettings
+
+profiler_env_prefix: str = "PROFILER_"
+
+OTHER_STACK: str = "[other stacks]"
+# Leaf of a stack cut at PROFILER_MAX_DEPTH frames
+TRUNCATED_FRAMES: str = "[truncated]"
+
+
+def _env_alias(name: str) -> AliasChoices:
+    return AliasChoices(
+        "MLOPS_RUNTIME_PARAM_" + profiler_env_prefix + name,
+        profiler_env_prefix + name,
+    )
+
+
+class ProfilerSettings(BaseSettings):
+    """Sampling profiler settings from env or DR runtime parameters"""
+
+    enabled: bool = Field(default=False, validation_alias=_env_alias("ENABLED"))
+    interval_ms: float = Field(
+        default=10.0, gt=0, validation_alias=_env_alias("INTERVAL_MS")
+    )
+    max_overhead: float = Field(
+        default=0.02, gt=0, lt=1, validation_alias=_env_alias("MAX_OVERHEAD")
+    )
+    turns_per_profile: int = Field(
+        default=0, ge=0, validation_alias=_env_alias("TURNS_PER_PROFILE")
+    )
+    max_stacks: int = Field(
+        default=5000, ge=1, validation_alias=_env_alias("MAX_STACKS")
+    )
+    max_depth: int = Field(default=128, ge=1, validation_alias=_env_alias("MAX_DEPTH"))
+    max_bytes: int = Field(
+        default=1024 * 1024, ge=1024, validation_alias=_env_alias("MAX_BYTES")
+    )
+
+
+class Profile:
+    """Collapsed stack counts for one session, or one window of its turns."""
+
+    def __init__(self, max_stacks: int = 5000, max_bytes: int = 1024 * 1024) -> None:
+        self.max_stacks = max_stacks
+        self.max_bytes = max_bytes
+        self.stacks: Counter[str] = Counter()
+        self.samples = 0
+        self.turns = 0
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+
+    def add(self, stack: str) -> None:
+        with self._lock:
+            self.samples += 1
+            if stack in self.stacks or len(self.stacks) < self.max_stacks:
+                self.stacks[stack] += 1
+            else:
+                self.stacks[OTHER_STACK] += 1
+
+    def collapsed(self) -> str:
+        """Render the most frequent stacks first, within max_bytes."""
+        with self._lock:
+            items = self.stacks.most_common()
+        lines: List[str] = []
+        size = 0
+        for stack, count in items:
+            line = f"{stack} {count}\n"
+            size += len(line.encode("utf-8"))
+            if size > self.max_bytes:
+                break
+            lines.append(line)
+        return "".join(lines)
+
+
+class SamplingProfiler:
+    """Samples registered threads from one background thread."""
+
+    def __init__(
+        self,
+        interval_ms: float = 10.0,
+        max_overhead: float = 0.02,
+        max_depth: int = 128,
+        max_stacks: int = 5000,
+        max_bytes: int = 1024 * 1024,
+        turns_per_profile: int = 0,
+    ) -> None:
+        self.max_stacks = max_stacks
+        self.max_bytes = max_bytes
+        self.turns_per_profile = turns_per_profile
+        self.base_interval = interval_ms / 1000
+        self.interval = self.base_interval
+        self.max_overhead = max_overhead
+        self.max_depth = max_depth
+        self._targets: Dict[int, Profile] = {}
+        self._labels: Dict[CodeType, str] = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def new_profile(self) -> Profile:
+        return Profile(max_stacks=self.max_stacks, max_bytes=self.max_bytes)
+
+    def profile_complete(self, profile: Profile) -> bool:
+        """Whether profile covers its window of turns and should be rotated."""
+        return 0 < self.turns_per_profile <= profile.turns
+
+    @contextmanager
+    def sample(self, profile: Profile) -> Iterator[Profile]:
+        """Sample the calling thread into profile for the duration of the block."""
+        ident = threading.get_ident()
+        with self._lock:
+            self._targets[ident] = profile
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="sampling-profiler", daemon=True
+                )
+                self._thread.start()
+        self._wakeup.set()
+        try:
+            yield profile
+        finally:
+            with self._lock:
+                self._targets.pop(ident, None)
+
+    def _run(self) -> None:
+        while True:
+            with self._lock:
+                idle = not self._targets
+                if idle:
+                    self._wakeup.clear()
+            if idle:
+                self._wakeup.wait()
+                continue
+            started = time.perf_counter()
+            self._sample_once()
+            spent = time.perf_counter() - started
+            # Keep sampling cost under max_overhead of wall time
+            self.interval = max(self.base_interval, spent / self.max_overhead)
+            time.sleep(self.interval)
+
+    def _sample_once(self) -> None:
+        with self._lock:
+            targets = list(self._targets.items())
+        frames = sys._current_frames()
+        for ident, profile in targets:
+            frame = frames.get(ident)
+            if frame is not None:
+                profile.add(self._collapse(frame))
+
+    def _collapse(self, frame: Optional[FrameType]) -> str:
+        codes: List[CodeType] = []
+        while frame is not None:
+            codes.append(frame.f_code)
+            frame = frame.f_back
+        # Deep stacks keep their root frames, so that they still merge with
+        # the shallower samples of the same call path
+        truncated = len(codes) > self.max_depth
+        names: List[str] = []
+        for code in reversed(codes[-self.max_depth :] if truncated else codes):
+            label = self._labels.get(code)
+            if label is None:
+                filename = os.path.basename(code.co_filename)
+                label = f"{code.co_name} ({filename}:{code.co_firstlineno})"
+                label = self._labels[code] = label.replace(";", ":")
+            names.append(label)
+        if truncated:
+            names.append(TRUNCATED_FRAMES)
+        return ";".join(names)
+
+
+@lru_cache(maxsize=1)
+def get_profiler() -> Optional[SamplingProfiler]:
+    """Return the process-wide profiler, or None when profiling is disabled."""
+    settings = ProfilerSettings()
+    if not settings.enabled:
+        return None
+    return SamplingProfiler(
+        interval_ms=settings.interval_ms,
+        max_overhead=settings.max_overhead,
+        max_depth=settings.max_depth,
+        max_stacks=settings.max_stacks,
+        max_bytes=settings.max_bytes,
+        turns_per_profile=settings.turns_per_profile,
+    )
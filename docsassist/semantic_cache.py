@@ -0,0 +1,253 @@
+# Copyright 2024 DataRobot, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Semantic cache that answers paraphrased questions about the same attachments."""
+
+from __future__ import annotations
+
+import hashlib
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+
+from pydantic import AliasChoices, Field
+from pydantic_settings import BaseSettings
+
+from docsassist.cache import CacheStats
+from docsassist.ingest import ATTACHMENT_MARKER
+
+# numpy is imported on first use so importing docsassist stays fast
+if TYPE_CHECKING:
+    import numpy as np
+    import numpy.typing as npt
+
+semantic_cache_env_prefix: str = "SEMANTIC_CACHE_"
+
+_TOKEN_RE = re.compile(r"[0-9a-z]+|[^\x00-\x7f\s]")
+
+# Function words and request verbs carry no meaning for questions about a log,
+# so "list the errors" and "what errors are there" reduce to the same features.
+_STOPWORDS = frozenset(
+    """
+    a about all an and any are as at be can could did do does for from give
+    had has have here how i in is it its list log logs me my of on or please
+    show so tell that the their them there these this those to was were what
+    whats which with would you your
+    """.split()
+)
+
+
+def _env_alias(name: str) -> AliasChoices:
+    return AliasChoices(
+        "MLOPS_RUNTIME_PARAM_" + semantic_cache_env_prefix + name,
+        semantic_cache_env_prefix + name,
+    )
+
+
+class SemanticCacheSettings(BaseSettings):
+    """Semantic cache settings from env or DR runtime parameters"""
+
+    enabled: bool = Field(default=True, validation_alias=_env_alias("ENABLED"))
+    threshold: float = Field(default=0.9, validation_alias=_env_alias("THRESHOLD"))
+    ttl_seconds: float = Field(default=3600.0, validation_alias=_env_alias("TTL"))
+    max_entries: int = Field(default=10_000, validation_alias=_env_alias("MAX_ENTRIES"))
+    dim: int = Field(default=128, validation_alias=_env_alias("DIM"))
+
+
+def split_question(message: str) -> Tuple[str, str]:
+    """Split a chat message into the typed question and the attached files."""
+    question, marker, attachments = message.partition(ATTACHMENT_MARKER)
+    return question.strip(), marker + attachments
+
+
+def attachment_digest(deployment_id: str, attachments: str) -> str:
+    """Scope key so cached answers are only reused for the same log contents."""
+    digest = hashlib.sha256(deployment_id.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(attachments.encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _stem(token: str) -> str:
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-3] + "y"
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+class HashingVectorizer:
+    """Signed feature hashing of stemmed words and word bigrams, L2 normalized."""
+
+    def __init__(self, dim: int) -> None:
+        self.dim = dim
+
+    def features(self, text: str) -> List[str]:
+        words = [
+            _stem(token)
+            for token in _TOKEN_RE.findall(text.lower())
+            if token not in _STOPWORDS
+        ]
+        return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+    def transform(self, text: str) -> Optional[npt.NDArray[np.float32]]:
+        """Return the unit vector for text, or None if it has no features."""
+        features = self.features(text)
+        if not features:
+            return None
+        import numpy as np
+
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature in features:
+            h = zlib.crc32(feature.encode("utf-8"))
+            vector[h % self.dim] += 1.0 if h & 0x80000000 else -1.0
+        norm = float(np.linalg.norm(vector))
+        if norm == 0.0:
+            return None
+        result: npt.NDArray[np.float32] = vector / norm
+        return result
+
+
+class _ScopeIndex:
+    """Ring buffer of question vectors and answers for one attachment digest."""
+
+    def __init__(self, dim: int, capacity: int) -> None:
+        import numpy as np
+
+        self.capacity = capacity
+        self.vectors = np.zeros((min(16, capacity), dim), dtype=np.float32)
+        self.expires_at = np.zeros(len(self.vectors), dtype=np.float64)
+        self.answers: List[Optional[Dict[str, Any]]] = [None] * len(self.vectors)
+        self.size = 0
+        self.inserted = 0
+
+    def add(
+        self, vector: npt.NDArray[np.float32], answer: Dict[str, Any], expires_at: float
+    ) -> None:
+        if self.size == len(self.vectors) and self.size < self.capacity:
+            import numpy as np
+
+            grown = min(self.capacity, 2 * self.size)
+            vectors = np.zeros((grown, self.vectors.shape[1]), dtype=np.float32)
+            vectors[: self.size] = self.vectors
+            expiry = np.zeros(grown, dtype=np.float64)
+            expiry[: self.size] = self.expires_at
+            self.vectors, self.expires_at = vectors, expiry
+            self.answers.extend([None] * (grown - self.size))
+        row = self.inserted % self.capacity
+        self.vectors[row] = vector
+        self.expires_at[row] = expires_at
+        self.answers[row] = answer
+        self.inserted += 1
+        self.size = min(self.size + 1, self.capacity)
+
+    def nearest(
+        self, vector: npt.NDArray[np.float32], now: float
+    ) -> Tuple[float, Optional[Dict[str, Any]]]:
+        if self.size == 0:
+            return -1.0, None
+        scores = self.vectors[: self.size] @ vector
+        scores[self.expires_at[: self.size] < now] = -1.0
+        row = int(scores.argmax())
+        return float(scores[row]), self.answers[row]
+
+
+@dataclass
+class SemanticMatch:
+    similarity: float
+    response: Dict[str, Any]
+
+
+class SemanticCache:
+    """
+    Nearest-neighbour lookup of prior questions asked over the same attachments.
+
+    Entries are grouped by attachment digest so a lookup only scans questions
+    asked about the same logs. Scopes are evicted least recently used once the
+    total number of cached questions exceeds max_entries.
+    """
+
+    def __init__(
+        self,
+        threshold: float,
+        ttl_seconds: float,
+        max_entries: int,
+        dim: int = 128,
+    ) -> None:
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.vectorizer = HashingVectorizer(dim)
+        self.stats = CacheStats()
+        self._scopes: OrderedDict[str, _ScopeIndex] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return sum(scope.size for scope in self._scopes.values())
+
+    def get(self, scope: str, question: str) -> Optional[SemanticMatch]:
+        vector = self.vectorizer.transform(question)
+        if vector is None:
+            return None
+        with self._lock:
+            index = self._scopes.get(scope)
+            if index is None:
+                self.stats.record("misses")
+                return None
+            self._scopes.move_to_end(scope)
+            similarity, answer = index.nearest(vector, time.time())
+        if answer is None or similarity < self.threshold:
+            self.stats.record("misses")
+            return None
+        self.stats.record("hits")
+        return SemanticMatch(similarity=similarity, response=answer)
+
+    def put(self, scope: str, question: str, response: Dict[str, Any]) -> None:
+        vector = self.vectorizer.transform(question)
+        if vector is None:
+            return
+        with self._lock:
+            index = self._scopes.get(scope)
+            if index is None:
+                index = _ScopeIndex(self.vectorizer.dim, self.max_entries)
+                self._scopes[scope] = index
+            self._scopes.move_to_end(scope)
+            index.add(vector, response, time.time() + self.ttl_seconds)
+            total = len(self)
+            while total > self.max_entries and len(self._scopes) > 1:
+                _, evicted = self._scopes.popitem(last=False)
+                total -= evicted.size
+                self.stats.record("evictions", evicted.size)
+
+    def bypass(self) -> None:
+        self.stats.record("bypasses")
+
+
+@lru_cache(maxsize=1)
+def get_semantic_cache() -> Optional[SemanticCache]:
+    """Return the process-wide semantic cache, or None when disabled."""
+    settings = SemanticCacheSettings()
+    if not settings.enabled:
+        return None
+    return SemanticCache(
+        threshold=settings.threshold,
+        ttl_seconds=settings.ttl_seconds,
+        max_entries=settings.max_entries,
+        dim=settings.dim,
+    )
@@ -0,0 +1,210 @@
+# Copyright 2024 DataRobot, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Lightweight spans with monotonic timings for per-turn latency breakdowns.
+
+Tracing is off by default and every span() call returns a shared no-op
+context. When enabled, spans nest through a context variable; finished
+root spans are logged as JSON and, if the OpenTelemetry API is installed
+and selected, mirrored as OpenTelemetry spans.
+"""
+
+from __future__ import annotations
+
+import functools
+import json
+import logging
+import time
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import (
+    Any,
+    Callable,
+    ContextManager,
+    Dict,
+    Iterator,
+    List,
+    Literal,
+    Optional,
+    Tuple,
+    TypeVar,
+)
+
+from pydantic import AliasChoices, Field
+from pydantic_settings import BaseSettings
+
+logger = logging.getLogger(__name__)
+
+tracing_env_prefix: str = "TRACING_"
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+
+def _env_alias(name: str) -> AliasChoices:
+    return AliasChoices(
+        "MLOPS_RUNTIME_PARAM_" + tracing_env_prefix + name,
+        tracing_env_prefix + name,
+    )
+
+
+class TracingSettings(BaseSettings):
+    """Tracing settings from env or DR runtime parameters"""
+
+    enabled: bool = Field(default=False, validation_alias=_env_alias("ENABLED"))
+    exporter: Literal["log", "otel", "both", "none"] = Field(
+        default="log", validation_alias=_env_alias("EXPORTER")
+    )
+
+
+@dataclass
+class Span:
+    name: str
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    start_ns: int = 0
+    end_ns: Optional[int] = None
+    children: List[Span] = field(default_factory=list)
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end_ns if self.end_ns is not None else time.monotonic_ns()
+        return (end - self.start_ns) / 1e6
+
+    def walk(self, depth: int = 0) -> Iterator[Tuple[int, Span]]:
+        yield depth, self
+        for child in self.children:
+            yield from child.walk(depth + 1)
+
+    def find(self, name: str) -> Optional[Span]:
+        return next((span for _, span in self.walk() if span.name == name), None)
+
+    def breakdown(self) -> List[Dict[str, Any]]:
+        """Flattened spans with their share of this span's duration."""
+        total = self.duration_ms or 1.0
+        return [
+            {
+                "span": "  " * depth + span.name,
+                "ms": round(span.duration_ms, 2),
+                "share": round(span.duration_ms / total, 3),
+                **span.attributes,
+            }
+            for depth, span in self.walk()
+        ]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "duration_ms": round(self.duration_ms, 3),
+            "attributes": self.attributes,
+            "children": [child.to_dict() for child in self.children],
+        }
+
+
+class _NoOpSpan:
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+
+_NOOP_SPAN = _NoOpSpan()
+_NOOP_CONTEXT: ContextManager[Any] = nullcontext(_NOOP_SPAN)
+
+_current_span: ContextVar[Optional[Span]] = ContextVar(
+    "docsassist_current_span", default=None
+)
+
+
+class Tracer:
+    """Records nested spans and exports each finished root span."""
+
+    def __init__(self, log: bool = True, otel: bool = False) -> None:
+        self.log = log
+        self._otel_tracer: Any = None
+        if otel:
+            try:
+                from opentelemetry import trace as otel_trace
+
+                self._otel_tracer = otel_trace.get_tracer("docsassist")
+            except ImportError:
+                logger.warning("opentelemetry-api is not installed, not exporting")
+
+    @contextmanager
+    def span(self, name: str, **attributes: Any) -> Iterator[Span]:
+        parent = _current_span.get()
+        span = Span(name, attributes, time.monotonic_ns())
+        if parent is not None:
+            parent.children.append(span)
+        token = _current_span.set(span)
+        otel_context: ContextManager[Any] = (
+            self._otel_tracer.start_as_current_span(name, attributes=attributes)
+            if self._otel_tracer is not None
+            else nullcontext()
+        )
+        try:
+            with otel_context as otel_span:
+                try:
+                    yield span
+                finally:
+                    if otel_span is not None:
+                        otel_span.set_attributes(_otel_attributes(span.attributes))
+        finally:
+            span.end_ns = time.monotonic_ns()
+            _current_span.reset(token)
+            if parent is None and self.log:
+                logger.info("trace %s", json.dumps(span.to_dict(), default=str))
+
+
+def _otel_attributes(attributes: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        key: value if isinstance(value, (str, bool, int, float)) else str(value)
+        for key, value in attributes.items()
+    }
+
+
+@lru_cache(maxsize=1)
+def get_tracer() -> Optional[Tracer]:
+    """Return the process-wide tracer, or None when tracing is disabled."""
+    settings = TracingSettings()
+    if not settings.enabled:
+        return None
+    return Tracer(
+        log=settings.exporter in ("log", "both"),
+        otel=settings.exporter in ("otel", "both"),
+    )
+
+
+def span(name: str, **attributes: Any) -> ContextManager[Any]:
+    """Time a block as a child of the current span; a no-op when disabled."""
+    tracer = get_tracer()
+    if tracer is None:
+        return _NOOP_CONTEXT
+    return tracer.span(name, **attributes)
+
+
+def traced(name: str) -> Callable[[F], F]:
+    """Decorator form of span()."""
+
+    def decorator(fn: F) -> F:
+        @functools.wraps(fn)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            with span(name):
+                return fn(*args, **kwargs)
+
+        return wrapper  # type: ignore[return-value]
+
+    return decorator
@@ -0,0 +1,120 @@
+# Copyright 2024 DataRobot, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Serialization and compression of request bodies sent to the deployment."""
+
+from __future__ import annotations
+
+import gzip
+import json
+import logging
+from functools import lru_cache
+from typing import Any, Dict, Literal, Tuple
+
+from pydantic import AliasChoices, Field
+from pydantic_settings import BaseSettings, SettingsConfigDict
+from urllib3.util import make_headers
+
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional codec
+    zstandard = None
+
+payload_env_prefix: str = "REQUEST_"
+
+
+def _env_alias(name: str) -> AliasChoices:
+    return AliasChoices(
+        "MLOPS_RUNTIME_PARAM_" + payload_env_prefix + name,
+        payload_env_prefix + name,
+    )
+
+
+class PayloadSettings(BaseSettings):
+    """Request body encoding settings from env or DR runtime parameters"""
+
+    model_config = SettingsConfigDict(populate_by_name=True)
+
+    compression: Literal["none", "gzip", "zstd"] = Field(
+        default="none", validation_alias=_env_alias("COMPRESSION")
+    )
+    compression_level: int | None = Field(
+        default=None, validation_alias=_env_alias("COMPRESSION_LEVEL")
+    )
+    min_compress_bytes: int = Field(
+        default=16 * 1024, validation_alias=_env_alias("MIN_COMPRESS_BYTES")
+    )
+
+
+def dumps(data: Any) -> bytes:
+    """Serialize a JSON payload to UTF-8 bytes, using orjson when installed."""
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def compress(body: bytes, codec: str, level: int | None = None) -> bytes:
+    """Compress a body with gzip or zstd."""
+    if codec == "zstd":
+        if zstandard is None:
+            raise ValueError("zstd compression requires the zstandard package")
+        return zstandard.ZstdCompressor(level=level or 3).compress(body)
+    return gzip.compress(body, compresslevel=level or 1, mtime=0)
+
+
+@lru_cache(maxsize=1)
+def get_payload_settings() -> PayloadSettings:
+    return PayloadSettings()
+
+
+@lru_cache(maxsize=1)
+def accept_encoding() -> str:
+    """Every response encoding the installed urllib3 can decode."""
+    return make_headers(accept_encoding=True)["accept-encoding"]
+
+
+def encode_request(
+    data: Any, settings: PayloadSettings | None = None
+) -> Tuple[bytes, Dict[str, str]]:
+    """
+    Serialize and optionally compress a JSON request body.
+
+    Args:
+        data: The JSON-serializable payload
+        settings (PayloadSettings): Encoding settings, read once from env if omitted
+
+    Returns:
+        tuple: The body and the content headers to send with it
+    """
+    settings = settings or get_payload_settings()
+    body = dumps(data)
+    headers = {
+        "Content-Type": "application/json",
+        "Accept-Encoding": accept_encoding(),
+    }
+    if settings.compression == "none" or len(body) < settings.min_compress_bytes:
+        return body, headers
+    codec = settings.compression
+    if codec == "zstd" and zstandard is None:
+        logger.warning("zstandard is not installed, compressing with gzip instead")
+        codec = "gzip"
+    headers["Content-Encoding"] = codec
+    return compress(body, codec, settings.compression_level), headers
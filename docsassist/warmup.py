@@ -0,0 +1,349 @@
+# Copyright 2024 DataRobot, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Warming up deployments that scale to zero.
+
+The LLM and guard deployments run on serverless prediction environments
+with no minimum computes, so the first question after they idle pays a
+cold start of the LLM and of every guard, one after the other. Here each
+deployment gets a cheap request of its own, all in parallel: when a
+session starts, unless a warm-up ran in the last WARMUP_MIN_INTERVAL_SECONDS,
+and every WARMUP_INTERVAL_SECONDS within WARMUP_SCHEDULE, such as
+``mon-fri 08:00-18:00``.
+
+The latency of every warm-up request is kept per deployment; the slowest
+is the cold start observed. To try it against the mock deployment:
+
+    python -m benchmarks.mock_deployment --cold-start 5 --scale-to-zero-after 60
+    python -m docsassist.warmup --times 2
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+from datetime import time as clock
+from functools import lru_cache
+from typing import Dict, FrozenSet, List, NamedTuple, Optional, Sequence
+
+from pydantic import AliasChoices, Field
+from pydantic_settings import BaseSettings
+
+from docsassist import metrics
+
+logger = logging.getLogger(__name__)
+
+warmup_env_prefix: str = "WARMUP_"
+
+_DAYS = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+
+
+def _env_alias(name: str) -> AliasChoices:
+    return AliasChoices(
+        "MLOPS_RUNTIME_PARAM_" + warmup_env_prefix + name,
+        warmup_env_prefix + name,
+    )
+
+
+class WarmupSettings(BaseSettings):
+    """Warm-up settings from env or DR runtime parameters"""
+
+    on_session_start: bool = Field(
+        default=True, validation_alias=_env_alias("ON_SESSION_START")
+    )
+    min_interval_seconds: float = Field(
+        default=300.0,
+        ge=0,
+        validation_alias=_env_alias("MIN_INTERVAL_SECONDS"),
+        description="Session starts within this long of a warm-up do not warm up",
+    )
+    schedule: str = Field(
+        default="",
+        validation_alias=_env_alias("SCHEDULE"),
+        description="Days and hours to keep deployments warm; never when empty",
+    )
+    interval_seconds: float = Field(
+        default=600.0, gt=0, validation_alias=_env_alias("INTERVAL_SECONDS")
+    )
+    timezone: str = Field(default="UTC", validation_alias=_env_alias("TIMEZONE"))
+    deployments: str = Field(
+        default="[]",
+        validation_alias=_env_alias("DEPLOYMENTS"),
+        description='JSON list of {"name", "id", "input_column"} guard deployments',
+    )
+    timeout_seconds: float = Field(
+        default=300.0, gt=0, validation_alias=_env_alias("TIMEOUT_SECONDS")
+    )
+
+
+class Schedule(NamedTuple):
+    """Days of the week and hours of the day, in a timezone."""
+
+    days: FrozenSet[int]
+    start: clock
+    end: Optional[clock]
+    timezone: str = "UTC"
+
+    @classmethod
+    def parse(cls, text: str, timezone: str = "UTC") -> Schedule:
+        """
+        A schedule such as ``mon-fri 08:00-18:00`` or ``sat,sun 10:00-14:00``.
+
+        Raises:
+            ValueError: The days or hours cannot be parsed
+        """
+        try:
+            day_text, hours = text.lower().split()
+            days = set()
+            for part in day_text.split(","):
+                first, _, last = part.partition("-")
+                start_day = _DAYS.index(first)
+                end_day = _DAYS.index(last or first)
+                if end_day < start_day:
+                    # Such as fri-mon
+                    end_day += 7
+                days.update(day % 7 for day in range(start_day, end_day + 1))
+            start, end = hours.split("-")
+            return cls(
+                frozenset(days),
+                clock.fromisoformat(start),
+                # 24:00 is the end of the day
+                None if end == "24:00" else clock.fromisoformat(end),
+                timezone,
+            )
+        except ValueError as e:
+            raise ValueError(f"Invalid warm-up schedule {text!r}: {e}") from e
+
+    def contains(self, moment: Optional[datetime] = None) -> bool:
+        from zoneinfo import ZoneInfo
+
+        moment = moment or datetime.now(ZoneInfo(self.timezone))
+        now = moment.time().replace(tzinfo=None)
+        return (
+            moment.weekday() in self.days
+            and self.start <= now
+            and (self.end is None or now < self.end)
+        )
+
+
+class WarmupTarget(NamedTuple):
+    """
+    A deployment to warm up.
+
+    Args:
+        name: Label in results and metrics
+        deployment_id: The LLM deployment when None
+        input_column: Prediction column of a guard deployment; None for the
+            LLM, which gets a chat completion
+    """
+
+    name: str
+    deployment_id: Optional[str] = None
+    input_column: Optional[str] = None
+
+
+class WarmupResult(NamedTuple):
+    name: str
+    seconds: float
+    status: Optional[int]
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+@dataclass
+class DeploymentWarmth:
+    """Warm-up latencies observed for one deployment."""
+
+    count: int = 0
+    errors: int = 0
+    last_seconds: float = 0.0
+    # The slowest request is the cold start, the fastest a warm deployment
+    cold_start_seconds: float = 0.0
+    warm_seconds: Optional[float] = None
+    last_warmed: Optional[float] = None
+    last_error: Optional[str] = None
+
+
+class Warmer:
+    """Sends warm-up requests to deployments in parallel and keeps their latency."""
+
+    def __init__(
+        self,
+        targets: Sequence[WarmupTarget],
+        timeout_seconds: float = 300.0,
+        min_interval_seconds: float = 300.0,
+    ) -> None:
+        self.targets = list(targets)
+        self.timeout_seconds = timeout_seconds
+        self.min_interval_seconds = min_interval_seconds
+        self.stats: Dict[str, DeploymentWarmth] = {
+            target.name: DeploymentWarmth() for target in self.targets
+        }
+        self._lock = threading.Lock()
+        self._running = False
+        self._last_started: Optional[float] = None
+
+    @classmethod
+    def from_settings(cls, settings: Optional[WarmupSettings] = None) -> Warmer:
+        settings = settings or WarmupSettings()
+        targets = [WarmupTarget("llm")] + [
+            WarmupTarget(item["name"], item["id"], item.get("input_column"))
+            for item in json.loads(settings.deployments or "[]")
+        ]
+        return cls(targets, settings.timeout_seconds, settings.min_interval_seconds)
+
+    def _ping(self, target: WarmupTarget) -> WarmupResult:
+        from docsassist import predict
+
+        started = time.perf_counter()
+        try:
+            status = predict.ping_deployment(
+                target.deployment_id, target.input_column, self.timeout_seconds
+            )
+            error = None if status == 200 else f"HTTP {status}"
+        except Exception as e:
+            status, error = None, str(e) or type(e).__name__
+        result = WarmupResult(target.name, time.perf_counter() - started, status, error)
+        metrics.WARMUP_LATENCY.observe(
+            result.seconds, target.name, "ok" if result.ok else "error"
+        )
+        self._record(result)
+        return result
+
+    def _record(self, result: WarmupResult) -> None:
+        with self._lock:
+            stats = self.stats[result.name]
+            stats.count += 1
+            stats.last_seconds = result.seconds
+            stats.last_warmed = time.time()
+            if not result.ok:
+                stats.errors += 1
+                stats.last_error = result.error
+                return
+            stats.cold_start_seconds = max(stats.cold_start_seconds, result.seconds)
+            if stats.warm_seconds is None or result.seconds < stats.warm_seconds:
+                stats.warm_seconds = result.seconds
+
+    def warm(self) -> List[WarmupResult]:
+        """Warm up every deployment at once and wait for all of them."""
+        with self._lock:
+            self._last_started = time.monotonic()
+        with ThreadPoolExecutor(
+            max_workers=len(self.targets), thread_name_prefix="warmup"
+        ) as pool:
+            results = list(pool.map(self._ping, self.targets))
+        for result in results:
+            if not result.ok:
+                logger.warning("Warm-up of %s failed: %s", result.name, result.error)
+        return results
+
+    def warm_in_background(self, force: bool = False) -> bool:
+        """
+        Warm up in a thread, unless a warm-up is running or ran recently.
+
+        Returns:
+            bool: Whether a warm-up was started
+        """
+        with self._lock:
+            recent = (
+                self._last_started is not None
+                and time.monotonic() - self._last_started < self.min_interval_seconds
+            )
+            if self._running or (recent and not force):
+                return False
+            self._running = True
+        threading.Thread(target=self._warm_once, name="warmup", daemon=True).start()
+        return True
+
+    def _warm_once(self) -> None:
+        try:
+            self.warm()
+        finally:
+            with self._lock:
+                self._running = False
+
+
+@lru_cache(maxsize=1)
+def get_warmer() -> Warmer:
+    """Return the process-wide warmer."""
+    return Warmer.from_settings()
+
+
+def on_session_start() -> bool:
+    """Warm up in the background when a session starts, if enabled."""
+    if not WarmupSettings().on_session_start:
+        return False
+    return get_warmer().warm_in_background()
+
+
+def _keep_warm(warmer: Warmer, schedule: Schedule, interval: float) -> None:
+    while True:
+        if schedule.contains():
+            warmer.warm_in_background(force=True)
+        time.sleep(interval)
+
+
+@lru_cache(maxsize=1)
+def start_keep_warm() -> None:
+    """Keep deployments warm on WARMUP_SCHEDULE, once per process."""
+    settings = WarmupSettings()
+    if not settings.schedule:
+        return
+    schedule = Schedule.parse(settings.schedule, settings.timezone)
+    threading.Thread(
+        target=_keep_warm,
+        args=(get_warmer(), schedule, settings.interval_seconds),
+        name="warmup-schedule",
+        daemon=True,
+    ).start()
+    logger.info("Keeping deployments warm %s", settings.schedule)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Warm up the LLM and guard deployments and report latencies"
+    )
+    parser.add_argument("--times", type=int, default=1)
+    parser.add_argument("--interval", type=float, default=0.0)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(format="%(levelname)s:%(message)s", level=logging.INFO)
+    warmer = Warmer.from_settings()
+    for i in range(args.times):
+        if i:
+            time.sleep(args.interval)
+        for result in warmer.warm():
+            outcome = "ok" if result.ok else result.error
+            print(f"{result.name:30} {result.seconds:8.2f} s  {outcome}")
+    if args.times > 1:
+        print("Cold start (slowest) and warm (fastest) latency:")
+        for name, stats in warmer.stats.items():
+            warm = "-" if stats.warm_seconds is None else f"{stats.warm_seconds:.2f} s"
+            print(f"{name:30} {stats.cold_start_seconds:8.2f} s  {warm}")
+    return 0 if all(stats.errors == 0 for stats in warmer.stats.values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
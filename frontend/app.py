@@ -15,55 +15,83 @@
 from __future__ import annotations
 
 import base64
+import contextlib
 import logging
-import os
 import sys
-from io import StringIO
+import time
+from typing import TYPE_CHECKING, Dict, Tuple
 
-import datarobot as dr
 import streamlit as st
-from openai.types.chat.chat_completion_assistant_message_param import (
-    ChatCompletionAssistantMessageParam,
-)
-from openai.types.chat.chat_completion_user_message_param import (
-    ChatCompletionUserMessageParam,
-)
 from settings import app_settings
 from streamlit.delta_generator import DeltaGenerator
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 from streamlit_theme import st_theme
 
 sys.path.append("../")
-from docsassist import predict
+from llm import get_llm_completion
+
+from docsassist import (
+    correlation,
+    ingest,
+    metrics,
+    predict,
+    profiler,
+    redaction,
+    tracing,
+    warmup,
+)
+from docsassist.follow import LogFollower
+from docsassist.history import ConversationHistory
 from docsassist.i18n import gettext
 
+if TYPE_CHECKING:
+    from openai.types.chat.chat_completion_message_param import (
+        ChatCompletionMessageParam,
+    )
+
 logging.basicConfig(format="%(levelname)s:%(message)s", level=logging.INFO)
 
 
-DATAROBOT_ENDPOINT = os.getenv("DATAROBOT_ENDPOINT")
-DATAROBOT_API_KEY = os.getenv("DATAROBOT_API_TOKEN")
+@st.cache_resource
+def load_static_assets() -> Tuple[str, Dict[str, str]]:
+    """Read the stylesheet and base64-encode the logo per theme, once per process."""
+    with open("./style.css") as f:
+        css = f.read()
+    logos = {}
+    for base, path in (
+        ("dark", "./DataRobot_white.svg"),
+        ("light", "./DataRobot_black.svg"),
+    ):
+        with open(path) as f:
+            logos[base] = base64.b64encode(f.read().encode("utf-8")).decode("utf-8")
+    return css, logos
+
 
 st.set_page_config(
     page_title=app_settings.page_title, page_icon="./datarobot_favicon.png"
 )
 
-with open("./style.css") as f:
-    css = f.read()
+css, logos = load_static_assets()
 
-theme = st_theme()
-logo = "./DataRobot_white.svg"
-if theme and theme.get("base") == "light":
-    logo = "./DataRobot_black.svg"
-
-with open(logo) as f:
-    svg = f.read()
+# The theme component costs an iframe and an extra rerun; ask once per session
+if "theme_base" not in st.session_state:
+    theme = st_theme()
+    if theme:
+        st.session_state.theme_base = theme.get("base")
+logo = logos["light" if st.session_state.get("theme_base") == "light" else "dark"]
 
 st.markdown(f"<style>{css}</style>", unsafe_allow_html=True)
 
-dr.Client(endpoint=DATAROBOT_ENDPOINT, token=DATAROBOT_API_KEY)
+# The DataRobot client is created on the first deployment call, from the
+# DATAROBOT_ENDPOINT and DATAROBOT_API_TOKEN environment variables
+metrics.start_exporters()
+warmup.start_keep_warm()
 
 
 if "messages" not in st.session_state:
     st.session_state.messages = []
+    # Scale-to-zero deployments start while the user reads and uploads
+    warmup.on_session_start()
 
 if "response" not in st.session_state:
     st.session_state.response = {}
@@ -71,32 +99,258 @@ if "response" not in st.session_state:
 if "uploaded_files" not in st.session_state:
     st.session_state.uploaded_files = []
 
+if "history" not in st.session_state:
+    st.session_state.history = ConversationHistory.from_settings()
+
+if "profile" not in st.session_state:
+    sampling_profiler = profiler.get_profiler()
+    st.session_state.profile = (
+        sampling_profiler.new_profile() if sampling_profiler is not None else None
+    )
+    st.session_state.finished_profile = None
+
+if "counted_uploads" not in st.session_state:
+    st.session_state.counted_uploads = set()
+
+if "upload_tables" not in st.session_state:
+    st.session_state.upload_tables = {}
+    st.session_state.upload_facts = {}
+
+if "upload_indexes" not in st.session_state:
+    st.session_state.upload_indexes = {}
+
+if "redacted_uploads" not in st.session_state:
+    st.session_state.redacted_uploads = {}
+
+if "upload_diffs" not in st.session_state:
+    st.session_state.upload_diffs = {}
+
+if "csv_uploads" not in st.session_state:
+    st.session_state.csv_uploads = {}
 
-def render_svg(svg: str) -> None:
-    """Renders the given svg string."""
-    b64 = base64.b64encode(svg.encode("utf-8")).decode("utf-8")
+if "follower" not in st.session_state:
+    st.session_state.follower = LogFollower.from_settings()
+    st.session_state.followed_uploads = set()
+
+_script_ctx = get_script_run_ctx()
+if _script_ctx is not None:
+    metrics.SESSIONS.touch(_script_ctx.session_id)
+
+
+def render_svg(b64: str) -> None:
+    """Renders the given base64-encoded svg."""
     html = r'<img src="data:image/svg+xml;base64,%s"/>' % b64
     st.write(html, unsafe_allow_html=True)
 
 
 def process_uploaded_file(uploaded_file) -> str:
     """Process uploaded file and return its content as string."""
+    # The uploader returns the same files on every rerun; count each one once
+    if uploaded_file.file_id not in st.session_state.counted_uploads:
+        st.session_state.counted_uploads.add(uploaded_file.file_id)
+        metrics.UPLOADED_FILES.inc()
+        metrics.UPLOADED_BYTES.inc(amount=uploaded_file.size)
+    if uploaded_file.name.lower().endswith((".csv", ".tsv")):
+        content = process_csv_file(uploaded_file)
+        if content is not None:
+            return content
+    with tracing.span(
+        "app.process_uploaded_file",
+        file=uploaded_file.name,
+        bytes=uploaded_file.size,
+    ):
+        return ingest.read_uploaded_file(
+            uploaded_file.name, uploaded_file.type, uploaded_file.getvalue()
+        )
+
+
+def redact_uploaded_file(uploaded_file, content: str) -> str:
+    """The upload's content, redacted once unless it changes, as with a CSV query."""
+    redacted = st.session_state.redacted_uploads.get(uploaded_file.file_id)
+    if redacted is None or redacted[0] != content:
+        with tracing.span(
+            "app.redact_uploaded_file",
+            file=uploaded_file.name,
+            chars=len(content),
+        ):
+            redacted = (content, redaction.redact(content))
+        st.session_state.redacted_uploads[uploaded_file.file_id] = redacted
+    return redacted[1]
+
+
+def process_csv_file(uploaded_file) -> str | None:
+    """Selected columns and matching rows of a CSV upload; None to send it as is."""
+    # pandas is only needed once a CSV file is uploaded
+    from docsassist import csvlogs
+    from docsassist.exceptions import InvalidFilterError
+
+    file_id = uploaded_file.file_id
+    upload = st.session_state.csv_uploads.get(file_id)
+    if upload is None:
+        try:
+            columns = csvlogs.read_columns(uploaded_file.getvalue())
+        except ValueError:
+            # Not parseable as CSV; the file is sent verbatim
+            columns = None
+        upload = st.session_state.csv_uploads[file_id] = {
+            "columns": columns,
+            "query": None,
+            "content": None,
+        }
+    columns = upload["columns"]
+    if columns is None:
+        return None
+
+    with st.expander(gettext("Columns and rows of {0}").format(uploaded_file.name)):
+        selected = st.multiselect(
+            gettext("Columns"),
+            columns.names,
+            key=f"csv_columns_{file_id}",
+            help=gettext("All columns are sent when none are selected"),
+        )
+        filter_text = st.text_input(
+            gettext("Rows where"),
+            key=f"csv_filter_{file_id}",
+            placeholder='status>=500 service=api "timed out"',
+            help=gettext(
+                "Conditions that must all hold: column=value, column!=value, "
+                "column>=number, or text that must appear in the row"
+            ),
+        )
     try:
-        if uploaded_file.type == "text/plain":
-            # Read text file
-            stringio = StringIO(uploaded_file.getvalue().decode("utf-8"))
-            content = stringio.read()
-        elif uploaded_file.type in ["text/csv", "application/csv"]:
-            # Read CSV file
-            stringio = StringIO(uploaded_file.getvalue().decode("utf-8"))
-            content = stringio.read()
-        else:
-            # For other file types, try to read as text
-            content = uploaded_file.getvalue().decode("utf-8")
-        
-        return f"📎 {uploaded_file.name}:\n{content}"
-    except Exception as e:
-        return f"📎 {uploaded_file.name}: Failed to read file. Error: {str(e)}"
+        query = csvlogs.parse_query(columns, selected, filter_text)
+    except InvalidFilterError as e:
+        st.warning(str(e))
+        query = csvlogs.CsvQuery()
+    if not query:
+        return None
+    # Reading the whole file again is only needed when the query changes
+    if upload["query"] != query:
+        with tracing.span(
+            "app.process_csv_file",
+            file=uploaded_file.name,
+            bytes=uploaded_file.size,
+        ):
+            upload["content"] = csvlogs.csv_attachment(
+                uploaded_file.name, uploaded_file.getvalue(), query, columns
+            )
+        upload["query"] = query
+    return upload["content"]
+
+
+def parse_uploaded_files(uploaded_files) -> list[str]:
+    """
+    Precomputed and redacted facts and anomalies of log uploads; new files are
+    parsed on the process pool.
+    """
+    # NumPy is only needed once a file is uploaded
+    from docsassist import anomalies, logstore, parallel
+
+    pending = [
+        uploaded_file
+        for uploaded_file in uploaded_files
+        if uploaded_file.file_id not in st.session_state.upload_tables
+    ]
+    if pending:
+        progress = st.progress(0.0, text=gettext("Parsing uploaded files..."))
+
+        def report(done: int, total: int, name: str) -> None:
+            progress.progress(
+                done / total,
+                text=gettext("Parsed {0} ({1}/{2})").format(name, done, total),
+            )
+
+        with tracing.span(
+            "app.parse_uploaded_files",
+            files=len(pending),
+            bytes=sum(uploaded_file.size for uploaded_file in pending),
+        ):
+            tables = parallel.parse_uploads(
+                [(f.name, f.getvalue()) for f in pending], progress=report
+            )
+        for uploaded_file, table in zip(pending, tables):
+            facts = None
+            if table is not None:
+                facts = logstore.facts_attachment(uploaded_file.name, table)
+                found = anomalies.anomalies_attachment(uploaded_file.name, table)
+                if found is not None:
+                    facts += f"\n\n{found}"
+                facts = redaction.redact(facts)
+            st.session_state.upload_facts[uploaded_file.file_id] = facts
+            # Last, so that a file whose facts failed is parsed again
+            st.session_state.upload_tables[uploaded_file.file_id] = table
+        progress.empty()
+    return [
+        facts
+        for uploaded_file in uploaded_files
+        if (facts := st.session_state.upload_facts[uploaded_file.file_id]) is not None
+    ]
+
+
+def index_uploaded_files(uploaded_files) -> list[correlation.FileIndex]:
+    """Request and trace IDs of every upload; new files are indexed once."""
+    settings = correlation.CorrelationSettings()
+    if not settings.enabled:
+        return []
+    for uploaded_file in uploaded_files:
+        if uploaded_file.file_id in st.session_state.upload_indexes:
+            continue
+        with tracing.span(
+            "app.index_uploaded_file",
+            file=uploaded_file.name,
+            bytes=uploaded_file.size,
+        ):
+            st.session_state.upload_indexes[uploaded_file.file_id] = (
+                correlation.FileIndex.from_bytes(
+                    uploaded_file.name, uploaded_file.getvalue(), settings
+                )
+            )
+    return [
+        st.session_state.upload_indexes[uploaded_file.file_id]
+        for uploaded_file in uploaded_files
+    ]
+
+
+def diff_uploaded_files(uploaded_files) -> str | None:
+    """The diff of two uploaded logs: the first of a good run, then a bad one."""
+    from docsassist import logdiff
+
+    tables = [
+        st.session_state.upload_tables.get(uploaded_file.file_id)
+        for uploaded_file in uploaded_files or []
+    ]
+    if len(tables) != 2 or None in tables:
+        st.warning(gettext("Diff mode needs exactly two uploaded log files"))
+        return None
+    good, bad = uploaded_files
+    key = (good.file_id, bad.file_id)
+    if key not in st.session_state.upload_diffs:
+        with tracing.span("app.diff_uploaded_files", good=good.name, bad=bad.name):
+            st.session_state.upload_diffs[key] = logdiff.diff_attachment(
+                good.name, tables[0], bad.name, tables[1]
+            )
+    return st.session_state.upload_diffs[key]
+
+
+def follow_uploaded_files(uploaded_files) -> None:
+    """Feed new uploads to the follower; re-sent files only add appended lines."""
+    follower: LogFollower = st.session_state.follower
+    for uploaded_file in uploaded_files or []:
+        if uploaded_file.file_id in st.session_state.followed_uploads:
+            continue
+        st.session_state.followed_uploads.add(uploaded_file.file_id)
+        with tracing.span(
+            "app.follow_uploaded_file",
+            file=uploaded_file.name,
+            bytes=uploaded_file.size,
+        ):
+            follower.feed_upload(uploaded_file.name, uploaded_file.getvalue())
+    for source in follower.sources.values():
+        st.caption(
+            gettext("{0}: {1} lines, {2} not yet sent").format(
+                source.name, f"{source.digest.lines:,}", f"{source.delta_lines:,}"
+            )
+        )
 
 
 def render_message(
@@ -106,10 +360,9 @@ def render_message(
     message_label = gettext("User") if is_user else gettext("Assistant")
     
     # Handle file attachments in message
-    if is_user and "📎" in message:
-        # Split message into parts if it contains file content
-        parts = message.split("📎")
-        user_text = parts[0].strip() if parts[0].strip() else "File attached"
+    if is_user and ingest.ATTACHMENT_MARKER in message:
+        user_text, attachments = ingest.parse_message(message)
+        user_text = user_text or "File attached"
         
         container.markdown(
             f"""
@@ -124,14 +377,9 @@ def render_message(
         )
         
         # Show file contents in expandable sections
-        for i, part in enumerate(parts[1:], 1):
-            if part.strip():
-                lines = part.strip().split('\n')
-                filename = lines[0].split(':')[0] if ':' in lines[0] else f"File {i}"
-                content = '\n'.join(lines[1:]) if len(lines) > 1 else "Unable to read content"
-                
-                with container.expander(f"📎 {filename}"):
-                    st.text(content)
+        for filename, content in attachments:
+            with container.expander(f"📎 {filename}"):
+                st.text(content)
     else:
         container.markdown(
             f"""
@@ -146,6 +394,7 @@ def render_message(
         )
 
 
+@tracing.traced("app.render_answer")
 def render_answer_and_citations(
     container: DeltaGenerator, response: dict
 ) -> None:
@@ -160,6 +409,7 @@ def render_answer_and_citations(
     render_message(container, completion, is_user=False)
 
 
+@tracing.traced("app.render_conversation_history")
 def render_conversation_history(container: DeltaGenerator) -> None:
     container.subheader(gettext("Conversation History"))
     for message in st.session_state.messages[:-1]:  # Exclude the latest message
@@ -167,24 +417,82 @@ def render_conversation_history(container: DeltaGenerator) -> None:
     st.markdown("---")
 
 
+def send_message(
+    full_message: str,
+    history: list[ChatCompletionMessageParam],
+    use_cache: bool = True,
+) -> None:
+    """Ask the LLM deployment and append the exchange to the session history."""
+    history_manager: ConversationHistory | None = st.session_state.history
+    if history_manager is not None:
+        history = history_manager.build_messages(history)
+    with st.spinner(gettext("Getting AI response...")):
+        response = get_llm_completion(
+            question=full_message,
+            messages=history,
+            use_cache=use_cache,
+        )
+    st.session_state.response = response
+
+    # Extract completion content from response
+    try:
+        completion_content = response["choices"][0]["message"]["content"]
+    except (KeyError, IndexError, TypeError):
+        completion_content = str(response)
+
+    st.session_state.messages.extend(
+        [
+            {"role": "user", "content": full_message},
+            {"role": "assistant", "content": completion_content},
+        ]
+    )
+    profile: profiler.Profile | None = st.session_state.profile
+    if profile is not None:
+        profile.turns += 1
+    if history_manager is not None:
+        # Summarize older turns off the critical path, before the next question
+        history_manager.schedule_update(
+            st.session_state.messages, predict.summarize_history
+        )
+
+
 def main() -> None:
-    render_svg(svg)
+    render_svg(logo)
     st.title(app_settings.page_title)
 
     # File upload section
     uploaded_files = st.file_uploader(
         "📎 Select files to upload",
         accept_multiple_files=True,
-        type=['txt', 'csv', 'log', 'json', 'md'],
+        type=['txt', 'csv', 'tsv', 'log', 'json', 'jsonl', 'ndjson', 'md'],
         help="You can upload text files, CSV, log files, and other supported formats"
     )
+    follow = st.toggle(
+        gettext("Follow mode"),
+        help=gettext(
+            "Re-upload a growing log to send only its new lines with a running summary"
+        ),
+    )
+    if follow:
+        follow_uploaded_files(uploaded_files)
+    diff = st.toggle(
+        gettext("Diff mode"),
+        help=gettext(
+            "Compare the first uploaded log (a good run) with the second (a bad run) "
+            "and send only their differences"
+        ),
+    )
     
     # Process uploaded files
     file_contents = []
+    file_facts = []
+    file_indexes = []
     if uploaded_files:
         for uploaded_file in uploaded_files:
             content = process_uploaded_file(uploaded_file)
             file_contents.append(content)
+        file_facts = parse_uploaded_files(uploaded_files)
+        file_indexes = index_uploaded_files(uploaded_files)
         
         # Show uploaded files preview
         if file_contents:
@@ -201,6 +509,7 @@ def main() -> None:
                     if len(lines) > 4:
                         st.text("...")
                     st.divider()
+    file_diff = diff_uploaded_files(uploaded_files) if diff else None
 
     chat_container = st.container()
     prompt_container = st.container()
@@ -219,37 +528,50 @@ def main() -> None:
         kwargs=None,
     )
 
+    regenerate = len(st.session_state.messages) >= 2 and prompt_container.button(
+        gettext("Regenerate response"), disabled=bool(prompt)
+    )
+
     if prompt and prompt.strip():
         st.session_state.prompt_sent = True
         
         # Combine prompt with file contents if files are uploaded
         full_message = prompt
-        if file_contents:
-            full_message = f"{prompt}\n\n" + "\n\n".join(file_contents)
-        
-        render_message(chat_container, full_message, True)
-        with st.spinner(gettext("Getting AI response...")):
-            response = predict.get_llm_completion(
-                question=full_message,
-                messages=st.session_state.messages,
+        if follow and st.session_state.follower.sources:
+            # Only the lines added since the last question, plus the digest
+            full_message = st.session_state.follower.build_message(
+                prompt, redaction.redact
+            )
+        elif file_diff is not None:
+            # What changed between the two logs instead of both whole files
+            full_message = f"{prompt}\n\n{redaction.redact(file_diff)}"
+        elif file_contents:
+            # The merged cross-file lines of any request ID the question mentions
+            correlation_settings = correlation.CorrelationSettings()
+            timelines = correlation.timeline_attachments(
+                prompt, file_indexes, correlation_settings
             )
-        st.session_state.response = response
+            # Secrets and personal data are replaced by pseudonyms; uploads and
+            # their facts are redacted once, only the timelines per question
+            attachments = []
+            if not timelines or not correlation_settings.timeline_only:
+                attachments = [
+                    redact_uploaded_file(uploaded_file, content)
+                    for uploaded_file, content in zip(uploaded_files, file_contents)
+                ]
+            attachments += file_facts
+            attachments += [redaction.redact(timeline) for timeline in timelines]
+            full_message = f"{prompt}\n\n" + "\n\n".join(attachments)
         
-        # Extract completion content from response
-        try:
-            completion_content = response["choices"][0]["message"]["content"]
-        except (KeyError, IndexError, TypeError):
-            completion_content = str(response)
-            
-        st.session_state.messages.extend(
-            [
-                ChatCompletionUserMessageParam(content=full_message, role="user"),
-                ChatCompletionAssistantMessageParam(
-                    content=completion_content, role="assistant"
-                ),
-            ]
-        )
-
+        render_message(chat_container, full_message, True)
+        send_message(full_message, history=st.session_state.messages)
+        st.rerun()
+    elif regenerate:
+        # Re-ask the last question, skipping any cached answer for it
+        full_message = st.session_state.messages[-2]["content"]
+        history = st.session_state.messages[:-2]
+        st.session_state.messages = history
+        send_message(full_message, history=history, use_cache=False)
         st.rerun()
 
     if st.session_state.prompt_sent:
@@ -258,6 +580,48 @@ def main() -> None:
             st.session_state.response,
         )
 
+    if tracing.get_tracer() is not None and "last_turn_trace" in st.session_state:
+        with st.expander(gettext("Latency breakdown")):
+            st.dataframe(st.session_state.last_turn_trace.breakdown(), hide_index=True)
+
+    if st.session_state.profile is not None:
+        render_profile_download()
+
+
+def render_profile_download() -> None:
+    """Offer the collapsed stacks of the current or last completed profile."""
+    sampling_profiler = profiler.get_profiler()
+    profile: profiler.Profile = st.session_state.profile
+    if sampling_profiler is not None and sampling_profiler.profile_complete(profile):
+        st.session_state.finished_profile = profile
+        st.session_state.profile = sampling_profiler.new_profile()
+    # Once a window of turns is complete, offer it rather than the partial one
+    if st.session_state.finished_profile is not None:
+        profile = st.session_state.finished_profile
+    started = time.strftime("%Y%m%d-%H%M%S", time.gmtime(profile.started_at))
+    with st.expander(gettext("Profiler")):
+        st.caption(f"{profile.samples} samples, {profile.turns} turns")
+        st.download_button(
+            gettext("Download profile"),
+            data=profile.collapsed(),
+            file_name=f"profile-{started}.collapsed",
+            mime="text/plain",
+        )
+
 
 if __name__ == "__main__":
-    main()
+    sampling_profiler = profiler.get_profiler()
+    profiling = (
+        sampling_profiler.sample(st.session_state.profile)
+        if sampling_profiler is not None
+        else contextlib.nullcontext()
+    )
+    with profiling, tracing.span("app.main") as rerun_span:
+        try:
+            main()
+        finally:
+            # Keep the breakdown of the last rerun that called the deployment
+            if isinstance(rerun_span, tracing.Span) and rerun_span.find(
+                "predict.get_llm_completion"
+            ):
+                st.session_state.last_turn_trace = rerun_span
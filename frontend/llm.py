@@ -0,0 +1,47 @@
+# Copyright 2024 DataRobot, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Streamlit adapter for docsassist.predict: shows core errors in the page."""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+import streamlit as st
+
+from docsassist import predict
+from docsassist.exceptions import DeploymentNotFoundError
+
+if TYPE_CHECKING:
+    from openai.types.chat.chat_completion_message_param import (
+        ChatCompletionMessageParam,
+    )
+
+
+def get_llm_completion(
+    question: str,
+    messages: list[ChatCompletionMessageParam],
+    use_cache: bool = True,
+) -> dict:
+    """predict.get_llm_completion(), reporting failures with st.error before re-raising."""
+    try:
+        return predict.get_llm_completion(
+            question=question, messages=messages, use_cache=use_cache
+        )
+    except DeploymentNotFoundError as e:
+        st.error(str(e))
+        raise
+    except Exception as e:
+        st.error(f"An error occurred: {str(e)}")
+        raise
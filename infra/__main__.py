@@ -31,6 +31,7 @@ from infra import (
     settings_keyword_guard, 
     settings_guardrails,
     settings_app_infra,
+    settings_api_infra,
 )
 from infra.settings_global_model_guardrails import global_guardrails
 from infra.settings_main import project_name
@@ -150,8 +151,51 @@ app_runtime_parameters = [
         type="deployment",
         value=llm_deployment.id,
     ),
+    # The apps pre-screen prompts with the keyword guard's blocklist
+    datarobot.ApplicationSourceRuntimeParameterValueArgs(
+        key="KEYWORD_GUARD_BLOCKLIST",
+        type="string",
+        value=settings_keyword_guard.blocklist,
+    ),
+    datarobot.ApplicationSourceRuntimeParameterValueArgs(
+        key="KEYWORD_GUARD_MESSAGE",
+        type="string",
+        value=settings_keyword_guard.block_message,
+    ),
+    # Guard deployments warmed up by the apps along with the LLM
+    datarobot.ApplicationSourceRuntimeParameterValueArgs(
+        key="WARMUP_DEPLOYMENTS",
+        type="string",
+        value=pulumi.Output.json_dumps(
+            [
+                {
+                    "name": config.name,
+                    "id": deployment.id,
+                    "input_column": config.input_column_name,
+                }
+                for deployment, config in zip(
+                    all_guard_deployments, all_guardrails_configs
+                )
+            ]
+        ),
+    ),
 ]
 
+# Key of the redaction pseudonyms; without it the apps derive one from their
+# DataRobot API token
+if os.environ.get("REDACT_KEY"):
+    redact_key_credential = datarobot.ApiTokenCredential(
+        resource_name=f"Log Analyzer REDACT_KEY Credential [{project_name}]",
+        api_token=os.environ["REDACT_KEY"],
+    )
+    app_runtime_parameters.append(
+        datarobot.ApplicationSourceRuntimeParameterValueArgs(
+            key="REDACT_KEY",
+            type="credential",
+            value=redact_key_credential.id,
+        )
+    )
+
 # Create application source with frontend files
 app_source = datarobot.ApplicationSource(
     files=settings_app_infra.get_app_files(
@@ -176,6 +220,22 @@ app = datarobot.CustomApplication(
 
 app.id.apply(settings_app_infra.ensure_app_settings)
 
+# Optionally serve the same analysis as an HTTP API
+if settings_api_infra.api_enabled:
+    api_source = datarobot.ApplicationSource(
+        files=settings_api_infra.get_api_files(),
+        runtime_parameter_values=app_runtime_parameters,
+        **settings_api_infra.api_source_args,
+    )
+    api_app = datarobot.CustomApplication(
+        resource_name=settings_api_infra.api_resource_name,
+        source_version_id=api_source.version_id,
+        use_case_ids=[use_case.id],
+        external_access_enabled=True,
+        external_access_recipients=["@datarobot.com"],
+    )
+    pulumi.export(settings_api_infra.api_resource_name, api_app.application_url)
+
 # Exports - Main deployments
 pulumi.export(llm_deployment_env_name, llm_deployment.id)
 pulumi.export("KEYWORD_GUARD_DEPLOYMENT_ID", keyword_guard_deployment.id)
@@ -0,0 +1,44 @@
+# Copyright 2024 DataRobot, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+from typing import List, Tuple
+
+from datarobot_pulumi_utils.schema.apps import ApplicationSourceArgs
+
+from infra.common.globals import GlobalRuntimeEnvironment
+from infra.settings_app_infra import get_shared_files
+from infra.settings_main import PROJECT_ROOT, project_name
+
+_application_path = PROJECT_ROOT / "api"
+
+# The HTTP API is deployed as a second application when LOG_ANALYZER_API=true
+api_enabled: bool = os.environ.get("LOG_ANALYZER_API", "false").lower() == "true"
+
+api_source_args = ApplicationSourceArgs(
+    resource_name=f"Log Analyzer API Source [{project_name}]",
+    base_environment_id=GlobalRuntimeEnvironment.PYTHON_312_APPLICATION_BASE.value.id,
+).model_dump(mode="json", exclude_none=True)
+
+api_resource_name: str = f"Log Analyzer API [{project_name}]"
+
+
+def get_api_files() -> List[Tuple[str, str]]:
+    source_files = [
+        (str(f), str(f.relative_to(_application_path)))
+        for f in _application_path.glob("**/*")
+        if f.is_file() and "__pycache__" not in f.parts
+    ]
+    source_files.extend(get_shared_files())
+    return source_files
@@ -108,16 +108,53 @@ def get_app_files(
         if f.is_file()
     ]
 
+    source_files.extend(get_shared_files())
+
+    return source_files
+
+
+def get_shared_files() -> List[Tuple[str, str]]:
+    """docsassist, locale catalog, utils and blocklist shipped with every app source"""
+    source_files: List[Tuple[str, str]] = []
+
     # Add docsassist files
     docsassist_path = PROJECT_ROOT / "docsassist"
     source_files.extend(
         [
             (str(docsassist_path / "__init__.py"), "docsassist/__init__.py"),
+            (str(docsassist_path / "anomalies.py"), "docsassist/anomalies.py"),
+            (str(docsassist_path / "cache.py"), "docsassist/cache.py"),
+            (str(docsassist_path / "correlation.py"), "docsassist/correlation.py"),
             (str(docsassist_path / "credentials.py"), "docsassist/credentials.py"),
+            (str(docsassist_path / "csvlogs.py"), "docsassist/csvlogs.py"),
+            (str(docsassist_path / "decoding.py"), "docsassist/decoding.py"),
             (str(docsassist_path / "deployments.py"), "docsassist/deployments.py"),
+            (str(docsassist_path / "exceptions.py"), "docsassist/exceptions.py"),
+            (str(docsassist_path / "follow.py"), "docsassist/follow.py"),
+            (str(docsassist_path / "history.py"), "docsassist/history.py"),
             (str(docsassist_path / "predict.py"), "docsassist/predict.py"),
+            (str(docsassist_path / "profiler.py"), "docsassist/profiler.py"),
+            (str(docsassist_path / "redaction.py"), "docsassist/redaction.py"),
             (str(docsassist_path / "schema.py"), "docsassist/schema.py"),
+            (
+                str(docsassist_path / "semantic_cache.py"),
+                "docsassist/semantic_cache.py",
+            ),
             (str(docsassist_path / "i18n.py"), "docsassist/i18n.py"),
+            (str(docsassist_path / "ingest.py"), "docsassist/ingest.py"),
+            (str(docsassist_path / "jsonlines.py"), "docsassist/jsonlines.py"),
+            (
+                str(docsassist_path / "keyword_guard.py"),
+                "docsassist/keyword_guard.py",
+            ),
+            (str(docsassist_path / "logdiff.py"), "docsassist/logdiff.py"),
+            (str(docsassist_path / "logstore.py"), "docsassist/logstore.py"),
+            (str(docsassist_path / "metrics.py"), "docsassist/metrics.py"),
+            (str(docsassist_path / "parallel.py"), "docsassist/parallel.py"),
+            (str(docsassist_path / "parsing.py"), "docsassist/parsing.py"),
+            (str(docsassist_path / "tracing.py"), "docsassist/tracing.py"),
+            (str(docsassist_path / "transport.py"), "docsassist/transport.py"),
+            (str(docsassist_path / "warmup.py"), "docsassist/warmup.py"),
         ]
     )
 
@@ -137,6 +174,14 @@ def get_app_files(
             )
         )
 
+    # The keyword guard's blocklist matcher, shared with its deployment
+    source_files.append(
+        (
+            str(PROJECT_ROOT / "deployment_keyword_guard" / "blocklist.py"),
+            "deployment_keyword_guard/blocklist.py",
+        )
+    )
+
     # Get all .py files from utils directory
     utils_files = [
         (str(PROJECT_ROOT / f"utils/{f.name}"), f"utils/{f.name}")
@@ -44,6 +44,20 @@ keyword_guard_target_name = "flagged"
 keyword_guard_positive_class_label = "true"
 keyword_guard_negative_class_label = "false"
 
+# Also passed to the apps, which reject matching prompts before sending them
+blocklist = json.dumps(
+    [
+        "dataiku",
+        "databrick",
+        "h20",
+        "microsoft",
+        "gcp",
+        "google",
+        "vertex\\s*ai",
+        "compet",
+    ]
+)
+
 custom_model_args = CustomModelArgs(
     name=f"Keyword Guard Custom Model [{project_name}]",
     resource_name=f"Keyword Guard Custom Model [{project_name}]",
@@ -57,18 +71,7 @@ custom_model_args = CustomModelArgs(
         datarobot.CustomModelRuntimeParameterValueArgs(
             key="blocklist",
             type="string",
-            value=json.dumps(
-                [
-                    "dataiku",
-                    "databrick",
-                    "h20",
-                    "microsoft",
-                    "gcp",
-                    "google",
-                    "vertex\\s*ai",
-                    "compet",
-                ]
-            ),
+            value=blocklist,
         ),
         datarobot.CustomModelRuntimeParameterValueArgs(
             key="prompt_feature_name",
@@ -116,3 +119,6 @@ custom_model_guard_configuration_args = CustomModelGuardConfigurationArgs(
     input_column_name="guardrailText",
     output_column_name=f"{keyword_guard_target_name}_{keyword_guard_positive_class_label}_PREDICTION",
 )
+
+# The apps answer prompts they block themselves with the same message
+block_message = custom_model_guard_configuration_args.intervention.message
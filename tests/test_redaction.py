@@ -0,0 +1,45 @@
+# Copyright 2024 DataRobot, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pytest
+
+from docsassist.redaction import RULES, Redactor, Rule, register_rule
+
+# Starts with the same character as the email rule
+HANDLE = Rule("handle", r"@(?P<value>[\w.]+)", prefix=r"(?<![\w.])$")
+
+
+def test_rules_sharing_an_anchor() -> None:
+    redactor = Redactor([RULES["email"], HANDLE], b"key")
+    text = "bob@example.com pinged @ops.example.com"
+    # The email rule matches at the second @, but its prefix does not
+    assert redactor.redact(text) == (
+        f"{redactor.pseudonym(RULES['email'], 'bob@example.com')} pinged "
+        f"@{redactor.pseudonym(HANDLE, 'ops.example.com')}"
+    )
+
+
+def test_rules_ignoring_case() -> None:
+    redactor = Redactor(list(RULES.values()), b"key")
+    for text in ("PASSWORD=hunter22", "Password: hunter22", "naïve password=hunter22"):
+        assert redactor.redact(text).endswith(
+            redactor.pseudonym(RULES["password"], "hunter22")
+        )
+
+
+def test_register_rule_needs_leading_literal() -> None:
+    with pytest.raises(ValueError):
+        register_rule(Rule("digits", r"\d+"))
+    with pytest.raises(ValueError):
+        register_rule(Rule("either", r"foo|bar"))